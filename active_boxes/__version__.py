@@ -1,11 +1,26 @@
-try:
-    import importlib.metadata as importlib_metadata
-except ImportError:
-    # Python < 3.8
-    import importlib_metadata  # type: ignore[no-redef,import-not-found]
-
-try:
-    __version__ = importlib_metadata.version("active-boxes")
-except importlib_metadata.PackageNotFoundError:
-    # Package is not installed
-    __version__ = "unknown"
+import functools
+from typing import Any
+
+
+@functools.lru_cache(maxsize=None)
+def get_version() -> str:
+    """Returns the installed version (read from the package metadata once)."""
+    # importlib.metadata is slow to import and to query, only use it when the
+    # version is needed
+    try:
+        import importlib.metadata as importlib_metadata
+    except ImportError:
+        # Python < 3.8
+        import importlib_metadata  # type: ignore[no-redef,import-not-found]
+
+    try:
+        return importlib_metadata.version("active-boxes")
+    except importlib_metadata.PackageNotFoundError:
+        # Package is not installed
+        return "unknown"
+
+
+def __getattr__(name: str) -> Any:
+    if name == "__version__":
+        return get_version()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,16 +1,28 @@
 """Core ActivityPub classes."""
 
 import asyncio
+import base64
+import contextlib
+import contextvars
+import hashlib
+import json
 import logging
 import weakref
 from datetime import datetime
 from datetime import timezone
 from enum import Enum
+from typing import AbstractSet
 from typing import Any
+from typing import Callable
+from typing import ClassVar
 from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Optional
 from typing import Sequence
+from typing import Tuple
 from typing import Type
 from typing import Union
 
@@ -21,7 +33,9 @@ from .errors import ActivityUnavailableError
 from .errors import BadActivityError
 from .errors import NotAnActivityError
 from .errors import Error
+from .errors import FetchBudgetExceededError
 from .errors import UnexpectedActivityTypeError
+from .http_client import _run_sync
 from .key import Key
 
 logger = logging.getLogger(__name__)
@@ -55,37 +69,218 @@ DEFAULT_CTX = COLLECTION_CTX = [
     },
 ]
 
+# Terms added to the context of every activity
+_CTX_EXTENSIONS = {
+    "Hashtag": "as:Hashtag",
+    "sensitive": "as:sensitive",
+    "toot": "http://joinmastodon.org/ns#",
+    "featured": "toot:featured",
+}
+
+
+def _immutable(*args, **kwargs):
+    raise TypeError(
+        "activity contexts are shared between activities and can't be "
+        "modified, use to_dict() to get a copy"
+    )
+
+
+class _FrozenList(list):
+    """A list that can't be modified (but is still a JSON array)."""
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = pop = remove = clear = _immutable
+    sort = reverse = _immutable
+
+    def __reduce__(self):
+        return (self.__class__, (list(self),))
+
+
+class _FrozenDict(dict):
+    """A dict that can't be modified (but is still a JSON object)."""
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    pop = popitem = setdefault = update = clear = _immutable
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return _FrozenDict((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return _FrozenList(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_thaw(v) for v in value]
+    return value
+
+
+_MAX_INTERNED_CONTEXTS = 1024
+_INTERNED_CONTEXTS: Dict[str, Any] = {}
+
+
+def _intern_context(ctx: Any) -> Any:
+    """Return the shared, immutable context of an activity.
+
+    The security context and the extension terms are added (without modifying
+    `ctx`), and activities using the same context share a single instance.
+    """
+    if isinstance(ctx, _FrozenList):
+        return ctx
+
+    ctx = list(ctx) if isinstance(ctx, list) else [ctx]
+    if CTX_SECURITY not in ctx:
+        ctx.append(CTX_SECURITY)
+    if isinstance(ctx[-1], dict):
+        ctx[-1] = {**ctx[-1], **_CTX_EXTENSIONS}
+    else:
+        ctx.append(_CTX_EXTENSIONS)
+
+    try:
+        key = json.dumps(ctx, sort_keys=True)
+    except (TypeError, ValueError):
+        return _freeze(ctx)
+    if (interned := _INTERNED_CONTEXTS.get(key)) is None:
+        interned = _freeze(ctx)
+        if len(_INTERNED_CONTEXTS) < _MAX_INTERNED_CONTEXTS:
+            _INTERNED_CONTEXTS[key] = interned
+    return interned
+
+
+def _invalidating(name: str) -> Callable[..., Any]:
+    method = getattr(dict, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._encoded = None
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+class _ActivityData(dict):
+    """The fields of an activity, along with its cached JSON encodings.
+
+    Writing to the dict drops the cached encodings. Nested objects are not
+    tracked: call `BaseActivity.reset_object_cache()` after modifying them.
+    """
+
+    __slots__ = ("_encoded",)
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # (embed, embed_object_id_only) -> [JSON bytes, Digest header]
+        self._encoded: Optional[Dict[Tuple[bool, bool], List[Any]]] = None
+
+    __setitem__ = _invalidating("__setitem__")
+    __delitem__ = _invalidating("__delitem__")
+    __ior__ = _invalidating("__ior__")
+    pop = _invalidating("pop")
+    popitem = _invalidating("popitem")
+    setdefault = _invalidating("setdefault")
+    update = _invalidating("update")
+    clear = _invalidating("clear")
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+
+def _reintern_context(ctx: Any) -> Any:
+    """Return the shared instance of a context that was already interned.
+
+    Used for the activities unpickled from another process.
+    """
+    try:
+        key = json.dumps(ctx, sort_keys=True)
+    except (TypeError, ValueError):
+        return ctx
+    if (interned := _INTERNED_CONTEXTS.get(key)) is None:
+        interned = ctx
+        if len(_INTERNED_CONTEXTS) < _MAX_INTERNED_CONTEXTS:
+            _INTERNED_CONTEXTS[key] = interned
+    return interned
+
+
+_DEFAULT_ACTIVITY_CTX = _intern_context(CTX_AS)
+
 # Will be used to keep track of all the defined activities
 _ACTIVITY_CLS: Dict["ActivityType", Type["BaseActivity"]] = {}
 
 BACKEND: Optional[Backend] = None
 
+# The backend of the current context (see `using_backend`), if any
+_CURRENT_BACKEND: contextvars.ContextVar[Optional[Backend]] = (
+    contextvars.ContextVar("active_boxes_backend", default=None)
+)
+
+# When set, activities are only validated structurally (see `offline_parsing`)
+_OFFLINE_PARSING: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "active_boxes_offline_parsing", default=False
+)
+
 
 def get_backend() -> Backend:
     """Get the backend instance.
 
     Returns:
-        The global backend instance
+        The backend of the current context (see `using_backend()`), or the
+        global backend instance
 
     Raises:
         UninitializedBackendError: If no backend has been initialized
     """
-    if BACKEND is None:
-        raise UninitializedBackendError
-    return BACKEND
+    backend = _CURRENT_BACKEND.get()
+    if backend is None:
+        backend = BACKEND
+        if backend is None:
+            raise UninitializedBackendError
+    return backend
 
 
 def _ensure_backend():
     """Helper function to ensure backend is initialized."""
-    if BACKEND is None:
+    if _CURRENT_BACKEND.get() is None and BACKEND is None:
         raise UninitializedBackendError
 
 
 def use_backend(backend_instance):
+    """Set the global backend, used when no backend is set for the context."""
     global BACKEND
     BACKEND = backend_instance
 
 
+@contextlib.contextmanager
+def using_backend(backend_instance: Backend) -> Iterator[Backend]:
+    """Use a backend for the current context only.
+
+    Lets a single process serve several sites (tenants): tasks started within
+    the context manager inherit the backend, and other tasks (or threads)
+    keep using their own, or the global one (see `use_backend()`).
+
+    Example:
+        async def handle_inbox(request):
+            with ap.using_backend(tenants[request.host].backend):
+                activity = await ap.parse_activity_async(await request.json())
+                ...
+    """
+    token = _CURRENT_BACKEND.set(backend_instance)
+    try:
+        yield backend_instance
+    finally:
+        _CURRENT_BACKEND.reset(token)
+
+
 def get_backend_sync() -> Backend:
     """Get the backend instance (sync, alias for get_backend).
 
@@ -174,35 +369,68 @@ async def _await_if_coroutine(result):
     return result
 
 
-def _run_sync(coro):
-    """Run an async coroutine from sync code.
+async def _get_stored_actors(
+    backend: Backend, actor_ids: List[str]
+) -> Dict[str, ObjectType]:
+    """Returns the actors cached in the storage of the backend, by ID.
 
-    This enables Flask/Django and other sync frameworks to use the library.
-    For new code, prefer async/await syntax.
+    Uses the batch `get_actors()` (see `AsyncStoragePlugin`) when available,
+    so that looking up many actors is a single round trip to the storage.
+    """
+    if not actor_ids:
+        return {}
+
+    get_actors = getattr(backend, "get_actors", None)
+    if get_actors is not None:
+        stored = await _await_if_coroutine(get_actors(actor_ids))
+        return stored if isinstance(stored, dict) else {}
+
+    get_actor = getattr(backend, "get_actor", None)
+    if get_actor is None:
+        return {}
+    stored = {}
+    for actor_id in actor_ids:
+        actor = await _await_if_coroutine(get_actor(actor_id))
+        if isinstance(actor, dict):
+            stored[actor_id] = actor
+    return stored
+
+
+async def store_activities(
+    activities: Iterable[Union["BaseActivity", ObjectType]],
+    recipient_inbox: Optional[str] = None,
+) -> None:
+    """Persist activities with the storage of the backend (async).
+
+    Uses the batch `store_activities()` (see `AsyncStoragePlugin`) when
+    available, `store_activity()` for each activity otherwise.
 
     Args:
-        coro: A coroutine to run
-
-    Returns:
-        The result of the coroutine
+        activities: The activities (or their dicts) to store
+        recipient_inbox: If received via inbox, which one
 
     Raises:
-        RuntimeError: If called from within an async context
+        NotImplementedError: If the backend has no storage
     """
-    if not asyncio.iscoroutine(coro):
-        return coro
-
-    try:
-        asyncio.get_running_loop()
-        raise RuntimeError(
-            "Cannot run async code from within an async context. "
-            "Use 'await' instead of the _sync() wrapper."
+    backend = get_backend()
+    payloads = [
+        a.to_dict() if isinstance(a, BaseActivity) else a for a in activities
+    ]
+    if not payloads:
+        return
+
+    store_many = getattr(backend, "store_activities", None)
+    if store_many is not None:
+        await _await_if_coroutine(store_many(payloads, recipient_inbox))
+        return
+    store_one = getattr(backend, "store_activity", None)
+    if store_one is None:
+        raise NotImplementedError(
+            f"{type(backend).__name__} must implement store_activity() or "
+            "store_activities() (see AsyncStoragePlugin)"
         )
-    except RuntimeError as e:
-        if "no running event loop" in str(e):
-            # No event loop running, safe to use asyncio.run()
-            return asyncio.run(coro)
-        raise
+    for payload in payloads:
+        await _await_if_coroutine(store_one(payload, recipient_inbox))
 
 
 def format_datetime(dt: datetime) -> str:
@@ -314,32 +542,158 @@ FEATURED_SUFFIX = "/featured"
 REPLIES_SUFFIX = "/replies"
 
 
+@contextlib.contextmanager
+def offline_parsing() -> Iterator[None]:
+    """Parse activities without any network I/O.
+
+    Within this context manager, building an activity only performs the
+    structural validation: the actor is not fetched, and the object of a
+    `Create` is not fetched. Use `validate_activities()` (or
+    `BaseActivity.validate()`) to check the actors later on, e.g. when
+    loading activities that were already validated from a database.
+
+    Example:
+        with offline_parsing():
+            activities = [parse_activity(row.payload) for row in rows]
+    """
+    token = _OFFLINE_PARSING.set(True)
+    try:
+        yield
+    finally:
+        _OFFLINE_PARSING.reset(token)
+
+
+async def validate_activities(
+    activities: Iterable["BaseActivity"],
+    max_concurrency: int = 10,
+    return_exceptions: bool = False,
+) -> List[Optional[Exception]]:
+    """Validate the actors of activities parsed offline, concurrently.
+
+    Each actor is fetched once, no matter how many activities it sent, and at
+    most `max_concurrency` actors are fetched at the same time.
+
+    Args:
+        activities: Activities built within `offline_parsing()`
+        max_concurrency: Maximum number of concurrent fetches
+        return_exceptions: Return the errors instead of raising the first one
+
+    Returns:
+        The error for each activity (None for the valid ones)
+    """
+    _ensure_backend()
+    backend = get_backend()
+    activities = list(activities)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _validate(actor_id: str) -> str:
+        if actor_id in stored:
+            return _check_actor(stored[actor_id])
+        async with semaphore:
+            try:
+                actor = await _await_if_coroutine(backend.fetch_iri(actor_id))
+            except (
+                ActivityGoneError,
+                ActivityNotFoundError,
+                FetchBudgetExceededError,
+            ):
+                raise
+            except Exception:
+                raise BadActivityError(f"failed to validate actor {actor_id!r}")
+        return _check_actor(actor)
+
+    errors: List[Optional[Exception]] = [None] * len(activities)
+    by_actor: Dict[str, List[int]] = {}
+    for i, activity in enumerate(activities):
+        try:
+            actor_ids = activity._actors_to_validate()
+        except BadActivityError as exc:
+            errors[i] = exc
+            continue
+        for actor_id in actor_ids:
+            by_actor.setdefault(actor_id, []).append(i)
+
+    # The actors already in the storage are looked up at once
+    stored = await _get_stored_actors(backend, list(by_actor))
+    results = await asyncio.gather(
+        *(_validate(actor_id) for actor_id in by_actor),
+        return_exceptions=True,
+    )
+    for indexes, result in zip(by_actor.values(), results):
+        if isinstance(result, Exception):
+            for i in indexes:
+                errors[i] = result
+        elif isinstance(result, BaseException):
+            raise result
+
+    if not return_exceptions:
+        for error in errors:
+            if error is not None:
+                raise error
+    return errors
+
+
 def parse_activity(
+    payload: ObjectType,
+    expected: ActivityType | None = None,
+    offline: bool = False,
+) -> "BaseActivity":
+    """Parse a payload into an activity.
+
+    Args:
+        payload: The activity as a dict
+        expected: Raise if the activity is not of this type
+        offline: Only validate the structure (no network I/O),
+            same as parsing within `offline_parsing()`
+    """
+    if offline and not _OFFLINE_PARSING.get():
+        with offline_parsing():
+            return parse_activity(payload, expected)
+
+    # Cheap rejection of malformed payloads, before creating anything
+    if not isinstance(payload, dict) or "type" not in payload:
+        raise BadActivityError("the payload has no type")
+    payload_type = payload["type"]
+    if isinstance(payload_type, list) and payload_type:
+        payload_type = payload_type[0]
+    t = None
+    if isinstance(payload_type, str):
+        t = _ACTIVITY_TYPES.get(payload_type)
+    if t is None:
+        # Raises a ValueError for unknown types
+        t = ActivityType(payload_type)
+
+    if expected and t != expected:
+        raise UnexpectedActivityTypeError(
+            f"expected a {expected.name} activity, got a {t.value}"
+        )
+
+    cls = _ACTIVITY_CLS.get(t)
+    if cls is None:
+        raise BadActivityError(f"unsupported activity type {t.value}")
+    return cls(**payload)
+
+
+async def parse_activity_async(
     payload: ObjectType, expected: ActivityType | None = None
 ) -> "BaseActivity":
-    match payload:
-        case {"type": activity_type}:
-            t = ActivityType(_to_list(activity_type)[0])
-        case _:
-            raise BadActivityError(f"the payload has no type: {payload!r}")
-
-    match expected, t:
-        case expected_type, activity_type if (
-            expected_type and activity_type != expected_type
-        ):
-            raise UnexpectedActivityTypeError(
-                f"expected a {expected_type.name} activity, got a {payload['type']}: {payload}"
-            )
-        case _:
-            pass
+    """Parse a payload into an activity without blocking the event loop.
 
-    match t:
-        case activity_type if activity_type in _ACTIVITY_CLS:
-            return _ACTIVITY_CLS[activity_type](**payload)
-        case _:
-            raise BadActivityError(
-                f"unsupported activity type {payload['type']}: {payload}"
-            )
+    The async counterpart of `parse_activity()`, to use from coroutines. The
+    payload is parsed offline, and its actor (and the actors of the embedded
+    objects that the regular parsing validates, e.g. the object of a
+    `Create`) are then validated with awaited fetches (unless the caller is
+    already within `offline_parsing()`).
+
+    Args:
+        payload: The activity as a dict
+        expected: Raise if the activity is not of this type
+    """
+    if _OFFLINE_PARSING.get():
+        return parse_activity(payload, expected)
+    activity = parse_activity(payload, expected, offline=True)
+    await activity.validate()
+    return activity
 
 
 def _to_list(data: List[Any] | Any) -> List[Any]:
@@ -369,6 +723,19 @@ def _get_actor_id(actor: ObjectOrIDType) -> str:
     return actor
 
 
+def _check_actor(actor: ObjectType) -> str:
+    """Check that a fetched actor is valid, and return its `id`."""
+    if not actor or "id" not in actor:
+        raise BadActivityError("invalid actor, missing id")
+
+    if not _has_type(actor.get("type"), _ACTOR_TYPE_VALUES):
+        raise UnexpectedActivityTypeError(
+            f"actor has wrong type {actor['type']!r}"
+        )
+
+    return actor["id"]
+
+
 def _get_id(obj) -> Optional[str]:
     if obj is None:
         return None
@@ -386,21 +753,196 @@ def _get_id(obj) -> Optional[str]:
 # ... (other imports)
 
 
+def _type_values(
+    _types: Union[
+        ActivityType, str, Sequence[Union[ActivityType, str]], AbstractSet[str]
+    ],
+) -> FrozenSet[str]:
+    """Returns the type names of `_types` as a frozenset."""
+    if isinstance(_types, (set, frozenset)):
+        # No copy for a frozenset
+        return frozenset(_types)
+    return frozenset(
+        _type.value if isinstance(_type, ActivityType) else _type
+        for _type in _to_list(_types)
+    )
+
+
 def _has_type(
-    obj_type: str | Sequence[str],
-    _types: ActivityType | str | Sequence[ActivityType | str],
+    obj_type: Optional[Union[str, Sequence[str]]],
+    _types: Union[
+        ActivityType, str, Sequence[Union[ActivityType, str]], AbstractSet[str]
+    ],
 ) -> bool:
     """Returns `True` if one of `obj_type` equals one of `_types`."""
-    types_str = [
-        _type.value if isinstance(_type, ActivityType) else _type
-        for _type in _to_list(_types)
-    ]
+    types_str = _type_values(_types)
+    if isinstance(obj_type, str):
+        return obj_type in types_str
     for _type in _to_list(obj_type):
-        if _type in types_str:
+        if isinstance(_type, str) and _type in types_str:
             return True
     return False
 
 
+_ACTOR_TYPE_VALUES = _type_values(ACTOR_TYPES)
+
+# Type name -> ActivityType, to look up the type of a payload without raising
+_ACTIVITY_TYPES: Dict[str, ActivityType] = {t.value: t for t in ActivityType}
+
+
+def _actor_field_id(obj: ObjectOrIDType) -> str:
+    """Returns the id of an "actor" field (without fetching it)."""
+    if isinstance(obj, str):
+        return obj
+    if isinstance(obj, dict) and _has_type(obj.get("type"), _ACTOR_TYPE_VALUES):
+        obj_id = obj.get("id")
+        if not obj_id:
+            raise BadActivityError("missing object id")
+        return obj_id
+    raise BadActivityError(f'invalid "actor" field ({type(obj).__qualname__})')
+
+
+def _check_target(payload: Dict[str, Any]) -> None:
+    if "target" not in payload:
+        raise BadActivityError("missing target")
+    target = payload["target"]
+    # Basic validation: target should be a string (IRI) or dict with type
+    if not isinstance(target, str) and not (
+        isinstance(target, dict) and "type" in target
+    ):
+        raise BadActivityError("invalid target")
+
+
+def _compile_validator(
+    cls: Type["BaseActivity"],
+) -> Callable[[Dict[str, Any]], None]:
+    """Returns the structural validation of the payloads of an activity class.
+
+    Only the checks needed by the class are kept, and they don't do any I/O:
+    malformed payloads are rejected before anything is fetched.
+    """
+    atype = cls.ACTIVITY_TYPE
+    assert atype is not None
+    type_value = atype.value
+    checks: List[Callable[[Dict[str, Any]], None]] = []
+
+    def check_type(payload: Dict[str, Any]) -> None:
+        payload_type = payload.get("type")
+        if (
+            payload_type
+            and payload_type != type_value
+            and not (
+                isinstance(payload_type, list) and type_value in payload_type
+            )
+        ):
+            raise UnexpectedActivityTypeError(
+                f"Expect the type to be {type_value!r}"
+            )
+
+    checks.append(check_type)
+
+    if atype not in ACTOR_TYPES and cls.ACTOR_REQUIRED:
+        attributed_to = atype in CREATE_TYPES
+
+        def check_actor(payload: Dict[str, Any]) -> None:
+            actor = payload.get("actor")
+            if actor:
+                _actor_field_id(actor)
+            elif not attributed_to:
+                raise BadActivityError("missing actor")
+            elif "attributedTo" not in payload:
+                raise BadActivityError("Note is missing attributedTo")
+
+        checks.append(check_actor)
+
+    if cls.OBJECT_REQUIRED:
+        allowed = _type_values(cls.ALLOWED_OBJECT_TYPES)
+        needs_id = atype != ActivityType.CREATE
+
+        def check_object(payload: Dict[str, Any]) -> None:
+            if "object" not in payload:
+                return
+            obj = payload["object"]
+            if isinstance(obj, str):
+                # The object is a just a reference the its ID/IRI
+                return
+            if not isinstance(obj, dict):
+                raise BadActivityError(
+                    f"invalid object type ({type(obj).__qualname__})"
+                )
+            if "type" not in obj:
+                raise BadActivityError("invalid object, missing type")
+            if not allowed:
+                raise UnexpectedActivityTypeError("unexpected object")
+            if needs_id and "id" not in obj:
+                raise BadActivityError("invalid object, missing type")
+            if not _has_type(obj["type"], allowed):
+                raise UnexpectedActivityTypeError(
+                    f"unexpected object type (allowed={sorted(allowed)!r})"
+                )
+
+        checks.append(check_object)
+
+    if cls.TARGET_REQUIRED:
+        checks.append(_check_target)
+
+    def validate(payload: Dict[str, Any]) -> None:
+        for check in checks:
+            check(payload)
+
+    return validate
+
+
+def _compile_constructor(
+    cls: Type["BaseActivity"],
+) -> Callable[["BaseActivity", Dict[str, Any]], Dict[str, Any]]:
+    """Returns the builder of the fields of an activity class.
+
+    The payload must have been checked with the class validator first.
+    """
+    atype = cls.ACTIVITY_TYPE
+    assert atype is not None
+    type_value = atype.value
+    has_actor = atype not in ACTOR_TYPES and cls.ACTOR_REQUIRED
+    has_object = cls.OBJECT_REQUIRED
+    has_target = cls.TARGET_REQUIRED
+
+    def build(self: "BaseActivity", kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"type": kwargs.pop("type", None) or type_value}
+
+        # The id may not be present for new activities
+        if "id" in kwargs:
+            data["id"] = kwargs.pop("id")
+
+        if has_actor and kwargs.get("actor"):
+            actor = kwargs.pop("actor")
+            if _OFFLINE_PARSING.get():
+                data["actor"] = self._actor_id(actor)
+            else:
+                data["actor"] = self._validate_actor(actor)
+
+        if has_object and "object" in kwargs:
+            data["object"] = kwargs.pop("object")
+
+        if has_target:
+            data["target"] = kwargs.pop("target")
+
+        # The context is interned: all the activities with the same context
+        # share the same (immutable) list
+        if "@context" not in kwargs:
+            data["@context"] = _DEFAULT_ACTIVITY_CTX
+        else:
+            data["@context"] = _intern_context(kwargs.pop("@context"))
+
+        # Remove keys with `None` value
+        for k, v in kwargs.items():
+            if v is not None:
+                data[k] = v
+        return data
+
+    return build
+
+
 class _ActivityMeta(type):
     """Metaclass for keeping track of subclass."""
 
@@ -413,12 +955,40 @@ class _ActivityMeta(type):
 
         # Register it
         _ACTIVITY_CLS[cls.ACTIVITY_TYPE] = cls
+
+        # Compile the validation and the construction for this activity type
+        if cls.ACTIVITY_TYPE:
+            if "_validate_payload" not in class_dict:
+                cls._validate_payload = staticmethod(_compile_validator(cls))
+            if "_build" not in class_dict:
+                cls._build = _compile_constructor(cls)
+
+        # Whether the sync `_recipients()` hook is overridden more recently
+        # than `_recipients_async()` (see `BaseActivity._get_recipients()`)
+        cls._SYNC_RECIPIENTS_HOOK = False
+        for klass in cls.__mro__:
+            if "_recipients_async" in vars(klass):
+                break
+            if "_recipients" in vars(klass):
+                cls._SYNC_RECIPIENTS_HOOK = True
+                break
         return cls
 
 
 class BaseActivity(object, metaclass=_ActivityMeta):
     """Base class for ActivityPub activities."""
 
+    # The fields live in slots, the instance __dict__ is only allocated when
+    # an attribute is set on the instance (e.g. by `mock.patch.object()`)
+    __slots__ = (
+        "_data",
+        "__ctx",
+        "__obj",
+        "__actor",
+        "__dict__",
+        "__weakref__",
+    )
+
     ACTIVITY_TYPE: Optional[ActivityType] = (
         None  # the ActivityTypeEnum the class will represent
     )
@@ -427,120 +997,29 @@ class BaseActivity(object, metaclass=_ActivityMeta):
     ACTOR_REQUIRED = True  # Most of the object requires an actor, so this flag in on by default
     TARGET_REQUIRED = False  # Whether the target field is required
 
-    def __init__(self, **kwargs) -> None:  # noqa: C901
-        if not self.ACTIVITY_TYPE:
-            raise Error("should never happen")
+    # Set for each class by `_ActivityMeta`
+    _SYNC_RECIPIENTS_HOOK = False
 
-        # Initialize the dict that will contains all the activity fields
-        self._data: Dict[str, Any] = {}
+    # Compiled for each activity type by `_ActivityMeta`
+    _validate_payload: ClassVar[Callable[[Dict[str, Any]], None]]
+    _build: ClassVar[Callable[["BaseActivity", Dict[str, Any]], Dict[str, Any]]]
 
-        if not kwargs.get("type"):
-            self._data["type"] = self.ACTIVITY_TYPE.value
-        else:
-            atype = kwargs.pop("type")
-            if self.ACTIVITY_TYPE.value not in _to_list(atype):
-                raise UnexpectedActivityTypeError(
-                    f"Expect the type to be {self.ACTIVITY_TYPE.value!r}"
-                )
-            self._data["type"] = atype
+    def __init__(self, **kwargs) -> None:
+        if not self.ACTIVITY_TYPE:
+            raise Error("should never happen")
 
-        logger.debug(
-            f"initializing a {self.ACTIVITY_TYPE.value} activity: {kwargs!r}"
-        )
+        # Reject malformed payloads before fetching anything
+        type(self)._validate_payload(kwargs)
+        logger.debug("initializing a %s activity", self.ACTIVITY_TYPE.value)
 
         # A place to set ephemeral data
-        self.__ctx: Any = {}
+        self.__ctx: Any = None
 
         self.__obj: Optional["BaseActivity"] = None
-        self.__actor: List[ActorType] = []
-
-        # The id may not be present for new activities
-        if "id" in kwargs:
-            self._data["id"] = kwargs.pop("id")
-
-        if self.ACTIVITY_TYPE not in ACTOR_TYPES and self.ACTOR_REQUIRED:
-            actor = kwargs.get("actor")
-            if actor:
-                kwargs.pop("actor")
-                actor = self._validate_actor(actor)
-                self._data["actor"] = actor
-            elif self.ACTIVITY_TYPE in CREATE_TYPES:
-                if "attributedTo" not in kwargs:
-                    raise BadActivityError("Note is missing attributedTo")
-            else:
-                raise BadActivityError("missing actor")
-
-        if self.OBJECT_REQUIRED and "object" in kwargs:
-            obj = kwargs.pop("object")
-            match obj:
-                case str():
-                    # The object is a just a reference the its ID/IRI
-                    # FIXME(tsileo): fetch the ref
-                    self._data["object"] = obj
-                case {"type": obj_type, **_rest} if self.ALLOWED_OBJECT_TYPES:
-                    if (
-                        self.ACTIVITY_TYPE != ActivityType.CREATE
-                        and "id" not in obj
-                    ):
-                        raise BadActivityError("invalid object, missing type")
-                    if not _has_type(obj_type, self.ALLOWED_OBJECT_TYPES):
-                        raise UnexpectedActivityTypeError(
-                            f"unexpected object type {obj_type} (allowed={self.ALLOWED_OBJECT_TYPES!r})"
-                        )
-                    self._data["object"] = obj
-                case {"type": _, **_rest} if not self.ALLOWED_OBJECT_TYPES:
-                    raise UnexpectedActivityTypeError("unexpected object")
-                case dict():
-                    raise BadActivityError("invalid object, missing type")
-                case _:
-                    raise BadActivityError(
-                        f"invalid object type ({type(obj).__qualname__}): {obj!r}"
-                    )
-
-        if self.TARGET_REQUIRED:
-            if "target" not in kwargs:
-                raise BadActivityError("missing target")
-            target = kwargs.pop("target")
-            # Basic validation: target should be a string (IRI) or dict with type
-            if isinstance(target, str):
-                self._data["target"] = target
-            elif isinstance(target, dict) and "type" in target:
-                self._data["target"] = target
-            else:
-                raise BadActivityError("invalid target")
-
-        if "@context" not in kwargs:
-            self._data["@context"] = CTX_AS
-        else:
-            self._data["@context"] = kwargs.pop("@context")
-
-        # @context check
-        if not isinstance(self._data["@context"], list):
-            self._data["@context"] = [self._data["@context"]]
-        if CTX_SECURITY not in self._data["@context"]:
-            self._data["@context"].append(CTX_SECURITY)
-        if isinstance(self._data["@context"][-1], dict):
-            self._data["@context"][-1]["Hashtag"] = "as:Hashtag"
-            self._data["@context"][-1]["sensitive"] = "as:sensitive"
-            self._data["@context"][-1]["toot"] = "http://joinmastodon.org/ns#"
-            self._data["@context"][-1]["featured"] = "toot:featured"
-        else:
-            self._data["@context"].append(
-                {
-                    "Hashtag": "as:Hashtag",
-                    "sensitive": "as:sensitive",
-                    "toot": "http://joinmastodon.org/ns#",
-                    "featured": "toot:featured",
-                }
-            )
+        self.__actor: Optional[List[ActorType]] = None
 
-        # Remove keys with `None` value
-        valid_kwargs = {}
-        for k, v in kwargs.items():
-            if v is None:
-                continue
-            valid_kwargs[k] = v
-        self._data.update(**valid_kwargs)
+        # Initialize the dict that will contains all the activity fields
+        self._data: _ActivityData = _ActivityData(self._build(kwargs))
 
         try:
             self._init()
@@ -601,6 +1080,22 @@ class BaseActivity(object, metaclass=_ActivityMeta):
         """Returns the ID/IRI when castign to str."""
         return str(self._data.get("id", f"[new {self.ACTIVITY_TYPE} activity]"))
 
+    def __reduce__(self):
+        # The cached object/actor are not pickled, and the activity is not
+        # validated again when unpickled
+        return (self.__class__._restore, (self._data,))
+
+    @classmethod
+    def _restore(cls, data: Dict[str, Any]) -> "BaseActivity":
+        activity = cls.__new__(cls)
+        if not isinstance(data, _ActivityData):
+            data = _ActivityData(data)
+        activity._data = data
+        activity.__ctx = None
+        activity.__obj = None
+        activity.__actor = None
+        return activity
+
     def __getattr__(self, name: str) -> Any:
         """Allow to access the object field as regular attributes."""
         if name in self._data:
@@ -610,9 +1105,23 @@ class BaseActivity(object, metaclass=_ActivityMeta):
         """Optional callback for subclasses to so something with a newly generated ID (for outbox activities)."""
         raise NotImplementedError
 
-    def set_id(self, uri: str, obj_id: str) -> None:
-        """Set the ID for a new activity."""
-        logger.debug(f"setting ID {uri} / {obj_id}")
+    def set_id(
+        self, uri: Optional[str] = None, obj_id: Optional[str] = None
+    ) -> None:
+        """Set the ID for a new activity.
+
+        Without `obj_id`, a new one is generated by the backend (see
+        `Backend.random_object_id()`), and without `uri`, it's the backend
+        `activity_url()` of the object ID.
+        """
+        if obj_id is None or uri is None:
+            _ensure_backend()
+            backend = get_backend()
+            if obj_id is None:
+                obj_id = backend.random_object_id()
+            if uri is None:
+                uri = backend.activity_url(obj_id)
+        logger.debug("setting ID %s / %s", uri, obj_id)
         self._data["id"] = uri
         try:
             self._set_id(uri, obj_id)
@@ -620,17 +1129,7 @@ class BaseActivity(object, metaclass=_ActivityMeta):
             pass
 
     def _actor_id(self, obj: ObjectOrIDType) -> str:
-        if isinstance(obj, dict) and _has_type(  # type: ignore
-            obj["type"], ACTOR_TYPES
-        ):
-            obj_id = obj.get("id")
-            if not obj_id:
-                raise BadActivityError(f"missing object id: {obj!r}")
-            return obj_id
-        elif isinstance(obj, str):
-            return obj
-        else:
-            raise BadActivityError(f'invalid "actor" field: {obj!r}')
+        return _actor_field_id(obj)
 
     def _validate_actor(self, obj: ObjectOrIDType) -> str:
         _ensure_backend()
@@ -639,22 +1138,41 @@ class BaseActivity(object, metaclass=_ActivityMeta):
         obj_id = self._actor_id(obj)
         try:
             actor = backend.fetch_iri_sync(obj_id)
-        except (ActivityGoneError, ActivityNotFoundError):
+        except (
+            ActivityGoneError,
+            ActivityNotFoundError,
+            FetchBudgetExceededError,
+        ):
             raise
         except Exception:
-            raise BadActivityError(f"failed to validate actor {obj!r}")
+            raise BadActivityError(f"failed to validate actor {obj_id!r}")
 
-        if not actor or "id" not in actor:
-            raise BadActivityError(f"invalid actor {actor}")
+        return _check_actor(actor)
 
-        if not _has_type(  # type: ignore  # XXX: too complicated
-            actor["type"], ACTOR_TYPES
-        ):
-            raise UnexpectedActivityTypeError(
-                f"actor has wrong type {actor['type']!r}"
-            )
+    async def validate(self) -> None:
+        """Validate the actor of an activity parsed offline (async).
 
-        return actor["id"]
+        Fetches the actor like the regular parsing would do, and raises the
+        same errors. See `offline_parsing()` and `validate_activities()`.
+        """
+        await validate_activities([self], return_exceptions=False)
+
+    def validate_sync(self) -> None:
+        """Validate the actor of an activity parsed offline (sync wrapper).
+
+        For async code, use await validate() instead.
+        """
+        return _run_sync(self.validate())
+
+    def _actors_to_validate(self) -> List[str]:
+        """Returns the actors fetched by the regular (online) parsing."""
+        if (
+            self.ACTIVITY_TYPE in ACTOR_TYPES
+            or not self.ACTOR_REQUIRED
+            or not self._data.get("actor")
+        ):
+            return []
+        return [self._actor_id(self._data["actor"])]
 
     def get_object_id(self) -> str:
         _ensure_backend()
@@ -676,15 +1194,15 @@ class BaseActivity(object, metaclass=_ActivityMeta):
         if self.__obj:
             return self.__obj
         if isinstance(self._data["object"], dict):
-            p = parse_activity(self._data["object"])
+            p = await parse_activity_async(self._data["object"])
         else:
-            result = backend.fetch_iri_sync(self._data["object"])
+            result = backend.fetch_iri(self._data["object"])
             obj = await _await_if_coroutine(result)
             if ActivityType(obj.get("type")) not in self.ALLOWED_OBJECT_TYPES:
                 raise UnexpectedActivityTypeError(
                     f"invalid object type {obj.get('type')!r}"
                 )
-            p = parse_activity(obj)
+            p = await parse_activity_async(obj)
 
         self.__obj = p
         return p
@@ -709,7 +1227,12 @@ class BaseActivity(object, metaclass=_ActivityMeta):
             raise BadActivityError("invalid target format")
 
     def reset_object_cache(self) -> None:
+        """Drop the cached object and JSON encodings.
+
+        Must be called after modifying a nested object of `_data`.
+        """
         self.__obj = None
+        self._data._encoded = None
 
     def to_dict(
         self, embed: bool = False, embed_object_id_only: bool = False
@@ -720,6 +1243,9 @@ class BaseActivity(object, metaclass=_ActivityMeta):
             for k in ["@context", "signature"]:
                 if k in data:
                     del data[k]
+        elif "@context" in data:
+            # The context is shared, hand out a copy the caller can modify
+            data["@context"] = _thaw(data["@context"])
         if (
             data.get("object")
             and embed_object_id_only
@@ -734,6 +1260,45 @@ class BaseActivity(object, metaclass=_ActivityMeta):
 
         return data
 
+    def _encoded_json(
+        self, embed: bool, embed_object_id_only: bool
+    ) -> List[Any]:
+        cache = self._data._encoded
+        if cache is None:
+            cache = self._data._encoded = {}
+        key = (embed, embed_object_id_only)
+        if (encoded := cache.get(key)) is None:
+            data = self.to_dict(
+                embed=embed, embed_object_id_only=embed_object_id_only
+            )
+            encoded = cache[key] = [
+                json.dumps(
+                    data, ensure_ascii=False, separators=(",", ":")
+                ).encode("utf-8"),
+                None,
+            ]
+        return encoded
+
+    def to_json_bytes(
+        self, embed: bool = False, embed_object_id_only: bool = False
+    ) -> bytes:
+        """Serializes the activity to (compact) JSON.
+
+        The encoding is cached for each combination of the options, and
+        reused until the activity is modified (see `reset_object_cache()`).
+        """
+        return self._encoded_json(embed, embed_object_id_only)[0]
+
+    def json_digest(
+        self, embed: bool = False, embed_object_id_only: bool = False
+    ) -> str:
+        """Returns the Digest header (SHA-256) of `to_json_bytes()`, cached."""
+        encoded = self._encoded_json(embed, embed_object_id_only)
+        if encoded[1] is None:
+            digest = hashlib.sha256(encoded[0]).digest()
+            encoded[1] = "SHA-256=" + base64.b64encode(digest).decode("utf-8")
+        return encoded[1]
+
     async def get_actor(self) -> ActorType:
         """Returns the actor for this activity (async)."""
         _ensure_backend()
@@ -749,23 +1314,30 @@ class BaseActivity(object, metaclass=_ActivityMeta):
                 if not actor:
                     raise BadActivityError("missing attributedTo")
             else:
-                raise BadActivityError(f"failed to fetch actor: {self._data!r}")
+                raise BadActivityError(f"failed to fetch actor of {self!r}")
 
-        self.__actor = []
+        actor_ids: List[str] = []
         for item in _to_list(actor):
             if not isinstance(item, (str, dict)):
-                raise BadActivityError(f"invalid actor: {self._data!r}")
-
-            actor_id = self._actor_id(item)
-
-            result = backend.fetch_iri_sync(actor_id)
-            actor_obj = await _await_if_coroutine(result)
-            p = parse_activity(actor_obj)
+                raise BadActivityError(
+                    f"invalid actor ({type(item).__qualname__}) in {self!r}"
+                )
+            actor_ids.append(self._actor_id(item))
+
+        stored = await _get_stored_actors(backend, actor_ids)
+        actors: List[ActorType] = []
+        for actor_id in actor_ids:
+            actor_obj = stored.get(actor_id)
+            if actor_obj is None:
+                result = backend.fetch_iri(actor_id)
+                actor_obj = await _await_if_coroutine(result)
+            p = await parse_activity_async(actor_obj)
             if not p.has_type(ACTOR_TYPES):  # type: ignore
                 raise UnexpectedActivityTypeError(f"{p!r} is not an actor")
-            self.__actor.append(p)  # type: ignore
+            actors.append(p)  # type: ignore
 
-        return self.__actor[0]
+        self.__actor = actors
+        return actors[0]
 
     def get_actor_sync(self) -> ActorType:
         """Returns the actor for this activity (sync wrapper).
@@ -774,85 +1346,77 @@ class BaseActivity(object, metaclass=_ActivityMeta):
         """
         return _run_sync(self.get_actor())
 
-    def _recipients(self) -> List[str]:
+    async def _recipients_async(self) -> List[str]:
         return []
 
-    def recipients(self) -> List[str]:  # noqa: C901
+    def _recipients(self) -> List[str]:
+        return _run_sync(self._recipients_async())
+
+    async def _get_recipients(self) -> List[str]:
+        # Subclasses written for the sync API may only override
+        # `_recipients()`, it runs in a thread as it can call sync wrappers
+        if self._SYNC_RECIPIENTS_HOOK:
+            return await asyncio.to_thread(self._recipients)
+        return await self._recipients_async()
+
+    async def recipients_async(self) -> List[str]:  # noqa: C901
+        """Returns the inboxes to deliver this activity to (async)."""
         _ensure_backend()
         backend = get_backend()
 
-        recipients = self._recipients()
-        actor_id = self.get_actor_sync().id
+        recipients = await self._get_recipients()
+        actor_id = (await self.get_actor()).id
 
         out: List[str] = []
         if self.type == ActivityType.CREATE.value:
             out = backend.extra_inboxes()
 
+        def _add_inbox(actor: "BaseActivity") -> None:
+            if actor.endpoints:
+                shared_inbox = actor.endpoints.get("sharedInbox")
+                if shared_inbox:
+                    if shared_inbox not in out:
+                        out.append(shared_inbox)
+                    return
+
+            if actor.inbox and actor.inbox not in out:
+                out.append(actor.inbox)
+
+        recipients = [
+            r for r in recipients if r not in [actor_id, AS_PUBLIC, None]
+        ]
+        # The recipients already in the storage are looked up at once
+        stored = await _get_stored_actors(backend, recipients)
         for recipient in recipients:
-            if recipient in [actor_id, AS_PUBLIC, None]:
-                continue
-
-            try:
-                actor = fetch_remote_activity_sync(recipient)
-            except (
-                ActivityGoneError,
-                ActivityNotFoundError,
-                NotAnActivityError,
-            ):
-                logger.info(f"{recipient} is gone")
-                continue
-            except ActivityUnavailableError:
-                # TODO(tsileo): retry separately?
-                logger.info(f"failed {recipient} to fetch recipient")
+            actor = await _resolve_recipient(recipient, stored)
+            if actor is None:
                 continue
 
             if actor.ACTIVITY_TYPE in ACTOR_TYPES:
-                if actor.endpoints:
-                    shared_inbox = actor.endpoints.get("sharedInbox")
-                    if shared_inbox:
-                        if shared_inbox not in out:
-                            out.append(shared_inbox)
-                        continue
-
-                if actor.inbox and actor.inbox not in out:
-                    out.append(actor.inbox)
+                _add_inbox(actor)
 
             # Is the activity a `Collection`/`OrderedCollection`?
             elif actor.ACTIVITY_TYPE in COLLECTION_TYPES:
-                for item in backend.parse_collection(actor.to_dict()):
-                    # XXX(tsileo): is nested collection support needed here?
-
-                    if item in [actor_id, AS_PUBLIC]:
-                        continue
-
-                    try:
-                        col_actor = fetch_remote_activity_sync(item)
-                    except ActivityUnavailableError:
-                        # TODO(tsileo): retry separately?
-                        logger.info(f"failed {recipient} to fetch recipient")
-                        continue
-                    except (
-                        ActivityGoneError,
-                        ActivityNotFoundError,
-                        NotAnActivityError,
-                    ):
-                        logger.info(f"{item} is gone")
-                        continue
-
-                    if col_actor.endpoints:
-                        shared_inbox = col_actor.endpoints.get("sharedInbox")
-                        if shared_inbox:
-                            if shared_inbox not in out:
-                                out.append(shared_inbox)
-                            continue
-
-                    if col_actor.inbox and col_actor.inbox not in out:
-                        out.append(col_actor.inbox)
+                items = await backend.parse_collection_async(actor.to_dict())
+                # XXX(tsileo): is nested collection support needed here?
+                items = [i for i in items if i not in [actor_id, AS_PUBLIC]]
+                col_stored = await _get_stored_actors(backend, items)
+                for item in items:
+                    col_actor = await _resolve_recipient(item, col_stored)
+                    if col_actor is not None:
+                        _add_inbox(col_actor)
             else:
                 raise BadActivityError(f"failed to parse {recipient}")
 
         return out
 
+    def recipients(self) -> List[str]:
+        """Returns the inboxes to deliver this activity to (sync wrapper).
+
+        For async code, use await recipients_async() instead.
+        """
+        return _run_sync(self.recipients_async())
+
 
 class Person(BaseActivity):
     ACTIVITY_TYPE = ActivityType.PERSON
@@ -978,13 +1542,21 @@ class Follow(BaseActivity):
     OBJECT_REQUIRED = True
     ACTOR_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
-        return [self.get_object_sync().id]
+    async def _recipients_async(self) -> List[str]:
+        return [(await self.get_object()).id]
+
+    async def build_undo_async(self) -> BaseActivity:
+        """Builds the Undo activity for this Follow (async)."""
+        actor = await self.get_actor()
+        with offline_parsing():
+            return Undo(object=self.to_dict(embed=True), actor=actor.id)
 
     def build_undo(self) -> BaseActivity:
-        return Undo(
-            object=self.to_dict(embed=True), actor=self.get_actor_sync().id
-        )
+        """Builds the Undo activity for this Follow (sync wrapper).
+
+        For async code, use await build_undo_async() instead.
+        """
+        return _run_sync(self.build_undo_async())
 
 
 class Accept(BaseActivity):
@@ -993,8 +1565,8 @@ class Accept(BaseActivity):
     OBJECT_REQUIRED = True
     ACTOR_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
-        return [self.get_object_sync().get_actor_sync().id]
+    async def _recipients_async(self) -> List[str]:
+        return [(await (await self.get_object()).get_actor()).id]
 
 
 class Reject(BaseActivity):
@@ -1003,8 +1575,8 @@ class Reject(BaseActivity):
     OBJECT_REQUIRED = True
     ACTOR_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
-        return [self.get_object_sync().get_actor_sync().id]
+    async def _recipients_async(self) -> List[str]:
+        return [(await (await self.get_object()).get_actor()).id]
 
 
 class Undo(BaseActivity):
@@ -1018,12 +1590,12 @@ class Undo(BaseActivity):
     OBJECT_REQUIRED = True
     ACTOR_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
-        obj = self.get_object_sync()
+    async def _recipients_async(self) -> List[str]:
+        obj = await self.get_object()
         if obj.ACTIVITY_TYPE == ActivityType.FOLLOW:
-            return [obj.get_object_sync().id]
+            return [(await obj.get_object()).id]
         else:
-            return [obj.get_object_sync().get_actor_sync().id]
+            return [(await (await obj.get_object()).get_actor()).id]
 
 
 class Add(BaseActivity):
@@ -1046,14 +1618,24 @@ class Like(BaseActivity):
     OBJECT_REQUIRED = True
     ACTOR_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
-        return [self.get_object_sync().get_actor_sync().id]
+    async def _recipients_async(self) -> List[str]:
+        return [(await (await self.get_object()).get_actor()).id]
+
+    async def build_undo_async(self) -> BaseActivity:
+        """Builds the Undo activity for this Like (async)."""
+        actor = await self.get_actor()
+        with offline_parsing():
+            return Undo(
+                object=self.to_dict(embed=True, embed_object_id_only=True),
+                actor=actor.id,
+            )
 
     def build_undo(self) -> BaseActivity:
-        return Undo(
-            object=self.to_dict(embed=True, embed_object_id_only=True),
-            actor=self.get_actor_sync().id,
-        )
+        """Builds the Undo activity for this Like (sync wrapper).
+
+        For async code, use await build_undo_async() instead.
+        """
+        return _run_sync(self.build_undo_async())
 
 
 class Announce(BaseActivity):
@@ -1062,8 +1644,8 @@ class Announce(BaseActivity):
     OBJECT_REQUIRED = True
     ACTOR_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
-        recipients = [self.get_object_sync().get_actor_sync().id]
+    async def _recipients_async(self) -> List[str]:
+        recipients = [(await (await self.get_object()).get_actor()).id]
 
         for field in ["to", "cc"]:
             if field in self._data:
@@ -1071,10 +1653,18 @@ class Announce(BaseActivity):
 
         return list(set(recipients))
 
+    async def build_undo_async(self) -> BaseActivity:
+        """Builds the Undo activity for this Announce (async)."""
+        actor = await self.get_actor()
+        with offline_parsing():
+            return Undo(actor=actor.id, object=self.to_dict(embed=True))
+
     def build_undo(self) -> BaseActivity:
-        return Undo(
-            actor=self.get_actor_sync().id, object=self.to_dict(embed=True)
-        )
+        """Builds the Undo activity for this Announce (sync wrapper).
+
+        For async code, use await build_undo_async() instead.
+        """
+        return _run_sync(self.build_undo_async())
 
 
 class Delete(BaseActivity):
@@ -1092,22 +1682,22 @@ class Delete(BaseActivity):
             obj.id.startswith(backend.base_url())
             and obj.ACTIVITY_TYPE == ActivityType.TOMBSTONE
         ):
-            result = backend.fetch_iri_sync(obj.id)
-            obj = parse_activity(await _await_if_coroutine(result))
+            result = backend.fetch_iri(obj.id)
+            obj = await parse_activity_async(await _await_if_coroutine(result))
         if obj.ACTIVITY_TYPE == ActivityType.TOMBSTONE:
-            result = backend.fetch_iri_sync(obj.id)
+            result = backend.fetch_iri(obj.id)
             better_obj = await _await_if_coroutine(result)
             if better_obj:
-                return parse_activity(better_obj)
+                return await parse_activity_async(better_obj)
         return obj
 
     def _get_actual_object_sync(self) -> BaseActivity:
         """Get the actual object being deleted (sync wrapper)."""
         return _run_sync(self._get_actual_object())
 
-    def _recipients(self) -> List[str]:
-        obj = self._get_actual_object_sync()
-        return obj._recipients()
+    async def _recipients_async(self) -> List[str]:
+        obj = await _await_if_coroutine(self._get_actual_object())
+        return await obj._get_recipients()
 
 
 class Update(BaseActivity):
@@ -1116,14 +1706,14 @@ class Update(BaseActivity):
     OBJECT_REQUIRED = True
     ACTOR_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
+    async def _recipients_async(self) -> List[str]:
         # TODO(tsileo): audience support?
         recipients = []
         for field in ["to", "cc", "bto", "bcc"]:
             if field in self._data:
                 recipients.extend(_to_list(self._data[field]))
 
-        recipients.extend(self.get_object_sync()._recipients())
+        recipients.extend(await (await self.get_object())._get_recipients())
 
         return recipients
 
@@ -1152,17 +1742,43 @@ class Create(BaseActivity):
         if "url" not in self._data["object"]:
             self._data["object"]["url"] = backend.note_url(obj_id)
         if isinstance(self.ctx(), Note):
-            try:
-                self.ctx().id = self._data["object"]["id"]
-            except NotImplementedError:
-                pass
+            self.ctx()._data["id"] = self._data["object"]["id"]
         self.reset_object_cache()
 
     def _init(self) -> None:
+        if _OFFLINE_PARSING.get():
+            self._init_offline()
+            return
+
         obj = self.get_object_sync()
         if not obj.attributedTo:
             self._data["object"]["attributedTo"] = self.get_actor_sync().id
-        if not obj.published:
+        self._init_published(obj.published)
+
+    def _init_offline(self) -> None:
+        if not isinstance(self._data.get("object"), dict):
+            # Can't be checked without fetching it
+            return
+
+        # Parsing the embedded object doesn't need the network
+        parse_activity(self._data["object"])
+        if not self._data["object"].get("attributedTo"):
+            self._data["object"]["attributedTo"] = self._data["actor"]
+        self._init_published(self._data["object"].get("published"))
+
+    def _actors_to_validate(self) -> List[str]:
+        actor_ids = super()._actors_to_validate()
+        obj = self._data.get("object")
+        if isinstance(obj, dict):
+            # The regular parsing validates the embedded object too
+            embedded = parse_activity(obj, offline=True)
+            for actor_id in embedded._actors_to_validate():
+                if actor_id not in actor_ids:
+                    actor_ids.append(actor_id)
+        return actor_ids
+
+    def _init_published(self, obj_published: Optional[str]) -> None:
+        if not obj_published:
             if self.published:
                 self._data["object"]["published"] = self.published
             else:
@@ -1170,25 +1786,36 @@ class Create(BaseActivity):
                 self._data["published"] = now
                 self._data["object"]["published"] = now
 
-    def _recipients(self) -> List[str]:
+    async def _recipients_async(self) -> List[str]:
         # TODO(tsileo): audience support?
         recipients = []
         for field in ["to", "cc", "bto", "bcc"]:
             if field in self._data:
                 recipients.extend(_to_list(self._data[field]))
 
-        recipients.extend(self.get_object_sync()._recipients())
+        recipients.extend(await (await self.get_object())._get_recipients())
 
         return recipients
 
-    def get_tombstone(self, deleted: Optional[str] = None) -> BaseActivity:
+    async def get_tombstone_async(
+        self, deleted: Optional[str] = None
+    ) -> BaseActivity:
+        """Builds the Tombstone replacing the object of this Create (async)."""
+        obj = await self.get_object()
         return Tombstone(
             id=self.id,
-            published=self.get_object_sync().published,
+            published=obj.published,
             deleted=deleted,
             updated=deleted,
         )
 
+    def get_tombstone(self, deleted: Optional[str] = None) -> BaseActivity:
+        """Builds the Tombstone replacing the object of this Create (sync wrapper).
+
+        For async code, use await get_tombstone_async() instead.
+        """
+        return _run_sync(self.get_tombstone_async(deleted))
+
 
 class Tombstone(BaseActivity):
     ACTIVITY_TYPE = ActivityType.TOMBSTONE
@@ -1232,11 +1859,11 @@ class Flag(BaseActivity):
     OBJECT_REQUIRED = True
     ACTOR_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
-        obj = self.get_object_sync()
+    async def _recipients_async(self) -> List[str]:
+        obj = await self.get_object()
         if obj.ACTIVITY_TYPE in ACTOR_TYPES:
             return [obj.id]
-        return [obj.get_actor_sync().id]
+        return [(await obj.get_actor()).id]
 
 
 class Move(BaseActivity):
@@ -1252,8 +1879,8 @@ class Move(BaseActivity):
     ACTOR_REQUIRED = True
     TARGET_REQUIRED = False
 
-    def _recipients(self) -> List[str]:
-        obj = self.get_object_sync()
+    async def _recipients_async(self) -> List[str]:
+        obj = await self.get_object()
         return [obj.id]
 
 
@@ -1268,8 +1895,8 @@ class Join(BaseActivity):
     OBJECT_REQUIRED = True
     ACTOR_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
-        return [self.get_object_sync().id]
+    async def _recipients_async(self) -> List[str]:
+        return [(await self.get_object()).id]
 
 
 class Leave(BaseActivity):
@@ -1283,8 +1910,8 @@ class Leave(BaseActivity):
     OBJECT_REQUIRED = True
     ACTOR_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
-        return [self.get_object_sync().id]
+    async def _recipients_async(self) -> List[str]:
+        return [(await self.get_object()).id]
 
 
 class View(BaseActivity):
@@ -1298,10 +1925,10 @@ class View(BaseActivity):
     OBJECT_REQUIRED = True
     ACTOR_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
-        obj = self.get_object_sync()
+    async def _recipients_async(self) -> List[str]:
+        obj = await self.get_object()
         if obj.ACTIVITY_TYPE in CREATE_TYPES:
-            return [obj.get_actor_sync().id]
+            return [(await obj.get_actor()).id]
         return []
 
 
@@ -1316,9 +1943,9 @@ class Listen(BaseActivity):
     OBJECT_REQUIRED = True
     ACTOR_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
-        obj = self.get_object_sync()
-        return [obj.get_actor_sync().id]
+    async def _recipients_async(self) -> List[str]:
+        obj = await self.get_object()
+        return [(await obj.get_actor()).id]
 
 
 class Read(BaseActivity):
@@ -1332,10 +1959,10 @@ class Read(BaseActivity):
     OBJECT_REQUIRED = True
     ACTOR_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
-        obj = self.get_object_sync()
+    async def _recipients_async(self) -> List[str]:
+        obj = await self.get_object()
         if obj.ACTIVITY_TYPE in CREATE_TYPES:
-            return [obj.get_actor_sync().id]
+            return [(await obj.get_actor()).id]
         return []
 
 
@@ -1351,13 +1978,13 @@ class Write(BaseActivity):
     ACTOR_REQUIRED = True
     TARGET_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
+    async def _recipients_async(self) -> List[str]:
         recipients = []
         if self.target:
             recipients.append(self.get_target())
-        obj = self.get_object_sync()
+        obj = await self.get_object()
         if obj.ACTIVITY_TYPE in CREATE_TYPES:
-            recipients.append(obj.get_actor_sync().id)
+            recipients.append((await obj.get_actor()).id)
         return recipients
 
 
@@ -1373,7 +2000,7 @@ class Travel(BaseActivity):
     ACTOR_REQUIRED = True
     TARGET_REQUIRED = False
 
-    def _recipients(self) -> List[str]:
+    async def _recipients_async(self) -> List[str]:
         return []
 
 
@@ -1388,7 +2015,7 @@ class Arrive(BaseActivity):
     OBJECT_REQUIRED = True
     ACTOR_REQUIRED = True
 
-    def _recipients(self) -> List[str]:
+    async def _recipients_async(self) -> List[str]:
         return []
 
 
@@ -1411,6 +2038,9 @@ class Note(BaseActivity):
 
         return recipients
 
+    async def _recipients_async(self) -> List[str]:
+        return self._recipients()
+
     def build_create(self) -> BaseActivity:
         """Wraps an activity in a Create activity."""
         create_payload = {
@@ -1583,6 +2213,27 @@ class OrderedCollectionPage(BaseActivity):
     ACTOR_REQUIRED = False
 
 
+async def _resolve_recipient(
+    iri: str, stored: Dict[str, ObjectType]
+) -> Optional[BaseActivity]:
+    """Returns the recipient from `stored`, or fetch it (None if it fails)."""
+    if iri in stored:
+        return await parse_activity_async(stored[iri])
+
+    try:
+        return await fetch_remote_activity(iri)
+    except (
+        ActivityGoneError,
+        ActivityNotFoundError,
+        NotAnActivityError,
+    ):
+        logger.info(f"{iri} is gone")
+    except ActivityUnavailableError:
+        # TODO(tsileo): retry separately?
+        logger.info(f"failed to fetch recipient {iri}")
+    return None
+
+
 async def fetch_remote_activity(
     iri: str, expected: Optional[ActivityType] = None
 ) -> BaseActivity:
@@ -1598,7 +2249,7 @@ async def fetch_remote_activity(
     backend = get_backend()
     result = backend.fetch_iri(iri)
     obj = await _await_if_coroutine(result)
-    return parse_activity(obj, expected=expected)
+    return await parse_activity_async(obj, expected=expected)
 
 
 def fetch_remote_activity_sync(
@@ -5,52 +5,65 @@ All network I/O is async using aiohttp.
 """
 
 import abc
-import asyncio
 import binascii
 import os
+import threading
+import time
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional, TYPE_CHECKING
 
-from .http_client import check_url, get_http_client
-from .__version__ import __version__
+from .http_client import AsyncHTTPClient, check_url, get_http_client
+from .http_client import _run_sync
+from .__version__ import get_version
+from .budget import current_fetch_budget
 from .collection import parse_collection
 from .errors import ActivityGoneError
 from .errors import ActivityNotFoundError
 from .errors import ActivityUnavailableError
+from .errors import FetchBudgetExceededError
 from .errors import NotAnActivityError
+from .ids import IDGenerator
 from .urlutils import URLLookupFailedError
 
 if TYPE_CHECKING:
     from active_boxes import activitypub as ap
 
 
-def _run_sync(coro):
-    """Run an async coroutine from sync code.
+class LRUCache:
+    """A thread-safe mapping that keeps the `maxsize` most recently used items."""
 
-    This enables Flask/Django and other sync frameworks to use the library.
-    For new code, prefer async/await syntax.
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._items: OrderedDict[Any, Any] = OrderedDict()
+        self._lock = threading.Lock()
 
-    Args:
-        coro: A coroutine to run
+    def __len__(self) -> int:
+        return len(self._items)
 
-    Returns:
-        The result of the coroutine
+    def __contains__(self, key: Any) -> bool:
+        return key in self._items
 
-    Raises:
-        RuntimeError: If called from within an async context
-    """
-    if not asyncio.iscoroutine(coro):
-        return coro
-
-    try:
-        asyncio.get_running_loop()
-        raise RuntimeError(
-            "Cannot run async code from within an async context. "
-            "Use 'await' instead of the _sync() wrapper."
-        )
-    except RuntimeError as e:
-        if "no running event loop" in str(e):
-            return asyncio.run(coro)
-        raise
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def pop(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            return self._items.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
 
 
 class Backend(abc.ABC):
@@ -59,8 +72,19 @@ class Backend(abc.ABC):
     This class provides async network I/O methods for the library.
     Apps should subclass this and implement the abstract methods,
     or implement the ActivityPubPlugin protocol.
+
+    Several backends (e.g. one per tenant) can share a process, see
+    `activitypub.using_backend()`. Each backend has its own caches, and can
+    have its own HTTP client (they share the one of the event loop by
+    default).
     """
 
+    # Set with `use_http_client()`
+    _http_client: Optional[AsyncHTTPClient] = None
+    # Set with `use_id_generator()`
+    _id_generator: Optional[IDGenerator] = None
+    _caches: Optional[Dict[str, LRUCache]] = None
+
     def debug_mode(self) -> bool:
         """Override to enable debug mode."""
         return False
@@ -76,11 +100,67 @@ class Backend(abc.ABC):
         """
         _run_sync(check_url(url, debug=self.debug_mode()))
 
+    def use_http_client(self, client: Optional[AsyncHTTPClient]) -> None:
+        """Use a dedicated HTTP client for this backend.
+
+        Pass None to use the process-wide client (and its connection pool)
+        again.
+        """
+        self._http_client = client
+
+    async def get_http_client(self) -> AsyncHTTPClient:
+        """Returns the HTTP client used by this backend (async)."""
+        if self._http_client is not None:
+            return self._http_client
+        return await get_http_client()
+
+    async def close(self) -> None:
+        """Close the dedicated HTTP client of this backend, if any (async)."""
+        if self._http_client is not None:
+            await self._http_client.close()
+
+    def close_sync(self) -> None:
+        """Close the dedicated HTTP client of this backend (sync wrapper).
+
+        For async code, use await close() instead.
+        """
+        _run_sync(self.close())
+
+    def cache(self, name: str, maxsize: int = 1024) -> LRUCache:
+        """Returns the cache called `name` of this backend.
+
+        The caches are per backend, so tenants sharing a process never see
+        each other's cached data. `maxsize` only applies when the cache is
+        created.
+        """
+        if self._caches is None:
+            self._caches = {}
+        if (cache := self._caches.get(name)) is None:
+            cache = self._caches.setdefault(name, LRUCache(maxsize))
+        return cache
+
+    def clear_caches(self) -> None:
+        """Clear all the caches of this backend."""
+        for cache in (self._caches or {}).values():
+            cache.clear()
+
     def user_agent(self) -> str:
-        return f"Active Boxes/{__version__}; +http://github.com/tsileo/little-boxes)"
+        return f"Active Boxes/{get_version()}; +http://github.com/tsileo/little-boxes)"
+
+    def use_id_generator(self, generator: Optional[IDGenerator]) -> None:
+        """Generate the object IDs with `generator` (e.g. time-ordered IDs).
+
+        See `active_boxes.ids`. Pass None to use random IDs again.
+        """
+        self._id_generator = generator
 
     def random_object_id(self) -> str:
-        """Generate a random object ID."""
+        """Generate a new object ID.
+
+        Random by default, see `use_id_generator()` for time-ordered IDs.
+        """
+        if self._id_generator is not None:
+            return self._id_generator()
         return binascii.hexlify(os.urandom(8)).decode("utf-8")
 
     async def fetch_json(self, url: str, **kwargs) -> Dict[str, Any]:
@@ -95,15 +175,39 @@ class Backend(abc.ABC):
         """
         await self.check_url(url)
 
-        client = await get_http_client()
+        client = await self.get_http_client()
         headers = {
             "User-Agent": self.user_agent(),
             "Accept": "application/activity+json, application/json",
         }
         headers.update(kwargs.pop("headers", {}))
 
-        resp = await client.get_json(url, headers=headers, **kwargs)
-        return resp
+        return await self._budgeted_get_json(client, url, headers, kwargs)
+
+    async def _budgeted_get_json(
+        self,
+        client: AsyncHTTPClient,
+        url: str,
+        headers: Dict[str, str],
+        kwargs: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """GET `url` within the fetch budget of the current unit of work."""
+        budget = current_fetch_budget()
+        if budget is None:
+            return await client.get_json(url, headers=headers, **kwargs)
+
+        budget.begin_fetch(url)
+        remaining = budget.remaining_time()
+        if remaining is not None:
+            timeout = kwargs.get("timeout") or client.timeout
+            kwargs["timeout"] = min(timeout, remaining)
+        start = time.monotonic()
+        try:
+            return await client.get_json(
+                url, headers=headers, budget=budget, **kwargs
+            )
+        finally:
+            budget.end_fetch(url, time.monotonic() - start)
 
     def fetch_json_sync(self, url: str, **kwargs) -> Dict[str, Any]:
         """Fetch JSON from a URL (sync wrapper).
@@ -161,6 +265,10 @@ class Backend(abc.ABC):
 
         Returns:
             ActivityPub object dict
+
+        Raises:
+            FetchBudgetExceededError: If the fetch budget of the current unit
+                of work (see `fetch_budget()`) is exhausted
         """
         if not iri.startswith("http"):
             raise NotAnActivityError(f"{iri} is not a valid IRI")
@@ -173,15 +281,16 @@ class Backend(abc.ABC):
             )
 
         try:
-            client = await get_http_client()
+            client = await self.get_http_client()
             headers = {
                 "User-Agent": self.user_agent(),
                 "Accept": "application/activity+json, application/json",
             }
 
-            resp = await client.get_json(iri, headers=headers, **kwargs)
-            return resp
+            return await self._budgeted_get_json(client, iri, headers, kwargs)
 
+        except FetchBudgetExceededError:
+            raise
         except ActivityNotFoundError:
             raise
         except ActivityGoneError:
@@ -240,7 +349,7 @@ class AsyncBackend(Backend):
         """
         await self.check_url(url)
 
-        client = await get_http_client()
+        client = await self.get_http_client()
         json_headers = {
             "User-Agent": self.user_agent(),
             "Content-Type": "application/activity+json",
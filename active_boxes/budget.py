@@ -0,0 +1,218 @@
+"""Budget and accounting of the remote fetches made for a unit of work.
+
+Processing a single inbound activity can fan out into many remote fetches:
+the actor, the object, the recipients (and their collections), the keys...
+A crafted activity can exploit that as an amplification vector.
+`fetch_budget()` caps the fetches made by `Backend.fetch_iri()` (and
+`Backend.fetch_json()`) within its block, including the tasks started from
+it, and records what was fetched.
+
+Example usage:
+    from active_boxes.budget import SlowFetchLog, fetch_budget
+
+    slow_log = SlowFetchLog()
+
+    async def inbox(payload):
+        with fetch_budget(max_fetches=20, max_bytes=2**21, timeout=10) as b:
+            activity = await ap.parse_activity_async(payload)
+            ...
+        slow_log.observe(b, activity.id)
+"""
+
+import contextlib
+import contextvars
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import Iterator
+from typing import Optional
+from urllib.parse import urlparse
+
+from .errors import FetchBudgetExceededError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class HostStats:
+    """The fetches made to a host."""
+
+    fetches: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+
+class FetchBudget:
+    """Limits (None for no limit) and accounting of the remote fetches.
+
+    Args:
+        max_fetches: Maximum number of fetches
+        max_bytes: Maximum number of bytes received (response bodies)
+        timeout: Number of seconds after which fetches are refused (the
+            in-flight ones are cut short too)
+    """
+
+    def __init__(
+        self,
+        max_fetches: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        self.max_fetches = max_fetches
+        self.max_bytes = max_bytes
+        self.started = time.monotonic()
+        self.deadline = None if timeout is None else self.started + timeout
+        self.finished: Optional[float] = None
+        self.fetches = 0
+        self.bytes = 0
+        self.hosts: Dict[str, HostStats] = {}
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the budget started (until the end of its block)."""
+        end = time.monotonic() if self.finished is None else self.finished
+        return end - self.started
+
+    def remaining_time(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def remaining_bytes(self) -> Optional[int]:
+        if self.max_bytes is None:
+            return None
+        return max(self.max_bytes - self.bytes, 0)
+
+    def _host(self, url: str) -> HostStats:
+        host = urlparse(url).netloc
+        if (stats := self.hosts.get(host)) is None:
+            stats = self.hosts[host] = HostStats()
+        return stats
+
+    def begin_fetch(self, url: str) -> None:
+        """Account for a new fetch of `url`.
+
+        Raises:
+            FetchBudgetExceededError: If the budget is exhausted
+        """
+        if self.max_fetches is not None and self.fetches >= self.max_fetches:
+            raise FetchBudgetExceededError(
+                f"cannot fetch {url}, too many fetches ({self.fetches})"
+            )
+        if self.max_bytes is not None and self.bytes >= self.max_bytes:
+            raise FetchBudgetExceededError(
+                f"cannot fetch {url}, too many bytes received ({self.bytes})"
+            )
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise FetchBudgetExceededError(f"cannot fetch {url}, out of time")
+
+        self.fetches += 1
+        self._host(url).fetches += 1
+
+    def end_fetch(self, url: str, seconds: float) -> None:
+        """Account for the time spent fetching `url`."""
+        self._host(url).seconds += seconds
+
+    def add_bytes(self, url: str, size: int) -> None:
+        """Account for `size` bytes received from `url`.
+
+        Raises:
+            FetchBudgetExceededError: If more bytes than allowed were received
+        """
+        self.bytes += size
+        self._host(url).bytes += size
+        if self.max_bytes is not None and self.bytes > self.max_bytes:
+            raise FetchBudgetExceededError(
+                f"response of {url} is too large ({self.bytes} bytes received)"
+            )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the accounting record (meant to be logged)."""
+        return {
+            "fetches": self.fetches,
+            "bytes": self.bytes,
+            "elapsed": round(self.elapsed, 6),
+            "hosts": {
+                host: {
+                    "fetches": stats.fetches,
+                    "bytes": stats.bytes,
+                    "seconds": round(stats.seconds, 6),
+                }
+                for host, stats in self.hosts.items()
+            },
+        }
+
+    def __repr__(self) -> str:
+        return f"<FetchBudget {self.to_dict()!r}>"
+
+
+_CURRENT_BUDGET: contextvars.ContextVar[Optional[FetchBudget]] = (
+    contextvars.ContextVar("active_boxes_fetch_budget", default=None)
+)
+
+
+def current_fetch_budget() -> Optional[FetchBudget]:
+    """Returns the budget of the current unit of work, if any."""
+    return _CURRENT_BUDGET.get()
+
+
+@contextlib.contextmanager
+def fetch_budget(
+    max_fetches: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Iterator[FetchBudget]:
+    """Enforce a budget on the remote fetches made within the block.
+
+    Like `using_backend()`, it's context-local: concurrent units of work each
+    have their own budget, and the tasks started within the block share it.
+    When nested, the innermost budget applies.
+
+    Raises:
+        FetchBudgetExceededError: From the fetches, once the budget is
+            exhausted
+    """
+    budget = FetchBudget(max_fetches, max_bytes, timeout)
+    token = _CURRENT_BUDGET.set(budget)
+    try:
+        yield budget
+    finally:
+        budget.finished = time.monotonic()
+        _CURRENT_BUDGET.reset(token)
+
+
+class SlowFetchLog:
+    """Log the accounting record of the slowest units of work.
+
+    Keeps the durations of the last `window` units of work, and logs the
+    ones above the `quantile` (e.g. the slowest 1%).
+    """
+
+    def __init__(
+        self,
+        quantile: float = 0.99,
+        window: int = 1000,
+        min_samples: int = 100,
+    ) -> None:
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self._durations: Deque[float] = deque(maxlen=window)
+
+    def observe(self, budget: FetchBudget, name: str = "") -> bool:
+        """Record a finished unit of work, returns True if it was logged."""
+        elapsed = budget.elapsed
+        self._durations.append(elapsed)
+        if len(self._durations) < self.min_samples:
+            return False
+
+        durations = sorted(self._durations)
+        threshold = durations[int(self.quantile * (len(durations) - 1))]
+        if elapsed < threshold:
+            return False
+
+        logger.warning("slow fetches for %s: %r", name, budget.to_dict())
+        return True
@@ -0,0 +1,203 @@
+"""Bulk parsing of activities stored as JSON lines (NDJSON).
+
+Replaying or re-indexing an archive of activities with `parse_activity()` is
+bound to a single core. `parse_ndjson()` splits the lines in chunks, decodes
+and parses them offline (see `offline_parsing()`: no network I/O) across a
+pool of processes, and streams the activities back, in the input order or as
+soon as they're ready. Malformed records are sent to an error sink instead of
+aborting the whole run.
+
+Example usage:
+    from active_boxes.bulk import parse_ndjson
+
+    failures = []
+    for activity in parse_ndjson("outbox.ndjson", on_error=failures.append):
+        index(activity)
+
+    for failure in failures:
+        print(f"line {failure.lineno}: {failure.error!r}")
+"""
+
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from typing import Any
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+from .activitypub import ActivityType
+from .activitypub import BaseActivity
+from .activitypub import _FrozenList
+from .activitypub import _reintern_context
+from .activitypub import offline_parsing
+from .activitypub import parse_activity
+
+logger = logging.getLogger(__name__)
+
+Line = Union[str, bytes]
+Source = Union[str, "os.PathLike[str]", Iterable[Line]]
+
+
+class ParseFailure(NamedTuple):
+    """A record that could not be parsed."""
+
+    lineno: int  # 1-based line number in the source
+    line: str
+    error: Exception
+
+
+ErrorSink = Callable[[ParseFailure], Any]
+_Chunk = Tuple[int, List[Line]]
+_Result = List[Union[BaseActivity, ParseFailure]]
+
+
+def _iter_lines(source: Source) -> Iterator[Line]:
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield from f
+    else:
+        yield from source
+
+
+def _chunks(lines: Iterable[Line], chunk_size: int) -> Iterator[_Chunk]:
+    start = 1
+    chunk: List[Line] = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield start, chunk
+            start += chunk_size
+            chunk = []
+    if chunk:
+        yield start, chunk
+
+
+def _parse_chunk(
+    start: int, lines: List[Line], expected: Optional[ActivityType]
+) -> _Result:
+    """Parse a chunk of lines (runs in the worker processes)."""
+    out: _Result = []
+    with offline_parsing():
+        for lineno, line in enumerate(lines, start):
+            if not line.strip():
+                continue
+            try:
+                out.append(parse_activity(json.loads(line), expected))
+            except Exception as exc:
+                if isinstance(line, bytes):
+                    line = line.decode("utf-8", errors="replace")
+                out.append(ParseFailure(lineno, line.rstrip("\r\n"), exc))
+    return out
+
+
+def _log_failure(failure: ParseFailure) -> None:
+    logger.warning(f"failed to parse line {failure.lineno}: {failure.error!r}")
+
+
+def _emit(result: _Result, on_error: ErrorSink) -> Iterator[BaseActivity]:
+    # Activities built in another process have their own copy of the
+    # context, share the interned one again
+    contexts: Dict[int, Any] = {}
+    for item in result:
+        if isinstance(item, ParseFailure):
+            on_error(item)
+            continue
+
+        ctx = item._data.get("@context")
+        if isinstance(ctx, _FrozenList):
+            if (shared := contexts.get(id(ctx))) is None:
+                shared = contexts[id(ctx)] = _reintern_context(ctx)
+            item._data["@context"] = shared
+        yield item
+
+
+def parse_ndjson(
+    source: Source,
+    expected: Optional[ActivityType] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = 1000,
+    ordered: bool = True,
+    on_error: Optional[ErrorSink] = None,
+    executor: Optional[Executor] = None,
+) -> Iterator[BaseActivity]:
+    """Parse activities from JSON lines, across a pool of processes.
+
+    The activities are parsed offline: the actors are not fetched, use
+    `validate_activities()` to check them if needed. Empty lines are skipped.
+
+    Args:
+        source: Path of an NDJSON file, or an iterable of lines (str or bytes)
+        expected: Reject the activities that are not of this type
+        workers: Number of processes (defaults to the number of CPUs),
+            0 or 1 parses everything in the current process
+        chunk_size: Number of lines sent to a worker at once
+        ordered: Yield the activities in the input order, otherwise yield
+            them as soon as a chunk is parsed
+        on_error: Called with a `ParseFailure` for each malformed record
+            (logged by default)
+        executor: Use this executor instead of a new process pool (it's not
+            shut down)
+
+    Returns:
+        An iterator over the parsed activities
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    on_error = on_error or _log_failure
+    chunks = _chunks(_iter_lines(source), chunk_size)
+
+    if executor is None and workers <= 1:
+        for start, lines in chunks:
+            yield from _emit(_parse_chunk(start, lines, expected), on_error)
+        return
+
+    pool = executor or ProcessPoolExecutor(max_workers=workers)
+    # Keep the workers busy without reading the whole source in memory
+    max_pending = 2 * max(workers, 1)
+    queue: Deque[Future] = deque()
+    pending: Set[Future] = set()
+
+    def _next_result() -> _Result:
+        if ordered:
+            return queue.popleft().result()
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        future = done.pop()
+        pending.remove(future)
+        return future.result()
+
+    try:
+        for start, lines in chunks:
+            future = pool.submit(_parse_chunk, start, lines, expected)
+            if ordered:
+                queue.append(future)
+            else:
+                pending.add(future)
+            if len(queue) + len(pending) >= max_pending:
+                yield from _emit(_next_result(), on_error)
+
+        while queue or pending:
+            yield from _emit(_next_result(), on_error)
+    finally:
+        for future in queue:
+            future.cancel()
+        for future in pending:
+            future.cancel()
+        if executor is None:
+            pool.shutdown(cancel_futures=True)
@@ -0,0 +1,500 @@
+"""Fast-path RDF canonicalization for the common ActivityPub contexts.
+
+Canonicalizing a document with pyld (`jsonld.normalize`) expands it against
+the full context, builds a node map and runs the generic URDNA2015 algorithm,
+which dominates the cost of Linked Data Signatures.
+
+Almost every ActivityPub document only uses the ActivityStreams, security/v1
+and identity/v1 contexts (plus a small inline context of simple terms, like
+the one sent by Mastodon), so `normalize()` handles that subset directly:
+the bundled contexts are compiled once into term maps, the document is turned
+into quads in a single pass, and blank nodes are labeled from their
+first-degree hashes.
+
+Anything outside of the supported subset (`@list` containers, floats, scoped
+contexts, blank nodes that need the n-degree hashing...) makes `normalize()`
+return None, and the caller falls back to pyld. When it returns a string, it
+is byte for byte what pyld returns for URDNA2015 N-Quads.
+"""
+
+import hashlib
+import json
+import re
+from functools import lru_cache
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+XSD = "http://www.w3.org/2001/XMLSchema#"
+XSD_BOOLEAN = XSD + "boolean"
+XSD_DOUBLE = XSD + "double"
+XSD_INTEGER = XSD + "integer"
+XSD_STRING = XSD + "string"
+RDF_TYPE = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>"
+
+# Same definition as pyld, so relative IRIs are dropped/rejected alike
+_ABSOLUTE_IRI = re.compile(r"^([A-Za-z][A-Za-z0-9+-.]*|_):[^\s]*$")
+_GEN_DELIM_END = re.compile(r".*[:/\?#\[\]@]$")
+
+_SUPPORTED_CONTAINERS = (None, "@set", "@language")
+
+# A blank node is an int, anything else is an already serialized N-Quads term
+_Node = Union[int, str]
+_Quad = Tuple[_Node, str, _Node]
+
+
+class _Unsupported(Exception):
+    """The document is outside of the subset handled by the fast path."""
+
+
+class _Term:
+    __slots__ = ("iri", "type", "container", "prefix", "supported")
+
+    def __init__(
+        self,
+        iri: Optional[str],
+        type_: Optional[str] = None,
+        container: Optional[str] = None,
+        prefix: bool = False,
+        supported: bool = True,
+    ) -> None:
+        self.iri = iri
+        self.type = type_
+        self.container = container
+        self.prefix = prefix
+        self.supported = supported
+
+
+_UNSUPPORTED_TERM = _Term(None, supported=False)
+
+
+class _Context:
+    __slots__ = ("terms", "vocab")
+
+    def __init__(self, terms: Dict[str, _Term], vocab: Optional[str]) -> None:
+        self.terms = terms
+        self.vocab = vocab
+
+
+def _expand_iri(
+    ctx: _Context,
+    value: str,
+    vocab: bool,
+    local: Optional[Dict[str, Any]] = None,
+    defined: Optional[Dict[str, bool]] = None,
+) -> Optional[str]:
+    """Expand a term, compact IRI or IRI like pyld's `_expand_iri`.
+
+    Relative IRIs are returned as is, it's up to the caller to reject them.
+    """
+    if value.startswith("@"):
+        raise _Unsupported(value)
+
+    if local is not None and value in local and not defined.get(value):  # type: ignore
+        _define(ctx, local, value, defined)  # type: ignore
+
+    if vocab and value in ctx.terms:
+        term = ctx.terms[value]
+        if not term.supported:
+            raise _Unsupported(value)
+        return term.iri
+
+    colon = value.find(":")
+    if colon > 0:
+        prefix, suffix = value[:colon], value[colon + 1 :]
+        if prefix == "_" or suffix.startswith("//"):
+            return value
+        if local is not None and prefix in local and not defined.get(prefix):  # type: ignore
+            _define(ctx, local, prefix, defined)  # type: ignore
+        term = ctx.terms.get(prefix)  # type: ignore
+        if term is not None and term.prefix:
+            return term.iri + suffix  # type: ignore
+        if _ABSOLUTE_IRI.match(value):
+            return value
+
+    if vocab and ctx.vocab is not None:
+        return ctx.vocab + value
+
+    return value
+
+
+def _define(
+    ctx: _Context,
+    local: Dict[str, Any],
+    term: str,
+    defined: Dict[str, bool],
+) -> None:
+    """Compile the definition of `term` from the `local` context."""
+    if term in defined:
+        if defined[term]:
+            return
+        raise _Unsupported(f"cyclic definition for {term}")
+    defined[term] = False
+
+    if ":" in term or term.startswith("@"):
+        raise _Unsupported(term)
+
+    value = local[term]
+    simple = value is None or isinstance(value, str)
+    if simple:
+        value = {"@id": value}
+    elif not isinstance(value, dict):
+        raise _Unsupported(term)
+
+    iri = value.get("@id")
+    if (
+        "@id" not in value
+        or set(value) - {"@id", "@type", "@container"}
+        or (iri is not None and not isinstance(iri, str))
+    ):
+        ctx.terms[term] = _UNSUPPORTED_TERM
+        defined[term] = True
+        return
+
+    if iri is None:
+        ctx.terms[term] = _Term(None)
+    elif iri in ("@id", "@type"):
+        ctx.terms[term] = _Term(iri) if len(value) == 1 else _UNSUPPORTED_TERM
+    elif iri.startswith("@"):
+        ctx.terms[term] = _UNSUPPORTED_TERM
+    else:
+        expanded = _expand_iri(ctx, iri, True, local, defined)
+        type_ = value.get("@type")
+        if type_ is not None and type_ != "@id":
+            if not isinstance(type_, str) or type_.startswith("@"):
+                type_ = ""
+            else:
+                type_ = _expand_iri(ctx, type_, True, local, defined)
+        container = value.get("@container")
+        if isinstance(container, list) and len(container) == 1:
+            container = container[0]
+
+        if (
+            expanded is None
+            or not _ABSOLUTE_IRI.match(expanded)
+            or expanded.startswith("_:")
+            or container not in _SUPPORTED_CONTAINERS
+            or (
+                type_ is not None
+                and type_ != "@id"
+                and (not type_ or not _ABSOLUTE_IRI.match(type_))
+            )
+        ):
+            ctx.terms[term] = _UNSUPPORTED_TERM
+        else:
+            ctx.terms[term] = _Term(
+                expanded,
+                type_,
+                container,
+                prefix=simple and bool(_GEN_DELIM_END.match(expanded)),
+            )
+
+    defined[term] = True
+
+
+def _compile(
+    base: _Context, local: Dict[str, Any], bundled: bool = False
+) -> _Context:
+    """Return a new active context with the `local` context applied."""
+    ctx = _Context(dict(base.terms), base.vocab)
+    defined: Dict[str, bool] = {}
+    for key, value in local.items():
+        if key.startswith("@"):
+            if (
+                bundled
+                and key == "@vocab"
+                and isinstance(value, str)
+                and _ABSOLUTE_IRI.match(value)
+            ):
+                ctx.vocab = value
+                continue
+            raise _Unsupported(key)
+    for key in local:
+        if not key.startswith("@"):
+            _define(ctx, local, key, defined)
+    return ctx
+
+
+@lru_cache(maxsize=None)
+def _bundled_context(url: str) -> Dict[str, Any]:
+    from .linked_data_sig import _load_bundled
+
+    return _load_bundled(url)["document"]["@context"]
+
+
+@lru_cache(maxsize=256)
+def _compiled_context(contexts: Tuple[str, ...]) -> Optional[_Context]:
+    """Compile a list of bundled context URLs and JSON-encoded inline contexts.
+
+    Results are memoized, so the term maps of the well-known contexts (and of
+    the inline contexts sent by the common servers) are only built once. None
+    means the contexts are not supported by the fast path.
+    """
+    from .linked_data_sig import _BUNDLED_CONTEXTS
+
+    ctx = _Context({}, None)
+    try:
+        for item in contexts:
+            if item.startswith("{"):
+                ctx = _compile(ctx, json.loads(item))
+            elif item in _BUNDLED_CONTEXTS:
+                ctx = _compile(ctx, _bundled_context(item), bundled=True)
+            else:
+                return None
+    except (_Unsupported, AttributeError, TypeError):
+        # Invalid contexts are reported by pyld
+        return None
+    return ctx
+
+
+def _active_context(context: Any) -> _Context:
+    if not isinstance(context, list):
+        context = [context]
+    key = []
+    for item in context:
+        if isinstance(item, str):
+            key.append(item)
+        elif isinstance(item, dict):
+            key.append(json.dumps(item, sort_keys=True))
+        else:
+            raise _Unsupported("@context")
+    if (ctx := _compiled_context(tuple(key))) is None:
+        raise _Unsupported("@context")
+    return ctx
+
+
+def _escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+        .replace('"', '\\"')
+    )
+
+
+def _literal(value: str, datatype: str) -> str:
+    if datatype == XSD_STRING:
+        return f'"{_escape(value)}"'
+    return f'"{_escape(value)}"^^<{datatype}>'
+
+
+class _ToRDF:
+    """Turn an expanded-on-the-fly document into quads (the default graph)."""
+
+    def __init__(self, ctx: _Context) -> None:
+        self.ctx = ctx
+        self.quads: List[_Quad] = []
+        self.seen: Dict[Any, str] = {}
+        self.blank_nodes = 0
+
+    def _add(
+        self, subject: _Node, predicate: str, obj: _Node, key: Any
+    ) -> None:
+        # pyld merges equal values of a property in its node map (with Python
+        # equality, so `True == 1`), mimic it and bail out on ambiguous cases
+        if key is not None:
+            key = (subject, predicate, key)
+            if (previous := self.seen.get(key)) is not None:
+                if previous != obj:
+                    raise _Unsupported("ambiguous duplicate value")
+                return
+            self.seen[key] = obj  # type: ignore
+        self.quads.append((subject, predicate, obj))
+
+    def _iri(self, value: Any, vocab: bool) -> str:
+        if not isinstance(value, str):
+            raise _Unsupported(value)
+        iri = _expand_iri(self.ctx, value, vocab)
+        if iri is None or iri.startswith("_:") or not _ABSOLUTE_IRI.match(iri):
+            raise _Unsupported(value)
+        return iri
+
+    def node(self, node: Dict[str, Any], top: bool = False) -> _Node:
+        subject: Optional[_Node] = None
+        types: Any = None
+        properties = []
+
+        for key, value in node.items():
+            if key == "@context":
+                if not top:
+                    raise _Unsupported(key)
+                continue
+
+            if key in ("@id", "@type"):
+                expanded: Optional[str] = key
+            else:
+                expanded = _expand_iri(self.ctx, key, True)
+            if expanded is None:
+                continue
+            if expanded == "@id":
+                if subject is not None:
+                    raise _Unsupported("colliding @id")
+                subject = f"<{self._iri(value, False)}>"
+            elif expanded == "@type":
+                if types is not None:
+                    raise _Unsupported("colliding @type")
+                types = value if isinstance(value, list) else [value]
+            elif expanded.startswith("@"):
+                raise _Unsupported(key)
+            elif _ABSOLUTE_IRI.match(expanded):
+                properties.append((key, expanded, value))
+            # Relative IRIs (terms without @vocab) are dropped by the expansion
+
+        if subject is None:
+            if not top and not properties and types is None:
+                raise _Unsupported("empty node")
+            subject = self.blank_nodes
+            self.blank_nodes += 1
+
+        for type_ in types or []:
+            iri = self._iri(type_, True)
+            self._add(subject, RDF_TYPE, f"<{iri}>", ("@id", iri))
+
+        for key, expanded, value in properties:
+            term = self.ctx.terms.get(key)
+            # Blank node predicates (from the ActivityStreams "_:" @vocab) are
+            # not part of the dataset, but the nodes they contain are
+            predicate = None if expanded.startswith("_:") else f"<{expanded}>"
+            if term is not None and term.container == "@language":
+                self._language_map(subject, predicate, value)
+                continue
+            for item in value if isinstance(value, list) else [value]:
+                self._value(subject, predicate, term, item)
+
+        return subject
+
+    def _language_map(
+        self, subject: _Node, predicate: Optional[str], value: Any
+    ) -> None:
+        if value is None:
+            return
+        if not isinstance(value, dict):
+            raise _Unsupported("language map")
+        for lang, items in value.items():
+            if lang != "@none" and (not lang or lang.startswith("@")):
+                raise _Unsupported(lang)
+            for item in items if isinstance(items, list) else [items]:
+                if item is None:
+                    continue
+                if not isinstance(item, str):
+                    raise _Unsupported("language map value")
+                if predicate is None:
+                    continue
+                if lang == "@none":
+                    obj = _literal(item, XSD_STRING)
+                    key: Any = (item, None, None)
+                else:
+                    obj = f'"{_escape(item)}"@{lang.lower()}'
+                    key = (item, None, lang.lower())
+                self._add(subject, predicate, obj, key)
+
+    def _value(
+        self,
+        subject: _Node,
+        predicate: Optional[str],
+        term: Optional[_Term],
+        value: Any,
+    ) -> None:
+        type_ = term.type if term is not None else None
+        key: Any
+
+        if value is None:
+            return
+        elif isinstance(value, dict):
+            obj: _Node = self.node(value)
+            key = ("@id", obj) if isinstance(obj, str) else None
+        elif isinstance(value, list):
+            raise _Unsupported("list of lists")
+        elif predicate is None:
+            return
+        elif type_ == "@id":
+            iri = self._iri(value, False)
+            obj, key = f"<{iri}>", ("@id", iri)
+        elif type_ == XSD_DOUBLE:
+            raise _Unsupported("xsd:double")
+        elif isinstance(value, str):
+            obj, key = _literal(value, type_ or XSD_STRING), (
+                value,
+                type_,
+                None,
+            )
+        elif isinstance(value, bool):
+            obj = _literal("true" if value else "false", type_ or XSD_BOOLEAN)
+            key = (value, type_, None)
+        elif isinstance(value, int) and abs(value) < 1e21:
+            obj, key = _literal(str(value), type_ or XSD_INTEGER), (
+                value,
+                type_,
+                None,
+            )
+        else:
+            raise _Unsupported("number")
+
+        if predicate is not None:
+            self._add(subject, predicate, obj, key)
+
+
+def _serialize(quad: _Quad, labels: Any) -> str:
+    subject, predicate, obj = quad
+    if isinstance(subject, int):
+        subject = labels(subject)
+    if isinstance(obj, int):
+        obj = labels(obj)
+    return f"{subject} {predicate} {obj} .\n"
+
+
+def _canonical_nquads(quads: List[_Quad]) -> str:
+    """URDNA2015 for datasets where first-degree hashes are enough."""
+    by_blank_node: Dict[int, List[_Quad]] = {}
+    for quad in quads:
+        for node in (quad[0], quad[2]):
+            if isinstance(node, int):
+                by_blank_node.setdefault(node, []).append(quad)
+
+    hashes = {}
+    for blank_node, blank_node_quads in by_blank_node.items():
+        nquads = sorted(
+            _serialize(
+                quad,
+                lambda other, blank_node=blank_node: (
+                    "_:a" if other == blank_node else "_:z"
+                ),
+            )
+            for quad in blank_node_quads
+        )
+        hashes[blank_node] = hashlib.sha256(
+            "".join(nquads).encode("utf-8")
+        ).hexdigest()
+
+    if len(set(hashes.values())) != len(hashes):
+        raise _Unsupported("needs n-degree hashing")
+
+    labels = {
+        blank_node: f"_:c14n{i}"
+        for i, (_, blank_node) in enumerate(
+            sorted((h, blank_node) for blank_node, h in hashes.items())
+        )
+    }
+    return "".join(
+        sorted(_serialize(quad, labels.__getitem__) for quad in quads)
+    )
+
+
+def normalize(doc: Any) -> Optional[str]:
+    """Canonicalize `doc` (URDNA2015, N-Quads) without pyld.
+
+    Returns None if the document is outside of the supported subset, in which
+    case `jsonld.normalize` must be used.
+    """
+    if not isinstance(doc, dict) or "@context" not in doc:
+        return None
+    try:
+        to_rdf = _ToRDF(_active_context(doc["@context"]))
+        to_rdf.node(doc, top=True)
+        return _canonical_nquads(to_rdf.quads)
+    except _Unsupported:
+        return None
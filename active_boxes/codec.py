@@ -0,0 +1,593 @@
+"""Compact storage codec for activities.
+
+Activities stored as JSON repeat the same `@context`, keys and IRI prefixes
+over and over. `ActivityCodec` encodes them to MessagePack instead, with:
+
+- the well-known contexts (like the one added to every activity) encoded as
+  a single byte reference
+- the well-known keys (`id`, `type`, `attributedTo`...) encoded as small
+  integers
+- the well-known strings (activity types, the public collection...) and IRI
+  prefixes (`https://`, the instance base URL...) encoded as references
+
+`decode()` restores the exact `to_dict()` output (same values, types and key
+order). The tables are append-only, and the first byte of the encoded data is
+the format version, so data encoded by an older release can always be decoded.
+
+The `msgpack` package is used when installed (`pip install msgpack`),
+otherwise a pure-Python implementation of the same format (slower, but the
+data is interchangeable).
+
+Example usage:
+    from active_boxes.codec import ActivityCodec
+
+    codec = ActivityCodec(prefixes=["https://myapp.example/"])
+    row.payload = codec.encode(create)
+    ...
+    activity = ap.parse_activity(codec.decode(row.payload))
+"""
+
+import json
+import struct
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from .activitypub import BaseActivity
+from .activitypub import ObjectType
+
+try:
+    import msgpack  # type: ignore[import-not-found, import-untyped]
+except ImportError:  # pragma: no cover
+    msgpack = None  # type: ignore[assignment]
+
+FORMAT_VERSION = 1
+
+# The tables below are part of the storage format: only append to them
+
+_CONTEXTS: Tuple[str, ...] = tuple(
+    json.dumps(ctx, separators=(",", ":"))
+    for ctx in [
+        # Added to every activity
+        [
+            "https://www.w3.org/ns/activitystreams",
+            "https://w3id.org/security/v1",
+            {
+                "Hashtag": "as:Hashtag",
+                "sensitive": "as:sensitive",
+                "toot": "http://joinmastodon.org/ns#",
+                "featured": "toot:featured",
+            },
+        ],
+        # `DEFAULT_CTX` (actors and collections)
+        [
+            "https://www.w3.org/ns/activitystreams",
+            "https://w3id.org/security/v1",
+            {
+                "Hashtag": "as:Hashtag",
+                "sensitive": "as:sensitive",
+                "manuallyApprovesFollowers": "as:manuallyApprovesFollowers",
+                "toot": "http://joinmastodon.org/ns#",
+                "featured": "toot:featured",
+                "schema": "http://schema.org#",
+                "PropertyValue": "schema:PropertyValue",
+                "value": "schema:value",
+            },
+        ],
+        [
+            "https://www.w3.org/ns/activitystreams",
+            "https://w3id.org/security/v1",
+        ],
+    ]
+)
+
+_KEYS: Tuple[str, ...] = (
+    "@context",
+    "id",
+    "type",
+    "actor",
+    "object",
+    "target",
+    "origin",
+    "result",
+    "instrument",
+    "to",
+    "cc",
+    "bto",
+    "bcc",
+    "audience",
+    "published",
+    "updated",
+    "deleted",
+    "startTime",
+    "endTime",
+    "attributedTo",
+    "inReplyTo",
+    "content",
+    "contentMap",
+    "summary",
+    "summaryMap",
+    "name",
+    "nameMap",
+    "sensitive",
+    "url",
+    "href",
+    "rel",
+    "mediaType",
+    "tag",
+    "attachment",
+    "icon",
+    "image",
+    "preview",
+    "replies",
+    "likes",
+    "shares",
+    "context",
+    "conversation",
+    "generator",
+    "location",
+    "source",
+    "duration",
+    "width",
+    "height",
+    "blurhash",
+    "focalPoint",
+    "formerType",
+    "totalItems",
+    "items",
+    "orderedItems",
+    "first",
+    "last",
+    "next",
+    "prev",
+    "current",
+    "partOf",
+    "startIndex",
+    "preferredUsername",
+    "inbox",
+    "outbox",
+    "followers",
+    "following",
+    "liked",
+    "featured",
+    "featuredTags",
+    "streams",
+    "endpoints",
+    "sharedInbox",
+    "publicKey",
+    "owner",
+    "publicKeyPem",
+    "manuallyApprovesFollowers",
+    "discoverable",
+    "indexable",
+    "memorial",
+    "alsoKnownAs",
+    "movedTo",
+    "signature",
+    "creator",
+    "created",
+    "signatureValue",
+    "nonce",
+    "oneOf",
+    "anyOf",
+    "closed",
+    "votersCount",
+    "quoteUrl",
+    "value",
+)
+
+_STRINGS: Tuple[str, ...] = (
+    "https://www.w3.org/ns/activitystreams#Public",
+    "as:Public",
+    "Public",
+    "https://www.w3.org/ns/activitystreams",
+    "https://w3id.org/security/v1",
+    "text/html",
+    "text/markdown",
+    "application/activity+json",
+    'application/ld+json; profile="https://www.w3.org/ns/activitystreams"',
+    "RsaSignature2017",
+    "Link",
+    "Mention",
+    "Hashtag",
+    "Emoji",
+    "PropertyValue",
+    "Announce",
+    "Block",
+    "Like",
+    "Create",
+    "Update",
+    "OrderedCollection",
+    "OrderedCollectionPage",
+    "CollectionPage",
+    "Collection",
+    "Note",
+    "Article",
+    "Video",
+    "Audio",
+    "Document",
+    "Accept",
+    "Reject",
+    "Follow",
+    "Delete",
+    "Undo",
+    "Add",
+    "Remove",
+    "Image",
+    "Tombstone",
+    "Person",
+    "Application",
+    "Group",
+    "Organization",
+    "Service",
+    "Question",
+    "Page",
+    "Key",
+    "Profile",
+    "Event",
+    "Place",
+    "Relationship",
+    "Flag",
+    "Move",
+    "Join",
+    "Leave",
+    "View",
+    "Listen",
+    "Read",
+    "Travel",
+    "Arrive",
+)
+
+_PREFIXES: Tuple[str, ...] = (
+    "https://www.w3.org/ns/activitystreams#",
+    "https://",
+    "http://",
+)
+
+# MessagePack extension types
+_EXT_CONTEXT = 1
+_EXT_STRING = 2
+_EXT_PREFIX = 3
+_EXT_CUSTOM_PREFIX = 4
+
+_KEY_CODES = {key: i for i, key in enumerate(_KEYS)}
+_STRING_CODES = {s: i for i, s in enumerate(_STRINGS)}
+_CONTEXT_VALUES = [json.loads(ctx) for ctx in _CONTEXTS]
+
+
+if msgpack is not None:
+    ExtType = msgpack.ExtType
+else:  # pragma: no cover
+
+    class ExtType(NamedTuple):  # type: ignore
+        code: int
+        data: bytes
+
+
+class ActivityCodec:
+    """Encodes activities to a compact binary form, and back.
+
+    Args:
+        prefixes: IRI prefixes of the instance (e.g. its base URL), tried
+            before the well-known ones. Like the tables, the same prefixes
+            (in the same order, only appended to) are needed to decode
+    """
+
+    def __init__(self, prefixes: Sequence[str] = ()) -> None:
+        if len(prefixes) > 256:
+            raise ValueError("too many prefixes (256 at most)")
+        self.prefixes = list(prefixes)
+        # The longest prefixes first
+        self._prefixes = sorted(
+            [(p, _EXT_CUSTOM_PREFIX, i) for i, p in enumerate(self.prefixes)]
+            + [(p, _EXT_PREFIX, i) for i, p in enumerate(_PREFIXES)],
+            key=lambda p: len(p[0]),
+            reverse=True,
+        )
+
+    def encode(self, activity: Union[ObjectType, BaseActivity]) -> bytes:
+        """Returns the compact form of an activity (or its `to_dict()`)."""
+        if isinstance(activity, BaseActivity):
+            activity = activity.to_dict()
+        return bytes([FORMAT_VERSION]) + _packb(self._encode(activity))
+
+    def decode(self, data: bytes) -> ObjectType:
+        """Returns the `to_dict()` output of an encoded activity.
+
+        Raises:
+            ValueError: If the data is invalid, or encoded by a newer release
+        """
+        if not data or data[0] != FORMAT_VERSION:
+            raise ValueError("unsupported activity encoding")
+        try:
+            return _unpackb(data[1:], self._decode_ext, _decode_pairs)
+        except (ValueError, IndexError, KeyError, struct.error) as e:
+            raise ValueError(f"invalid encoded activity: {e!r}") from e
+
+    def _encode(self, value: Any) -> Any:
+        if isinstance(value, str):
+            return self._encode_str(value)
+        if isinstance(value, dict):
+            encoded = {}
+            for key, item in value.items():
+                if key == "@context":
+                    item = self._encode_context(item)
+                else:
+                    item = self._encode(item)
+                encoded[_KEY_CODES.get(key, key)] = item
+            return encoded
+        if isinstance(value, (list, tuple)):
+            return [self._encode(item) for item in value]
+        return value
+
+    def _encode_context(self, ctx: Any) -> Any:
+        for i, known in enumerate(_CONTEXT_VALUES):
+            if ctx == known and _same_types(ctx, known):
+                return ExtType(_EXT_CONTEXT, bytes([i]))
+        return self._encode(ctx)
+
+    def _encode_str(self, value: str) -> Any:
+        if (code := _STRING_CODES.get(value)) is not None:
+            return ExtType(_EXT_STRING, bytes([code]))
+        for prefix, ext, i in self._prefixes:
+            if value.startswith(prefix):
+                rest = value[len(prefix) :].encode("utf-8")
+                return ExtType(ext, bytes([i]) + rest)
+        return value
+
+    def _decode_ext(self, code: int, data: bytes) -> Any:
+        if code == _EXT_CONTEXT:
+            return json.loads(_CONTEXTS[data[0]])
+        if code == _EXT_STRING:
+            return _STRINGS[data[0]]
+        if code == _EXT_PREFIX:
+            return _PREFIXES[data[0]] + data[1:].decode("utf-8")
+        if code == _EXT_CUSTOM_PREFIX:
+            return self.prefixes[data[0]] + data[1:].decode("utf-8")
+        raise ValueError(f"unknown extension type {code}")
+
+
+def _same_types(value: Any, other: Any) -> bool:
+    """Tell apart values that are equal with different types (1 and True)."""
+    if type(value) is not type(other):
+        return False
+    if isinstance(value, dict):
+        # The key order must be restored too
+        return list(value) == list(other) and all(
+            _same_types(v, other[k]) for k, v in value.items()
+        )
+    if isinstance(value, list):
+        return all(_same_types(v, o) for v, o in zip(value, other))
+    return True
+
+
+def _decode_pairs(pairs: List[Tuple[Any, Any]]) -> Dict[str, Any]:
+    return {
+        _KEYS[key] if isinstance(key, int) else key: value
+        for key, value in pairs
+    }
+
+
+_codec = ActivityCodec()
+
+
+def encode_activity(activity: Union[ObjectType, BaseActivity]) -> bytes:
+    """Returns the compact form of an activity, see `ActivityCodec`."""
+    return _codec.encode(activity)
+
+
+def decode_activity(data: bytes) -> ObjectType:
+    """Returns the `to_dict()` output of an activity, see `ActivityCodec`."""
+    return _codec.decode(data)
+
+
+# MessagePack, with the `msgpack` package or in pure-Python
+
+
+def _packb(value: Any) -> bytes:
+    if msgpack is not None:
+        return msgpack.packb(value, use_bin_type=True)
+    out = bytearray()
+    _pack(value, out)
+    return bytes(out)
+
+
+def _unpackb(
+    data: bytes,
+    ext_hook: Callable[[int, bytes], Any],
+    object_pairs_hook: Callable[[List[Tuple[Any, Any]]], Any],
+) -> Any:
+    if msgpack is not None:
+        try:
+            return msgpack.unpackb(
+                data,
+                raw=False,
+                strict_map_key=False,
+                ext_hook=ext_hook,
+                object_pairs_hook=object_pairs_hook,
+            )
+        except (msgpack.UnpackException, TypeError) as e:
+            raise ValueError(str(e)) from e
+    value, pos = _Unpacker(data, ext_hook, object_pairs_hook).unpack(0)
+    if pos != len(data):
+        raise ValueError("extra data")
+    return value
+
+
+def _pack_header(
+    out: bytearray, size: int, fix: Optional[int], fix_max: int, formats: str
+) -> None:
+    """Pack the header of a str, array or map of `size` items."""
+    if fix is not None and size < fix_max:
+        out.append(fix | size)
+        return
+    for first, fmt in zip(formats.encode("latin-1"), "BHI"):
+        if first and size < 1 << (8 * struct.calcsize(fmt)):
+            out.append(first)
+            out += struct.pack(f">{fmt}", size)
+            return
+    raise ValueError("object too large")
+
+
+def _pack(value: Any, out: bytearray) -> None:
+    if value is None:
+        out.append(0xC0)
+    elif value is True:
+        out.append(0xC3)
+    elif value is False:
+        out.append(0xC2)
+    elif isinstance(value, int):
+        if 0 <= value < 0x80:
+            out.append(value)
+        elif -0x20 <= value < 0:
+            out.append(value & 0xFF)
+        elif value >= 0:
+            for first, fmt in [
+                (0xCC, "B"),
+                (0xCD, "H"),
+                (0xCE, "I"),
+                (0xCF, "Q"),
+            ]:
+                if value < 1 << (8 * struct.calcsize(fmt)):
+                    out.append(first)
+                    out += struct.pack(f">{fmt}", value)
+                    return
+            raise ValueError("integer too large")
+        else:
+            for first, fmt in [
+                (0xD0, "b"),
+                (0xD1, "h"),
+                (0xD2, "i"),
+                (0xD3, "q"),
+            ]:
+                if value >= -(1 << (8 * struct.calcsize(fmt) - 1)):
+                    out.append(first)
+                    out += struct.pack(f">{fmt}", value)
+                    return
+            raise ValueError("integer too large")
+    elif isinstance(value, float):
+        out.append(0xCB)
+        out += struct.pack(">d", value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        _pack_header(out, len(data), 0xA0, 32, "\xd9\xda\xdb")
+        out += data
+    elif isinstance(value, ExtType):
+        size = len(value.data)
+        if fix := {1: 0xD4, 2: 0xD5, 4: 0xD6, 8: 0xD7, 16: 0xD8}.get(size):
+            out.append(fix)
+        else:
+            _pack_header(out, size, None, 0, "\xc7\xc8\xc9")
+        out += struct.pack(">b", value.code)
+        out += value.data
+    elif isinstance(value, (list, tuple)):
+        _pack_header(out, len(value), 0x90, 16, "\x00\xdc\xdd")
+        for item in value:
+            _pack(item, out)
+    elif isinstance(value, dict):
+        _pack_header(out, len(value), 0x80, 16, "\x00\xde\xdf")
+        for key, item in value.items():
+            _pack(key, out)
+            _pack(item, out)
+    else:
+        raise TypeError(f"cannot encode {type(value).__name__}")
+
+
+_FIXED = {
+    0xCC: ">B",
+    0xCD: ">H",
+    0xCE: ">I",
+    0xCF: ">Q",
+    0xD0: ">b",
+    0xD1: ">h",
+    0xD2: ">i",
+    0xD3: ">q",
+    0xCA: ">f",
+    0xCB: ">d",
+}
+_STR = {0xD9: ">B", 0xDA: ">H", 0xDB: ">I"}
+_BIN = {0xC4: ">B", 0xC5: ">H", 0xC6: ">I"}
+_EXT = {0xC7: ">B", 0xC8: ">H", 0xC9: ">I"}
+_FIXEXT = {0xD4: 1, 0xD5: 2, 0xD6: 4, 0xD7: 8, 0xD8: 16}
+_ARRAY = {0xDC: ">H", 0xDD: ">I"}
+_MAP = {0xDE: ">H", 0xDF: ">I"}
+
+
+class _Unpacker:
+    def __init__(
+        self,
+        data: bytes,
+        ext_hook: Callable[[int, bytes], Any],
+        object_pairs_hook: Callable[[List[Tuple[Any, Any]]], Any],
+    ) -> None:
+        self.data = data
+        self.ext_hook = ext_hook
+        self.object_pairs_hook = object_pairs_hook
+
+    def _size(self, fmt: str, pos: int) -> Tuple[int, int]:
+        (size,) = struct.unpack_from(fmt, self.data, pos)
+        return size, pos + struct.calcsize(fmt)
+
+    def _bytes(self, size: int, pos: int) -> Tuple[bytes, int]:
+        if pos + size > len(self.data):
+            raise ValueError("truncated data")
+        return self.data[pos : pos + size], pos + size
+
+    def unpack(self, pos: int) -> Tuple[Any, int]:
+        first = self.data[pos]
+        pos += 1
+        if first < 0x80:
+            return first, pos
+        if first >= 0xE0:
+            return first - 0x100, pos
+        if 0xA0 <= first < 0xC0:
+            data, pos = self._bytes(first & 0x1F, pos)
+            return data.decode("utf-8"), pos
+        if 0x90 <= first < 0xA0:
+            return self._array(first & 0x0F, pos)
+        if 0x80 <= first < 0x90:
+            return self._map(first & 0x0F, pos)
+        if first == 0xC0:
+            return None, pos
+        if first in (0xC2, 0xC3):
+            return first == 0xC3, pos
+        if (fmt := _FIXED.get(first)) is not None:
+            (value,) = struct.unpack_from(fmt, self.data, pos)
+            return value, pos + struct.calcsize(fmt)
+        if (fmt := _STR.get(first)) is not None:
+            data, pos = self._bytes(*self._size(fmt, pos))
+            return data.decode("utf-8"), pos
+        if (fmt := _BIN.get(first)) is not None:
+            return self._bytes(*self._size(fmt, pos))
+        if (fmt := _ARRAY.get(first)) is not None:
+            return self._array(*self._size(fmt, pos))
+        if (fmt := _MAP.get(first)) is not None:
+            return self._map(*self._size(fmt, pos))
+        if (size := _FIXEXT.get(first)) is None:
+            if (fmt := _EXT.get(first)) is None:
+                raise ValueError(f"invalid type 0x{first:02x}")
+            size, pos = self._size(fmt, pos)
+        (code,) = struct.unpack_from(">b", self.data, pos)
+        data, pos = self._bytes(size, pos + 1)
+        return self.ext_hook(code, data), pos
+
+    def _array(self, size: int, pos: int) -> Tuple[List[Any], int]:
+        items = []
+        for _ in range(size):
+            item, pos = self.unpack(pos)
+            items.append(item)
+        return items, pos
+
+    def _map(self, size: int, pos: int) -> Tuple[Any, int]:
+        pairs = []
+        for _ in range(size):
+            key, pos = self.unpack(pos)
+            value, pos = self.unpack(pos)
+            pairs.append((key, value))
+        return self.object_pairs_hook(pairs), pos
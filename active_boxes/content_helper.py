@@ -1,13 +1,26 @@
+import asyncio
+import functools
+import hashlib
+import json
+import time
+from concurrent.futures import Executor
+from typing import Any
 from typing import Dict
+from typing import Iterable
 from typing import List
+from typing import Match
+from typing import Optional
+from typing import Pattern
 from typing import Tuple
 
-from markdown import markdown
-
-import regex as re
-
+from .activitypub import ObjectType
+from .activitypub import _await_if_coroutine
 from .activitypub import get_backend
+from .backend import LRUCache
+from .webfinger import get_actor_url
 from .webfinger import get_actor_url_sync
+from . import loopwatch
+from . import webfinger
 
 
 def _set_attrs(attrs, new=False):
@@ -18,55 +31,306 @@ def _set_attrs(attrs, new=False):
     return attrs
 
 
-HASHTAG_REGEX = re.compile(r"(#[\d\w]+)")
-MENTION_REGEX = re.compile(r"@[\d\w_.+-]+@[\d\w-]+\.[\d\w\-.]+")
+# markdown and regex are slow to import, they are only loaded when needed:
+# the patterns are compiled on first use (`HASHTAG_REGEX` and `MENTION_REGEX`
+# are still available as module attributes)
+_HASHTAG_PATTERN = r"(#[\d\w]+)"
+_MENTION_PATTERN = r"@[\d\w_.+-]+@[\d\w-]+\.[\d\w\-.]+"
+# Hashtags and mentions, found together in a single pass
+_TAG_PATTERN = f"{_MENTION_PATTERN}|{_HASHTAG_PATTERN}"
+
+
+@functools.lru_cache(maxsize=None)
+def _regex(pattern: str) -> Pattern[str]:
+    import regex
+
+    return regex.compile(pattern)
+
+
+def __getattr__(name: str) -> Any:
+    if name == "HASHTAG_REGEX":
+        return _regex(_HASHTAG_PATTERN)
+    if name == "MENTION_REGEX":
+        return _regex(_MENTION_PATTERN)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def markdown(text: str, **kwargs: Any) -> str:
+    """`markdown.markdown()`, imported on first use."""
+    from markdown import markdown as _markdown
+
+    return _markdown(text, **kwargs)
+
+
+def _rewrite(
+    content: str,
+    regex: Pattern[str],
+    actors: Dict[str, ObjectType],
+    hide_domain: bool = False,
+    base_url: Optional[str] = None,
+) -> Tuple[str, List[Dict[str, str]]]:
+    """Link the hashtags and (resolved) mentions matched by `regex`.
+
+    The content is rewritten in a single pass, and the link of each distinct
+    tag is only built once.
+    """
+    if base_url is None:
+        base_url = get_backend().base_url()
+    links: Dict[str, str] = {}
+    tags: List[Dict[str, str]] = []
+
+    def _link(m: Match[str]) -> str:
+        text = m.group()
+        if (link := links.get(text)) is not None:
+            return link
+
+        if text[0] == "#":
+            tag = text[1:]
+            link = f'<a href="{base_url}/tags/{tag}" class="mention hashtag" rel="tag">#<span>{tag}</span></a>'
+            tags.append(
+                dict(href=f"{base_url}/tags/{tag}", name=text, type="Hashtag")
+            )
+        elif (p := actors.get(text)) is not None:
+            _, username, domain = text.split("@")
+            d = "" if hide_domain else f"@{domain}"
+            link = (
+                f'<span class="h-card"><a href="{p["url"]}" '
+                f'class="u-url mention">@<span>{username}</span>{d}</a></span>'
+            )
+            tags.append(dict(type="Mention", href=p["id"], name=text))
+        else:
+            # FIXME(tsileo): raise an error?
+            link = text
+
+        links[text] = link
+        return link
+
+    return regex.sub(_link, content), tags
+
+
+def _mentions(content: str) -> List[str]:
+    return list(dict.fromkeys(_regex(_MENTION_PATTERN).findall(content)))
 
 
 def hashtagify(content: str) -> Tuple[str, List[Dict[str, str]]]:
-    base_url = get_backend().base_url()
-    tags = []
-    hashtags = re.findall(HASHTAG_REGEX, content)
-    hashtags = list(set(hashtags))  # unique tags
-    hashtags.sort()
-    hashtags.reverse()  # replace longest tag first
-    for hashtag in hashtags:
-        tag = hashtag[1:]
-        link = f'<a href="{base_url}/tags/{tag}" class="mention hashtag" rel="tag">#<span>{tag}</span></a>'
-        tags.append(
-            dict(href=f"{base_url}/tags/{tag}", name=hashtag, type="Hashtag")
-        )
-        content = content.replace(hashtag, link)
-    return content, tags
+    return _rewrite(content, _regex(_HASHTAG_PATTERN), {})
+
+
+def _mention_cache() -> Optional[LRUCache]:
+    """The cache of the resolved mentions (per backend)."""
+    cache = getattr(get_backend(), "cache", None)
+    return cache("mentions") if cache is not None else None
+
+
+def _mention_key(mention: str) -> str:
+    # `@Bob@Host` and `@bob@host` are the same account
+    return webfinger._parse_resource(mention)[0].lower()
+
+
+def _cached_mention(
+    cache: Optional[LRUCache], key: str
+) -> Optional[ObjectType]:
+    if cache is None or (cached := cache.get(key)) is None:
+        return None
+    expires, p = cached
+    if time.monotonic() < expires:
+        return p
+    cache.pop(key)
+    return None
+
+
+def _cache_mention(cache: Optional[LRUCache], key: str, p: ObjectType) -> None:
+    # Kept as long as the WebFinger lookups (see configure_webfinger_cache())
+    if cache is not None and webfinger._ttl > 0:
+        cache.set(key, (time.monotonic() + webfinger._ttl, p))
+
+
+def _resolve_mentions_sync(mentions: List[str]) -> Dict[str, ObjectType]:
+    cache = _mention_cache()
+    resolved: Dict[str, Optional[ObjectType]] = {}
+    actors: Dict[str, ObjectType] = {}
+    for mention in mentions:
+        key = _mention_key(mention)
+        if key not in resolved:
+            p = _cached_mention(cache, key)
+            if p is None and (actor_url := get_actor_url_sync(mention)):
+                actor = get_backend().fetch_iri_sync(actor_url)
+                p = {"id": actor["id"], "url": actor["url"]}
+                _cache_mention(cache, key, p)
+            resolved[key] = p
+        if (p := resolved[key]) is not None:
+            actors[mention] = p
+    return actors
 
 
 def mentionify(
     content: str, hide_domain: bool = False
 ) -> Tuple[str, List[Dict[str, str]]]:
-    tags = []
-    for mention in re.findall(MENTION_REGEX, content):
-        _, username, domain = mention.split("@")
-        if not (actor_url := get_actor_url_sync(mention)):
-            # FIXME(tsileo): raise an error?
+    """Link the mentions, resolved one by one (sync).
+
+    For async code, use await mentionify_async() instead.
+    """
+    actors = _resolve_mentions_sync(_mentions(content))
+    return _rewrite(content, _regex(_MENTION_PATTERN), actors, hide_domain)
+
+
+async def _resolve_mention(mention: str) -> Optional[ObjectType]:
+    if not (actor_url := await get_actor_url(mention)):
+        return None
+    p = await _await_if_coroutine(get_backend().fetch_iri(actor_url))
+    return {"id": p["id"], "url": p["url"]}
+
+
+async def resolve_mentions(
+    mentions: Iterable[str], max_concurrency: int = 10
+) -> Dict[str, ObjectType]:
+    """Resolve `@user@host` mentions to their actor's id and url (async).
+
+    Each account is resolved once (WebFinger, then the actor), concurrently,
+    and the results are cached per backend for as long as the WebFinger
+    lookups. The mentions that could not be resolved are left out.
+    """
+    keys = {mention: _mention_key(mention) for mention in mentions}
+    cache = _mention_cache()
+    resolved: Dict[str, Optional[ObjectType]] = {}
+    # Key -> the first mention of the account
+    missing: Dict[str, str] = {}
+    for mention, key in keys.items():
+        if key in resolved or key in missing:
             continue
-        p = get_backend().fetch_iri_sync(actor_url)
-        tags.append(dict(type="Mention", href=p["id"], name=mention))
+        if (p := _cached_mention(cache, key)) is not None:
+            resolved[key] = p
+        else:
+            missing[key] = mention
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _resolve(mention: str) -> Optional[ObjectType]:
+        async with semaphore:
+            return await _resolve_mention(mention)
+
+    results = await asyncio.gather(*(_resolve(m) for m in missing.values()))
+    for key, p in zip(missing, results):
+        resolved[key] = p
+        if p is not None:
+            _cache_mention(cache, key, p)
+    return {
+        mention: p
+        for mention, key in keys.items()
+        if (p := resolved[key]) is not None
+    }
+
+
+async def mentionify_async(
+    content: str, hide_domain: bool = False
+) -> Tuple[str, List[Dict[str, str]]]:
+    """Link the mentions, resolved concurrently (async)."""
+    actors = await resolve_mentions(_mentions(content))
+    return _rewrite(content, _regex(_MENTION_PATTERN), actors, hide_domain)
+
+
+# Rendered markdown, keyed by a hash of everything the output depends on: the
+# same post is rendered again for edits, previews and re-federation
+_MARKDOWN_EXTENSIONS = ["mdx_linkify"]
+_rendered: Optional[LRUCache] = None
+_render_executor: Optional[Executor] = None
+
+
+def configure_render_cache(
+    cache_size: int = 1024, executor: Optional[Executor] = None
+) -> None:
+    """Configure the cache of the rendered markdown (disabled by default).
+
+    Args:
+        cache_size: Number of rendered posts kept in memory (0 disables it)
+        executor: Pool rendering the markdown for `parse_markdown_async()`
+            (None uses the event loop default executor)
+    """
+    global _rendered, _render_executor
+    _rendered = LRUCache(cache_size) if cache_size > 0 else None
+    _render_executor = executor
 
-        d = f"@{domain}"
-        if hide_domain:
-            d = ""
 
-        link = f'<span class="h-card"><a href="{p["url"]}" class="u-url mention">@<span>{username}</span>{d}</a></span>'
-        content = content.replace(mention, link)
+def _render_key(
+    content: str, base_url: str, actors: Dict[str, ObjectType]
+) -> Optional[str]:
+    if _rendered is None:
+        return None
+    # The resolved mentions are part of the key: the same source renders
+    # differently once an actor moved
+    data = json.dumps(
+        [content, base_url, _MARKDOWN_EXTENSIONS, actors],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _render(
+    content: str, base_url: str, actors: Dict[str, ObjectType]
+) -> Tuple[str, List[Dict[str, str]]]:
+    content, tags = _rewrite(
+        content, _regex(_TAG_PATTERN), actors, base_url=base_url
+    )
+    content = markdown(content, extensions=_MARKDOWN_EXTENSIONS)
     return content, tags
 
 
+def _cached_render(
+    key: Optional[str],
+) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+    if key is None or _rendered is None:
+        return None
+    if (rendered := _rendered.get(key)) is None:
+        return None
+    content, tags = rendered
+    return content, [dict(tag) for tag in tags]
+
+
+def _cache_render(
+    key: Optional[str], rendered: Tuple[str, List[Dict[str, str]]]
+) -> None:
+    if key is not None and _rendered is not None:
+        content, tags = rendered
+        _rendered.set(key, (content, [dict(tag) for tag in tags]))
+
+
+@loopwatch.watch("content_helper.parse_markdown")
 def parse_markdown(content: str) -> Tuple[str, List[Dict[str, str]]]:
-    tags = []
-    if hashtag_tags := hashtagify(content)[1]:
-        content, hashtag_tags = hashtagify(content)
-        tags.extend(hashtag_tags)
-    if mention_tags := mentionify(content)[1]:
-        content, mention_tags = mentionify(content)
-        tags.extend(mention_tags)
-    content = markdown(content, extensions=["mdx_linkify"])
-    return content, tags
+    """Render markdown, with the hashtags and mentions linked (sync).
+
+    For async code, use await parse_markdown_async() instead.
+    """
+    base_url = get_backend().base_url()
+    actors = _resolve_mentions_sync(_mentions(content))
+    key = _render_key(content, base_url, actors)
+    if (rendered := _cached_render(key)) is not None:
+        return rendered
+
+    rendered = _render(content, base_url, actors)
+    _cache_render(key, rendered)
+    return rendered
+
+
+async def parse_markdown_async(
+    content: str,
+) -> Tuple[str, List[Dict[str, str]]]:
+    """Render markdown, with the hashtags and mentions linked (async).
+
+    All the mentions are resolved concurrently, see `resolve_mentions()`, and
+    the markdown is rendered off the event loop (unless it's in the cache,
+    see `configure_render_cache()`).
+    """
+    base_url = get_backend().base_url()
+    actors = await resolve_mentions(_mentions(content))
+    key = _render_key(content, base_url, actors)
+    if (rendered := _cached_render(key)) is not None:
+        return rendered
+
+    loop = asyncio.get_running_loop()
+    rendered = await loop.run_in_executor(
+        _render_executor, _render, content, base_url, actors
+    )
+    _cache_render(key, rendered)
+    return rendered
@@ -32,6 +32,9 @@ class ServerError(Error):
             self.status_code = status_code
         self.payload = payload
 
+    def __reduce__(self):
+        return (self.__class__, (self.message, self.status_code, self.payload))
+
     def to_dict(self) -> Dict[str, Any]:
         rv = dict(self.payload or {})
         rv["message"] = self.message
@@ -75,10 +78,20 @@ class RecursionLimitExceededError(BadActivityError):
     """Raised when the recursion limit for fetching remote object was exceeded (likely a collection)."""
 
 
+class FetchBudgetExceededError(BadActivityError):
+    """Raised when the remote fetches of a unit of work exceeded its budget."""
+
+
 class UnexpectedActivityTypeError(BadActivityError):
     """Raised when an another activty was expected."""
 
 
+class HTTPSignatureError(ServerError):
+    """Raised when an incoming request HTTP Signature is missing or invalid."""
+
+    status_code = 401
+
+
 class ActivityUnavailableError(ServerError):
     """Raises when fetching a remote activity times out."""
 
@@ -6,21 +6,30 @@ replacing the synchronous requests-based implementation.
 
 import asyncio
 import base64
+import contextlib
 import hashlib
+import json
 import logging
 import time
+import typing
+import weakref
 from typing import Any
+from typing import AsyncIterator
 from typing import Dict
 from typing import Optional
 
-import aiohttp
-
-from .__version__ import __version__
+from .__version__ import get_version
+from .budget import FetchBudget
 from .errors import ActivityGoneError
 from .errors import ActivityNotFoundError
 from .errors import ActivityUnavailableError
+from .errors import FetchBudgetExceededError
 from .errors import NotAnActivityError
 from .urlutils import check_url as sync_check_url
+from . import loopwatch
+
+if typing.TYPE_CHECKING:
+    import aiohttp  # noqa: type checking
 
 logger = logging.getLogger(__name__)
 
@@ -62,10 +71,66 @@ class AsyncHTTPClient:
 
     def __init__(self, timeout: int = 15) -> None:
         self.timeout = timeout
-        self._session: Optional[aiohttp.ClientSession] = None
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._in_flight = 0
+        self._idle: Optional[asyncio.Event] = None
+        self._closing = False
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests (and tracked work) in flight."""
+        return self._in_flight
+
+    @contextlib.asynccontextmanager
+    async def track(self) -> AsyncIterator[None]:
+        """Count the block as in-flight work, that `shutdown()` waits for.
+
+        Requests made with this client are tracked, apps can track their own
+        work too (e.g. a delivery using another client).
+
+        Raises:
+            ActivityUnavailableError: If the client is shutting down
+        """
+        if self._closing:
+            raise ActivityUnavailableError("the HTTP client is shutting down")
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            if self._in_flight == 0 and self._idle is not None:
+                self._idle.set()
+
+    async def shutdown(self, timeout: float = 30.0) -> bool:
+        """Stop accepting requests, wait for the in-flight ones and close.
 
-    async def _get_session(self) -> aiohttp.ClientSession:
+        Args:
+            timeout: Maximum number of seconds to wait for the in-flight work
+
+        Returns:
+            True if all the in-flight work completed before the deadline
+        """
+        self._closing = True
+        drained = True
+        if self._in_flight:
+            if self._idle is None:
+                self._idle = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                drained = False
+                logger.warning(
+                    f"closing the HTTP client with {self._in_flight} "
+                    "requests in flight"
+                )
+        await self.close()
+        return drained
+
+    async def _get_session(self) -> "aiohttp.ClientSession":
         """Get or create aiohttp session."""
+        # aiohttp is slow to import, only load it when it's needed
+        import aiohttp
+
         if self._session is None or self._session.closed:
             timeout = aiohttp.ClientTimeout(total=self.timeout)
             self._session = aiohttp.ClientSession(timeout=timeout)
@@ -80,7 +145,8 @@ class AsyncHTTPClient:
         self,
         url: str,
         headers: Optional[Dict[str, str]] = None,
-        timeout: Optional[int] = None,
+        timeout: Optional[float] = None,
+        budget: Optional[FetchBudget] = None,
     ) -> Dict[str, Any]:
         """Fetch JSON from a URL.
 
@@ -88,6 +154,8 @@ class AsyncHTTPClient:
             url: The URL to fetch
             headers: Optional HTTP headers
             timeout: Optional timeout override
+            budget: Account for the bytes received with this budget (the
+                response is dropped as soon as it's too large)
 
         Returns:
             Parsed JSON response
@@ -96,46 +164,58 @@ class AsyncHTTPClient:
             ActivityNotFoundError: 404 response
             ActivityGoneError: 410 response
             ActivityUnavailableError: 5xx response or connection error
+            FetchBudgetExceededError: The response exceeds the budget
         """
-        await check_url(url)
-
-        session = await self._get_session()
-        if timeout is None:
-            timeout = self.timeout
-
-        try:
-            async with session.get(
-                url,
-                headers=headers,
-                timeout=aiohttp.ClientTimeout(total=timeout),
-                allow_redirects=True,
-            ) as resp:
-                if resp.status == 404:
-                    raise ActivityNotFoundError(f"{url} is not found")
-                elif resp.status == 410:
-                    raise ActivityGoneError(f"{url} is gone")
-                elif resp.status in (500, 502, 503):
-                    raise ActivityUnavailableError(
-                        f"unable to fetch {url}, server error ({resp.status})"
-                    )
-
-                resp.raise_for_status()
-
-                try:
-                    return await resp.json()
-                except Exception as e:
-                    raise NotAnActivityError(f"{url} is not JSON: {e}")
-
-        except aiohttp.ClientConnectorError as e:
-            raise ActivityUnavailableError(
-                f"unable to fetch {url}, connection error: {e}"
-            )
-        except asyncio.TimeoutError:
-            raise ActivityUnavailableError(f"unable to fetch {url}, timeout")
-        except Exception as e:
-            raise ActivityUnavailableError(
-                f"unable to fetch {url}, unknown error: {e}"
-            )
+        import aiohttp
+
+        async with self.track():
+            await check_url(url)
+
+            session = await self._get_session()
+            if timeout is None:
+                timeout = self.timeout
+
+            try:
+                async with session.get(
+                    url,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=timeout),
+                    allow_redirects=True,
+                ) as resp:
+                    if resp.status == 404:
+                        raise ActivityNotFoundError(f"{url} is not found")
+                    elif resp.status == 410:
+                        raise ActivityGoneError(f"{url} is gone")
+                    elif resp.status in (500, 502, 503):
+                        raise ActivityUnavailableError(
+                            f"unable to fetch {url}, server error ({resp.status})"
+                        )
+
+                    resp.raise_for_status()
+
+                    if budget is not None:
+                        body = await _read_body(url, resp, budget)
+                    try:
+                        if budget is None:
+                            return await resp.json()
+                        return json.loads(body)
+                    except Exception as e:
+                        raise NotAnActivityError(f"{url} is not JSON: {e}")
+
+            except FetchBudgetExceededError:
+                raise
+            except aiohttp.ClientConnectorError as e:
+                raise ActivityUnavailableError(
+                    f"unable to fetch {url}, connection error: {e}"
+                )
+            except asyncio.TimeoutError:
+                raise ActivityUnavailableError(
+                    f"unable to fetch {url}, timeout"
+                )
+            except Exception as e:
+                raise ActivityUnavailableError(
+                    f"unable to fetch {url}, unknown error: {e}"
+                )
 
     async def post_json(
         self,
@@ -143,7 +223,7 @@ class AsyncHTTPClient:
         data: Dict[str, Any],
         headers: Optional[Dict[str, str]] = None,
         timeout: Optional[int] = None,
-    ) -> aiohttp.ClientResponse:
+    ) -> "aiohttp.ClientResponse":
         """POST JSON to a URL.
 
         Args:
@@ -158,34 +238,56 @@ class AsyncHTTPClient:
         Raises:
             ActivityUnavailableError: On connection/timeout errors
         """
-        await check_url(url)
-
-        session = await self._get_session()
-        if timeout is None:
-            timeout = self.timeout
-
-        json_headers = dict(headers or {})
-        json_headers.setdefault("Content-Type", "application/json")
-        json_headers.setdefault("Accept", "application/activity+json")
+        import aiohttp
+
+        async with self.track():
+            await check_url(url)
+
+            session = await self._get_session()
+            if timeout is None:
+                timeout = self.timeout
+
+            json_headers = dict(headers or {})
+            json_headers.setdefault("Content-Type", "application/json")
+            json_headers.setdefault("Accept", "application/activity+json")
+
+            try:
+                resp = await session.post(
+                    url,
+                    json=data,
+                    headers=json_headers,
+                    timeout=aiohttp.ClientTimeout(total=timeout),
+                )
+                return resp
+            except aiohttp.ClientConnectorError as e:
+                raise ActivityUnavailableError(
+                    f"unable to POST to {url}, connection error: {e}"
+                )
+            except asyncio.TimeoutError:
+                raise ActivityUnavailableError(
+                    f"unable to POST to {url}, timeout"
+                )
+            except Exception as e:
+                raise ActivityUnavailableError(
+                    f"unable to POST to {url}, unknown error: {e}"
+                )
+
+
+async def _read_body(
+    url: str, resp: "aiohttp.ClientResponse", budget: FetchBudget
+) -> bytes:
+    """Read the body of `resp`, accounting for it with `budget`."""
+    limit = budget.remaining_bytes()
+    if limit is not None and (resp.content_length or 0) > limit:
+        raise FetchBudgetExceededError(
+            f"response of {url} is too large ({resp.content_length} bytes)"
+        )
 
-        try:
-            resp = await session.post(
-                url,
-                json=data,
-                headers=json_headers,
-                timeout=aiohttp.ClientTimeout(total=timeout),
-            )
-            return resp
-        except aiohttp.ClientConnectorError as e:
-            raise ActivityUnavailableError(
-                f"unable to POST to {url}, connection error: {e}"
-            )
-        except asyncio.TimeoutError:
-            raise ActivityUnavailableError(f"unable to POST to {url}, timeout")
-        except Exception as e:
-            raise ActivityUnavailableError(
-                f"unable to POST to {url}, unknown error: {e}"
-            )
+    chunks = []
+    async for chunk in resp.content.iter_chunked(2**16):
+        budget.add_bytes(url, len(chunk))
+        chunks.append(chunk)
+    return b"".join(chunks)
 
 
 async def fetch_json(
@@ -204,7 +306,7 @@ async def fetch_json(
         Parsed JSON response
     """
     if user_agent is None:
-        user_agent = f"Active Boxes/{__version__}"
+        user_agent = f"Active Boxes/{get_version()}"
 
     headers = {
         "User-Agent": user_agent,
@@ -319,19 +421,24 @@ def compute_digest(body: str) -> str:
     return "SHA-256=" + base64.b64encode(h.digest()).decode("utf-8")
 
 
-_http_client: Optional[AsyncHTTPClient] = None
+# One client per event loop, as an aiohttp session can only be used from the
+# loop it was created in
+_http_clients: (
+    "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncHTTPClient]"
+) = weakref.WeakKeyDictionary()
 
 
 async def get_http_client() -> AsyncHTTPClient:
-    """Get the global HTTP client instance (async)."""
-    global _http_client
-    if _http_client is None:
-        _http_client = AsyncHTTPClient()
-    return _http_client
+    """Get the HTTP client of the running event loop (async)."""
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None:
+        client = _http_clients[loop] = AsyncHTTPClient()
+    return client
 
 
 def get_http_client_sync() -> AsyncHTTPClient:
-    """Get the global HTTP client instance (sync wrapper).
+    """Get the HTTP client instance (sync wrapper).
 
     For async code, use await get_http_client() instead.
     """
@@ -339,11 +446,45 @@ def get_http_client_sync() -> AsyncHTTPClient:
 
 
 async def close_http_client() -> None:
-    """Close the global HTTP client (async)."""
-    global _http_client
-    if _http_client:
-        await _http_client.close()
-        _http_client = None
+    """Close the HTTP client of the running event loop (async)."""
+    client = _http_clients.pop(asyncio.get_running_loop(), None)
+    if client:
+        await client.close()
+
+
+async def shutdown_http_client(timeout: float = 30.0) -> bool:
+    """Gracefully close the HTTP client of the running event loop (async).
+
+    New requests are rejected right away, and the in-flight fetches and
+    deliveries get up to `timeout` seconds to complete before the connections
+    are closed (e.g. on a rolling deploy).
+
+    Args:
+        timeout: Maximum number of seconds to wait for the in-flight requests
+
+    Returns:
+        True if all the in-flight requests completed before the deadline
+    """
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None:
+        return True
+    try:
+        return await client.shutdown(timeout)
+    finally:
+        if _http_clients.get(loop) is client:
+            del _http_clients[loop]
+
+
+async def _closing_http_client(coro):
+    """Await `coro`, then close the HTTP client of the running loop.
+
+    Used by the sync wrappers, which run each call in a short-lived loop.
+    """
+    try:
+        return await coro
+    finally:
+        await close_http_client()
 
 
 def close_http_client_sync() -> None:
@@ -358,7 +499,9 @@ def _run_sync(coro):
     """Run an async coroutine from sync code.
 
     This enables Flask/Django and other sync frameworks to use the library.
-    For new code, prefer async/await syntax.
+    For new code, prefer async/await syntax. Shared by all the sync wrappers
+    of the package: the loop only lives for this call, so does its HTTP
+    client, which is closed before returning.
 
     Args:
         coro: A coroutine to run
@@ -371,6 +514,7 @@ def _run_sync(coro):
     """
     if not asyncio.iscoroutine(coro):
         return coro
+    loopwatch.count_sync_call(coro)
 
     try:
         asyncio.get_running_loop()
@@ -380,7 +524,7 @@ def _run_sync(coro):
         )
     except RuntimeError as e:
         if "no running event loop" in str(e):
-            return asyncio.run(coro)
+            return asyncio.run(_closing_http_client(coro))
         raise
 
 
@@ -6,58 +6,38 @@ which is required by ActivityPub for server-to-server communication.
 Mastodon and other Fediverse instances won't accept unsigned requests.
 """
 
-import asyncio
 import base64
+import binascii
 import hashlib
+import hmac
+import json
 import logging
 from datetime import datetime
 from datetime import timezone
-from typing import Dict, Optional, Union
+from typing import Dict, Iterable, Optional, Union
 from urllib.parse import urlparse
 
 from Crypto.Hash import SHA256
 from Crypto.Signature import PKCS1_v1_5
 
+from .activitypub import ObjectType
 from .activitypub import _has_type
 from .activitypub import _await_if_coroutine
 from .activitypub import get_backend
 from .errors import ActivityGoneError
 from .errors import ActivityNotFoundError
+from .errors import BadActivityError
+from .errors import HTTPSignatureError
+from .http_client import _run_sync
+from .http_client import verify_date_header
 from .key import Key
+from .keyring import Keyring
+from .keyring import KeyringEntry
+from . import loopwatch
 
 logger = logging.getLogger(__name__)
 
 
-def _run_sync(coro):
-    """Run an async coroutine from sync code.
-
-    This enables Flask/Django and other sync frameworks to use the library.
-    For new code, prefer async/await syntax.
-
-    Args:
-        coro: A coroutine to run
-
-    Returns:
-        The result of the coroutine
-
-    Raises:
-        RuntimeError: If called from within an async context
-    """
-    if not asyncio.iscoroutine(coro):
-        return coro
-
-    try:
-        asyncio.get_running_loop()
-        raise RuntimeError(
-            "Cannot run async code from within an async context. "
-            "Use 'await' instead of the _sync() wrapper."
-        )
-    except RuntimeError as e:
-        if "no running event loop" in str(e):
-            return asyncio.run(coro)
-        raise
-
-
 def _build_signed_string(
     signed_headers: str,
     method: str,
@@ -65,7 +45,11 @@ def _build_signed_string(
     headers: Dict[str, str],
     body_digest: str,
 ) -> str:
-    """Build the string to be signed."""
+    """Build the string to be signed.
+
+    Header names are matched case-insensitively, as HTTP header names are.
+    """
+    lheaders = {k.lower(): v for k, v in headers.items()}
     out = []
     for signed_header in signed_headers.split(" "):
         if signed_header == "(request-target)":
@@ -73,7 +57,7 @@ def _build_signed_string(
         elif signed_header == "digest":
             out.append("digest: " + body_digest)
         else:
-            out.append(signed_header + ": " + headers.get(signed_header, ""))
+            out.append(signed_header + ": " + lheaders.get(signed_header, ""))
     return "\n".join(out)
 
 
@@ -88,6 +72,7 @@ def _parse_sig_header(val: Optional[str]) -> Optional[Dict[str, str]]:
     return out
 
 
+@loopwatch.watch("httpsig.verify")
 def _verify_h(signed_string: str, signature: bytes, pubkey) -> bool:
     """Verify a signature using a public key."""
     signer = PKCS1_v1_5.new(pubkey)
@@ -96,23 +81,37 @@ def _verify_h(signed_string: str, signature: bytes, pubkey) -> bool:
     return signer.verify(digest, signature)
 
 
-def _body_digest(body: Union[str, bytes]) -> str:
+def _body_digest(body: Union[str, bytes, memoryview]) -> str:
     """Compute the SHA-256 digest of a body.
 
     Args:
-        body: The request body as string or bytes
+        body: The request body as string, bytes or memoryview
 
     Returns:
         Digest header value (RFC 3230 format)
     """
     h = hashlib.sha256()
-    if isinstance(body, bytes):
-        h.update(body)
-    else:
+    if isinstance(body, str):
         h.update(body.encode("utf-8"))
+    else:
+        h.update(body)
     return "SHA-256=" + base64.b64encode(h.digest()).decode("utf-8")
 
 
+def _digest_matches(digest_header: str, body_digest: str) -> bool:
+    """Check a Digest header against the computed SHA-256 body digest.
+
+    The header may list several algorithms (RFC 3230), only the SHA-256
+    one is compared.
+    """
+    expected = body_digest.split("=", 1)[1]
+    for item in digest_header.split(","):
+        algo, _, value = item.strip().partition("=")
+        if algo.lower() == "sha-256":
+            return hmac.compare_digest(value, expected)
+    return False
+
+
 async def _get_public_key(key_id: str) -> Key:
     """Fetch and parse a public key by key ID (async).
 
@@ -221,13 +220,140 @@ def verify_request_sync(
     return _run_sync(verify_request(method, path, headers, body))
 
 
+INBOX_REQUIRED_HEADERS = ("(request-target)", "host", "date", "digest")
+SUPPORTED_ALGORITHMS = ("rsa-sha256", "hs2019")
+
+
+async def verify_inbox_request(
+    method: str,
+    path: str,
+    headers: Dict[str, str],
+    body: Union[bytes, memoryview],
+    max_age_seconds: int = 300,
+    required_headers: Iterable[str] = INBOX_REQUIRED_HEADERS,
+) -> ObjectType:
+    """Verify a signed inbox POST and return its decoded JSON body (async).
+
+    All the checks that don't need the network run first (Signature header
+    parsing, signed headers coverage, Date freshness, Digest match and JSON
+    decoding), so forged or replayed requests are rejected before the remote
+    key is fetched and the RSA signature is verified.
+
+    Args:
+        method: HTTP method (e.g., "POST")
+        path: Request path
+        headers: Request headers (names are matched case-insensitively)
+        body: The raw request body
+        max_age_seconds: Maximum accepted skew for the Date header
+        required_headers: Headers that must be covered by the signature
+
+    Returns:
+        The parsed JSON body
+
+    Raises:
+        HTTPSignatureError: If the request is not properly signed
+        BadActivityError: If the body is not a JSON object
+    """
+    lheaders = {k.lower(): v for k, v in headers.items()}
+
+    try:
+        hsig = _parse_sig_header(lheaders.get("signature"))
+    except ValueError:
+        raise HTTPSignatureError("malformed Signature header")
+    if not hsig:
+        raise HTTPSignatureError("missing Signature header")
+    if not all(k in hsig for k in ("keyId", "headers", "signature")):
+        raise HTTPSignatureError("incomplete Signature header")
+    if hsig.get("algorithm", "rsa-sha256").lower() not in SUPPORTED_ALGORITHMS:
+        raise HTTPSignatureError(
+            f"unsupported signature algorithm {hsig['algorithm']!r}"
+        )
+
+    signed_headers = hsig["headers"].lower()
+    covered = signed_headers.split(" ")
+    for required in required_headers:
+        if required not in covered:
+            raise HTTPSignatureError(f"{required} is not signed")
+        if not required.startswith("(") and required not in lheaders:
+            raise HTTPSignatureError(f"missing {required} header")
+
+    if "date" in covered and not verify_date_header(
+        lheaders.get("date"), max_age_seconds=max_age_seconds
+    ):
+        raise HTTPSignatureError("Date header is missing or stale")
+
+    body_digest = _body_digest(body)
+    if "digest" in lheaders and not _digest_matches(
+        lheaders["digest"], body_digest
+    ):
+        raise HTTPSignatureError("Digest header does not match body")
+
+    try:
+        signature = base64.b64decode(hsig["signature"], validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPSignatureError("malformed signature value")
+
+    try:
+        data = json.loads(bytes(body))
+    except (UnicodeDecodeError, ValueError):
+        raise BadActivityError("request body is not valid JSON")
+    if not isinstance(data, dict):
+        raise BadActivityError("request body is not a JSON object")
+
+    signed_string = _build_signed_string(
+        signed_headers, method, path, lheaders, body_digest
+    )
+
+    try:
+        k = await _get_public_key(hsig["keyId"])
+    except (ActivityGoneError, ActivityNotFoundError, ValueError):
+        raise HTTPSignatureError(f"cannot get public key {hsig['keyId']}")
+
+    if not _verify_h(signed_string, signature, k.pubkey):
+        raise HTTPSignatureError("invalid signature")
+
+    return data
+
+
+def verify_inbox_request_sync(
+    method: str,
+    path: str,
+    headers: Dict[str, str],
+    body: Union[bytes, memoryview],
+    max_age_seconds: int = 300,
+    required_headers: Iterable[str] = INBOX_REQUIRED_HEADERS,
+) -> ObjectType:
+    """Verify a signed inbox POST and return its decoded JSON body (sync wrapper).
+
+    For async code, use await verify_inbox_request() instead.
+    """
+    return _run_sync(
+        verify_inbox_request(
+            method, path, headers, body, max_age_seconds, required_headers
+        )
+    )
+
+
+async def _signing_entry(
+    key: Union[Key, str], keyring: Optional[Keyring]
+) -> KeyringEntry:
+    """Return the signer for a `Key`, or for an actor id through a keyring."""
+    if isinstance(key, Key):
+        return KeyringEntry(key.owner, key)
+    if keyring is None:
+        raise ValueError(f"a keyring is required to sign as {key}")
+    return await keyring.get(key)
+
+
 async def sign_request(
     method: str,
     path: str,
     headers: Dict[str, str],
-    key: Key,
-    body: Optional[str] = None,
+    key: Union[Key, str],
+    body: Optional[Union[str, bytes]] = None,
     host: Optional[str] = None,
+    keyring: Optional[Keyring] = None,
+    body_digest: Optional[str] = None,
 ) -> Dict[str, str]:
     """Sign a request with HTTP Signatures (async).
 
@@ -235,20 +361,26 @@ async def sign_request(
         method: HTTP method (e.g., "GET", "POST")
         path: Request path
         headers: Request headers
-        key: The key to sign with
+        key: The key to sign with, or a local actor id to look up in `keyring`
         body: Optional request body
         host: Optional host header value
+        keyring: Optional keyring holding the local actors private keys
+        body_digest: Optional precomputed Digest header of the body (e.g.
+            `activity.json_digest()` when the body is `to_json_bytes()`)
 
     Returns:
         Updated headers dict with signature
     """
-    logger.info(f"keyid={key.key_id()}")
+    entry = await _signing_entry(key, keyring)
+    key_id = entry.key_id
+    logger.info(f"keyid={key_id}")
 
     if host is None:
         parsed = urlparse(path if "://" in path else f"http://localhost{path}")
         host = parsed.netloc
 
-    body_digest = _body_digest(body) if body else ""
+    if body_digest is None:
+        body_digest = _body_digest(body) if body else ""
 
     date = datetime.now(timezone.utc).strftime("%a, %d %b %Y %H:%M:%S GMT")
 
@@ -261,13 +393,8 @@ async def sign_request(
     to_be_signed = _build_signed_string(
         sigheaders, method, path, headers, body_digest
     )
-    assert key.privkey is not None, "Private key is required for signing"
-    signer = PKCS1_v1_5.new(key.privkey)
-    digest = SHA256.new()
-    digest.update(to_be_signed.encode("utf-8"))
-    sig = base64.b64encode(signer.sign(digest)).decode("utf-8")
+    sig = entry.sign(to_be_signed)
 
-    key_id = key.key_id()
     signature_header = f'keyId="{key_id}",algorithm="rsa-sha256",headers="{sigheaders}",signature="{sig}"'
     logger.debug(f"signature header={signature_header}")
 
@@ -279,9 +406,11 @@ def sign_request_sync(
     method: str,
     path: str,
     headers: Dict[str, str],
-    key: Key,
-    body: Optional[str] = None,
+    key: Union[Key, str],
+    body: Optional[Union[str, bytes]] = None,
     host: Optional[str] = None,
+    keyring: Optional[Keyring] = None,
+    body_digest: Optional[str] = None,
 ) -> Dict[str, str]:
     """Sign a request with HTTP Signatures (sync wrapper).
 
@@ -291,14 +420,21 @@ def sign_request_sync(
         method: HTTP method (e.g., "GET", "POST")
         path: Request path
         headers: Request headers
-        key: The key to sign with
+        key: The key to sign with, or a local actor id to look up in `keyring`
         body: Optional request body
         host: Optional host header value
+        keyring: Optional keyring holding the local actors private keys
+        body_digest: Optional precomputed Digest header of the body (e.g.
+            `activity.json_digest()` when the body is `to_json_bytes()`)
 
     Returns:
         Updated headers dict with signature
     """
-    return _run_sync(sign_request(method, path, headers, key, body, host))
+    return _run_sync(
+        sign_request(
+            method, path, headers, key, body, host, keyring, body_digest
+        )
+    )
 
 
 class HTTPSigAuth:
@@ -306,11 +442,17 @@ class HTTPSigAuth:
 
     This class provides both async and sync interfaces for signing
     outgoing requests with HTTP Signatures.
+
+    It can be initialized with a loaded `Key`, or with a local actor id
+    and the `Keyring` that holds its private key.
     """
 
-    def __init__(self, key: Key) -> None:
-        """Initialize with a key."""
+    def __init__(
+        self, key: Union[Key, str], keyring: Optional[Keyring] = None
+    ) -> None:
+        """Initialize with a key, or an actor id and a keyring."""
         self.key = key
+        self.keyring = keyring
 
     def __call__(
         self,
@@ -320,7 +462,9 @@ class HTTPSigAuth:
         body: Optional[str] = None,
     ) -> Dict[str, str]:
         """Sign a request (sync interface for backwards compatibility)."""
-        return sign_request_sync(method, path, headers, self.key, body)
+        return sign_request_sync(
+            method, path, headers, self.key, body, keyring=self.keyring
+        )
 
     async def sign(
         self,
@@ -330,7 +474,9 @@ class HTTPSigAuth:
         body: Optional[str] = None,
     ) -> Dict[str, str]:
         """Sign a request (async interface)."""
-        return await sign_request(method, path, headers, self.key, body)
+        return await sign_request(
+            method, path, headers, self.key, body, keyring=self.keyring
+        )
 
     def sign_sync(
         self,
@@ -340,4 +486,6 @@ class HTTPSigAuth:
         body: Optional[str] = None,
     ) -> Dict[str, str]:
         """Sign a request (sync interface)."""
-        return sign_request_sync(method, path, headers, self.key, body)
+        return sign_request_sync(
+            method, path, headers, self.key, body, keyring=self.keyring
+        )
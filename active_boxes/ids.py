@@ -0,0 +1,206 @@
+"""Time-ordered object IDs.
+
+`Backend.random_object_id()` returns uniformly random IDs by default. The
+generators of this module return IDs sortable by creation time instead, which
+keeps the B-tree indexes of the activity tables local and allows keyset
+pagination by ID. They are monotonic within a process (even if the clock goes
+backwards), and don't collide across nodes:
+
+- `ULIDGenerator`: 26 chars ULIDs (48 bits of time in milliseconds, 80 random
+  bits)
+- `UUID7Generator`: UUIDv7 (48 bits of time in milliseconds, a 12 bits
+  counter, 62 random bits)
+- `SnowflakeGenerator`: 19 digits snowflakes (41 bits of time in milliseconds,
+  10 bits of node ID, 12 bits of sequence), the node ID must be unique per
+  process: a forked child (e.g. a pre-fork server worker) refuses to generate
+  IDs until it gets its own node ID, unless the generator was given a node ID
+  factory
+
+Example usage:
+    from active_boxes.ids import ULIDGenerator
+
+    backend.use_id_generator(ULIDGenerator())
+    create.set_id()  # e.g. https://example.com/activities/01J9Z3...
+"""
+
+import os
+import threading
+import time
+import uuid
+import weakref
+from typing import Callable
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+# Crockford's base32
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+IDGenerator = Callable[[], str]
+
+_generators: "weakref.WeakSet[_Generator]" = weakref.WeakSet()
+_fork_hook_registered = False
+
+
+def _now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def _reset_after_fork() -> None:
+    # A forked child must not continue the sequence of its parent
+    for generator in list(_generators):
+        generator._after_fork()
+
+
+class _Generator:
+    """Keeps the last timestamp (and counter) to stay monotonic."""
+
+    def __init__(self) -> None:
+        global _fork_hook_registered
+        self._lock = threading.Lock()
+        self._reset()
+        # Registered with the first generator, so importing has no side effect
+        if not _fork_hook_registered and hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_reset_after_fork)
+            _fork_hook_registered = True
+        _generators.add(self)
+
+    def _reset(self) -> None:
+        self._last_ms = 0
+        self._counter = 0
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _tick(self, counter_bits: int, random_start: bool) -> Tuple[int, int]:
+        """Returns the timestamp and counter of the next ID (holding the lock).
+
+        When the clock didn't move forward, the counter is incremented, and the
+        timestamp is bumped once the counter overflows.
+        """
+        now = _now_ms()
+        if now > self._last_ms:
+            self._last_ms = now
+            self._counter = (
+                int.from_bytes(os.urandom(8), "big") % (1 << (counter_bits - 1))
+                if random_start
+                else 0
+            )
+        else:
+            self._counter += 1
+            if self._counter >= 1 << counter_bits:
+                self._last_ms += 1
+                self._counter = 0
+        return self._last_ms, self._counter
+
+
+class ULIDGenerator(_Generator):
+    """Generates ULIDs, monotonic within the process."""
+
+    def _reset(self) -> None:
+        self._last_ms = 0
+        self._random = 0
+
+    def __call__(self) -> str:
+        with self._lock:
+            now = _now_ms()
+            if now > self._last_ms:
+                self._last_ms = now
+                self._random = int.from_bytes(os.urandom(10), "big")
+            else:
+                # Same millisecond: increment the random part
+                self._random += 1
+                if self._random >= 1 << 80:
+                    self._last_ms += 1
+                    self._random = 0
+            value = self._last_ms << 80 | self._random
+
+        chars = []
+        for _ in range(26):
+            value, i = divmod(value, 32)
+            chars.append(_ALPHABET[i])
+        return "".join(reversed(chars))
+
+
+class UUID7Generator(_Generator):
+    """Generates UUIDv7, monotonic within the process."""
+
+    def __call__(self) -> str:
+        with self._lock:
+            ms, counter = self._tick(12, random_start=True)
+
+        rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+        value = ms << 80 | 0x7 << 76 | counter << 64 | 0b10 << 62 | rand_b
+        return str(uuid.UUID(int=value))
+
+
+class SnowflakeGenerator(_Generator):
+    """Generates snowflake IDs, monotonic within the process.
+
+    A forked child shares the node ID of its parent, and would generate the
+    same IDs in the same millisecond: it raises a `RuntimeError` until
+    `set_node_id()` is called, or calls the node ID factory again.
+
+    Args:
+        node_id: ID of the process (0 to 1023), unique across the nodes, or
+            a function returning it (called again in forked children)
+        epoch: Start of the 41 bits timestamp (about 69 years), as a UNIX
+            timestamp in milliseconds
+    """
+
+    def __init__(
+        self,
+        node_id: Union[int, Callable[[], int]],
+        epoch: int = 1_577_836_800_000,
+    ) -> None:
+        self._node_id_factory = node_id if callable(node_id) else None
+        self.node_id: Optional[int] = None
+        self.set_node_id(node_id() if callable(node_id) else node_id)
+        self.epoch = epoch
+        super().__init__()
+
+    def set_node_id(self, node_id: int) -> None:
+        """Set the node ID (e.g. in a forked worker)."""
+        if not 0 <= node_id < 1 << 10:
+            raise ValueError(f"invalid node ID {node_id}, must be in [0, 1023]")
+        self.node_id = node_id
+
+    def _after_fork(self) -> None:
+        super()._after_fork()
+        self.node_id = None
+
+    def __call__(self) -> str:
+        with self._lock:
+            node_id = self.node_id
+            if node_id is None:
+                if self._node_id_factory is None:
+                    raise RuntimeError(
+                        "the process was forked, call set_node_id() with the "
+                        "node ID of this process first"
+                    )
+                node_id = self._node_id_factory()
+                self.set_node_id(node_id)
+            ms, sequence = self._tick(12, random_start=False)
+
+        # Zero-padded, so the IDs sort as strings too
+        return f"{(ms - self.epoch) << 22 | node_id << 12 | sequence:019d}"
+
+
+def parse_timestamp(object_id: str) -> Optional[float]:
+    """Returns the creation time (UNIX timestamp) of a ULID or UUIDv7.
+
+    Returns None for other IDs (the snowflakes depend on their epoch).
+    """
+    try:
+        if len(object_id) == 26:
+            value = 0
+            for char in object_id.upper():
+                value = value * 32 + _ALPHABET.index(char)
+            return (value >> 80) / 1000
+        parsed = uuid.UUID(object_id)
+    except ValueError:
+        return None
+    if parsed.version != 7:
+        return None
+    return (parsed.int >> 80) / 1000
@@ -1,4 +1,5 @@
 import base64
+import typing
 from typing import Any
 from typing import Dict
 from typing import Optional
@@ -6,6 +7,11 @@ from typing import Optional
 from Crypto.PublicKey import RSA
 from Crypto.Util import number
 
+from . import loopwatch
+
+if typing.TYPE_CHECKING:
+    from .key_pool import KeyPool  # noqa: type checking
+
 
 class Key(object):
     DEFAULT_KEY_SIZE = 2048
@@ -29,7 +35,11 @@ class Key(object):
             self.privkey.publickey().exportKey("PEM").decode("utf-8")
         )
 
-    def new(self) -> None:
+    @loopwatch.watch("key.new")
+    def new(self, pool: Optional["KeyPool"] = None) -> None:
+        if pool is not None:
+            self.load(pool.pop_pem())
+            return
         k = RSA.generate(self.DEFAULT_KEY_SIZE)
         self.privkey_pem = k.exportKey("PEM").decode("utf-8")
         self.pubkey_pem = k.publickey().exportKey("PEM").decode("utf-8")
@@ -0,0 +1,386 @@
+"""Pre-generated RSA key pool.
+
+Generating a 2048-bit RSA key takes from 100 ms to over a second of CPU,
+which makes bulk account provisioning CPU-bound. A `KeyPool` keeps a stock
+of keys generated ahead of time in a background process, persists them
+encrypted at rest to a local file and hands them out instantly.
+
+The file is append-only between compactions: a batch of generated keys is
+appended in a single write, and handing out a key appends a consumed marker
+instead of re-encrypting and rewriting the whole pool.
+
+Several pools, e.g. the workers of a pre-fork server, can share the file:
+they take an exclusive lock on a sidecar `.lock` file (`fcntl.flock`, so
+POSIX only) and re-read the file before handing out or adding keys.
+
+Example usage:
+    from active_boxes.key import Key
+    from active_boxes.key_pool import KeyPool
+
+    pool = KeyPool("/var/lib/myapp/keys.pool", passphrase=SECRET, size=64)
+    pool.start()
+
+    k = Key("https://myapp.example/user/alice")
+    k.new(pool=pool)  # no RSA generation on the calling thread
+"""
+
+import base64
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO
+from typing import Deque
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from Crypto.Cipher import AES
+from Crypto.Protocol.KDF import scrypt
+from Crypto.PublicKey import RSA
+
+from .key import Key
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+_FILE_VERSION = 1
+_SALT_SIZE = 16
+_NONCE_SIZE = 12
+_TAG_SIZE = 16
+# Line appended when the oldest key of the file is handed out
+_CONSUMED = "-"
+
+
+def _generate_private_key_pem(key_size: int) -> str:
+    """Generate a private key and return it as PEM (runs in a worker process)."""
+    return RSA.generate(key_size).export_key("PEM").decode("utf-8")
+
+
+class KeyPool:
+    """A stock of pre-generated RSA private keys.
+
+    Keys are generated in a background process until the pool holds `size`
+    keys, and generation resumes as soon as it drops below `low_watermark`.
+    A key is removed from the on-disk pool before being handed out, so a key
+    is never given to two callers, even across restarts or by two pools
+    sharing the file.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        passphrase: str | bytes,
+        size: int = 32,
+        low_watermark: int | None = None,
+        key_size: int = Key.DEFAULT_KEY_SIZE,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        """Initialize the pool.
+
+        Args:
+            path: File where the encrypted keys are persisted
+            passphrase: Secret used to derive the file encryption key
+            size: Number of keys to keep in stock (high watermark)
+            low_watermark: Refill when the stock drops below this (default size // 2)
+            key_size: RSA key size in bits
+            executor: Optional executor for key generation
+                (default: a single-worker ProcessPoolExecutor)
+        """
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.path = path
+        self.size = size
+        self.low_watermark = (
+            size // 2 if low_watermark is None else low_watermark
+        )
+        self.key_size = key_size
+        self._passphrase = (
+            passphrase.encode("utf-8")
+            if isinstance(passphrase, str)
+            else passphrase
+        )
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._lock = threading.RLock()
+        # Notified when a pending key generation completes
+        self._idle = threading.Condition(self._lock)
+        self._keys: Deque[str] = deque()
+        # Encrypted line of each key, so compacting doesn't re-encrypt
+        self._lines: Deque[str] = deque()
+        # Number of generated keys (at the end of _lines) not written yet
+        self._unsaved = 0
+        # Number of consumed markers in the file since the last compaction
+        self._consumed = 0
+        self._pending: List[Future] = []
+        # Held lock file, while this pool reads or writes the file
+        self._lock_file: Optional[IO[str]] = None
+        # Replaced by the salt of the file (if any) when loading
+        self._salt = os.urandom(_SALT_SIZE)
+        self._aes_key: bytes | None = None
+        self._loaded = False
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __enter__(self) -> "KeyPool":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """Load the persisted keys and start refilling in the background."""
+        with self._lock:
+            self._load()
+        self.refill()
+
+    def refill(self) -> None:
+        """Schedule background generation up to `size` keys."""
+        with self._lock:
+            if self._closed:
+                return
+            self._ensure_loaded()
+            missing = self.size - len(self._keys) - len(self._pending)
+            if missing <= 0:
+                return
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=1)
+            for _ in range(missing):
+                fut = self._executor.submit(
+                    _generate_private_key_pem, self.key_size
+                )
+                self._pending.append(fut)
+                fut.add_done_callback(self._on_generated)
+
+    def join(self, timeout: float | None = None) -> None:
+        """Wait for the scheduled keys to be generated and added to the pool."""
+        with self._idle:
+            self._idle.wait_for(lambda: not self._pending, timeout=timeout)
+
+    def pop_pem(self) -> str:
+        """Take a private key PEM out of the pool.
+
+        Falls back to generating the key on the calling thread if the pool
+        is empty.
+        """
+        with self._file_lock():
+            # Other pools may have handed out or added keys
+            self._load()
+            if self._keys:
+                # The unsaved keys are written first, the marker consumes
+                # the oldest key of the file
+                lines = self._take_unsaved()
+                pem = self._keys.popleft()
+                self._lines.popleft()
+                self._persist(lines + [_CONSUMED])
+            else:
+                pem = None
+            stock = len(self._keys)
+
+        if stock < self.low_watermark:
+            self.refill()
+
+        if pem is None:
+            logger.warning("key pool is empty, generating a key synchronously")
+            pem = _generate_private_key_pem(self.key_size)
+        return pem
+
+    def new_key(self, owner: str, id_: str | None = None) -> Key:
+        """Return a new `Key` loaded with a key from the pool."""
+        k = Key(owner, id_)
+        k.load(self.pop_pem())
+        return k
+
+    def close(self, wait: bool = True) -> None:
+        """Stop generating keys and shut down the owned executor."""
+        with self._lock:
+            self._closed = True
+            pending = list(self._pending)
+        if not wait:
+            for fut in pending:
+                fut.cancel()
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+        with self._lock:
+            if self._unsaved:
+                self._flush()
+
+    def _on_generated(self, fut: Future) -> None:
+        with self._lock:
+            try:
+                self._pending.remove(fut)
+                if fut.cancelled():
+                    return
+                if exc := fut.exception():
+                    logger.error(f"failed to generate a key: {exc!r}")
+                    return
+                pem = fut.result()
+                self._keys.append(pem)
+                self._lines.append(self._encrypt(pem))
+                self._unsaved += 1
+            finally:
+                # The keys of a batch are written at once
+                if not self._pending and self._unsaved:
+                    self._flush()
+                self._idle.notify_all()
+
+    def _derive(self, salt: bytes) -> bytes:
+        return scrypt(self._passphrase, salt, 32, N=2**14, r=8, p=1)  # type: ignore
+
+    def _ensure_loaded(self) -> None:
+        # Keys popped or generated before start() must not overwrite the
+        # keys (and salt) of an existing file
+        if not self._loaded:
+            self._load()
+
+    @contextlib.contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Lock the file against the other pools (and threads) using it."""
+        with self._lock:
+            if self._lock_file is not None or fcntl is None:
+                yield
+                return
+            with open(self.path + ".lock", "a") as f:
+                # Released when the file is closed
+                fcntl.flock(f, fcntl.LOCK_EX)
+                self._lock_file = f
+                try:
+                    yield
+                finally:
+                    self._lock_file = None
+
+    def _load(self) -> None:
+        """(Re-)read the keys of the file, keeping the unsaved ones."""
+        with self._file_lock():
+            # Keys already decrypted, and generated keys not written yet
+            known = dict(zip(self._lines, self._keys))
+            unsaved = [(line, known[line]) for line in self._take_unsaved()]
+            first_load = not self._loaded
+            salt = self._salt
+            self._keys.clear()
+            self._lines.clear()
+            self._consumed = 0
+            self._loaded = True
+            if not os.path.exists(self.path):
+                if self._aes_key is None:
+                    self._aes_key = self._derive(self._salt)
+            else:
+                self._read(known, compact=first_load)
+                if self._salt != salt:
+                    unsaved = [(self._encrypt(pem), pem) for _, pem in unsaved]
+
+            for line, pem in unsaved:
+                self._keys.append(pem)
+                self._lines.append(line)
+            self._unsaved = len(unsaved)
+
+    def _read(self, known: Dict[str, str], compact: bool) -> None:
+        torn = False
+        with open(self.path, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != _FILE_VERSION:
+                raise ValueError(f"unsupported key pool file {self.path}")
+            salt = base64.b64decode(header["salt"])
+            if salt != self._salt or self._aes_key is None:
+                # First load, or the file was created by another pool
+                self._salt = salt
+                self._aes_key = self._derive(salt)
+                known.clear()
+            for line in f:
+                if not line.endswith("\n"):
+                    # Interrupted append
+                    torn = True
+                    break
+                line = line.strip()
+                if line == _CONSUMED:
+                    self._consumed += 1
+                    if self._keys:
+                        self._keys.popleft()
+                        self._lines.popleft()
+                elif line:
+                    self._keys.append(known.get(line) or self._decrypt(line))
+                    self._lines.append(line)
+        if torn or self._consumed > self.size or compact and self._consumed:
+            self._save()
+
+    def _take_unsaved(self) -> List[str]:
+        lines = list(self._lines)[len(self._lines) - self._unsaved :]
+        self._unsaved = 0
+        return lines
+
+    def _flush(self) -> None:
+        """Write the generated keys to the file."""
+        with self._file_lock():
+            self._load()
+            self._persist(self._take_unsaved())
+
+    def _persist(self, lines: List[str]) -> None:
+        """Append lines to the file, compacting it once in a while.
+
+        Must be called with the file locked, right after `_load()`.
+        """
+        self._consumed += lines.count(_CONSUMED)
+        if self._consumed > self.size or not os.path.exists(self.path):
+            self._save()
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _save(self) -> None:
+        """Atomically rewrite the file with the keys of the pool."""
+        header = {
+            "version": _FILE_VERSION,
+            "salt": base64.b64encode(self._salt).decode("utf-8"),
+        }
+        lines = [json.dumps(header)]
+        lines.extend(self._lines)
+
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=dirname, prefix=".keypool-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._unsaved = 0
+        self._consumed = 0
+
+    def _encrypt(self, pem: str) -> str:
+        nonce = os.urandom(_NONCE_SIZE)
+        cipher = AES.new(self._aes_key, AES.MODE_GCM, nonce=nonce)  # type: ignore
+        ct, tag = cipher.encrypt_and_digest(pem.encode("utf-8"))
+        return base64.b64encode(nonce + tag + ct).decode("utf-8")
+
+    def _decrypt(self, line: str) -> str:
+        raw = base64.b64decode(line)
+        nonce = raw[:_NONCE_SIZE]
+        tag = raw[_NONCE_SIZE : _NONCE_SIZE + _TAG_SIZE]
+        cipher = AES.new(self._aes_key, AES.MODE_GCM, nonce=nonce)  # type: ignore
+        try:
+            pem = cipher.decrypt_and_verify(raw[_NONCE_SIZE + _TAG_SIZE :], tag)
+        except ValueError:
+            raise ValueError(
+                f"cannot decrypt key pool {self.path}, wrong passphrase?"
+            )
+        return pem.decode("utf-8")
@@ -0,0 +1,139 @@
+"""Keyring for local actors.
+
+Signing with a `Key` requires the app to `Key.load()` the private key PEM
+first, which parses the RSA key and exports the public key PEM every time.
+A `Keyring` loads the private key of each local actor once, keeps the parsed
+key, its `keyId` and a reusable signer in an LRU cache, and lets the signing
+helpers sign by actor id.
+
+Example usage:
+    from active_boxes.httpsig import HTTPSigAuth
+    from active_boxes.keyring import Keyring
+
+    keyring = Keyring(lambda actor_id: db.get_private_key_pem(actor_id))
+
+    auth = HTTPSigAuth("https://myapp.example/user/alice", keyring=keyring)
+    headers = await auth.sign("POST", "/inbox", headers, body)
+"""
+
+import asyncio
+import base64
+import threading
+from collections import OrderedDict
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Union
+
+from Crypto.Hash import SHA256
+from Crypto.Signature import PKCS1_v1_5
+
+from . import loopwatch
+from .http_client import _run_sync
+from .key import Key
+
+KeyLoader = Callable[[str], Union[str, Key, Awaitable[Union[str, Key]]]]
+
+
+class KeyringEntry:
+    """A parsed private key with its precomputed `keyId` and signer."""
+
+    __slots__ = ("actor_id", "key", "key_id", "_signer")
+
+    def __init__(self, actor_id: str, key: Key) -> None:
+        if key.privkey is None:
+            raise ValueError(f"missing privkey for {actor_id}")
+        self.actor_id = actor_id
+        self.key = key
+        self.key_id = key.key_id()
+        self._signer = PKCS1_v1_5.new(key.privkey)
+
+    @loopwatch.watch("keyring.sign")
+    def sign(self, data: str) -> str:
+        """Sign `data` with RSA-SHA256 and return the base64 signature."""
+        digest = SHA256.new()
+        digest.update(data.encode("utf-8"))
+        return base64.b64encode(self._signer.sign(digest)).decode("utf-8")
+
+
+class Keyring:
+    """LRU cache of the parsed private keys of local actors.
+
+    The `loader` is called with an actor id the first time the actor signs
+    something, and must return its private key as a PEM string or as a loaded
+    `Key` (to customize the `keyId`). It may be a coroutine function.
+    """
+
+    def __init__(self, loader: KeyLoader, maxsize: int = 1024) -> None:
+        """Initialize the keyring.
+
+        Args:
+            loader: Callable returning the private key of an actor
+            maxsize: Maximum number of parsed keys kept in memory
+        """
+        self.loader = loader
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, KeyringEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, actor_id: str) -> bool:
+        return actor_id in self._entries
+
+    def _cached(self, actor_id: str) -> KeyringEntry | None:
+        with self._lock:
+            entry = self._entries.get(actor_id)
+            if entry is not None:
+                self._entries.move_to_end(actor_id)
+            return entry
+
+    def _store(self, actor_id: str, loaded: Any) -> KeyringEntry:
+        if isinstance(loaded, Key):
+            key = loaded
+        elif isinstance(loaded, str):
+            key = Key(actor_id)
+            key.load(loaded)
+        else:
+            raise ValueError(f"no private key for {actor_id}")
+
+        entry = KeyringEntry(actor_id, key)
+        with self._lock:
+            self._entries[actor_id] = entry
+            self._entries.move_to_end(actor_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def add(self, actor_id: str, key: str | Key) -> KeyringEntry:
+        """Add (or replace) the private key of an actor."""
+        return self._store(actor_id, key)
+
+    def invalidate(self, actor_id: str) -> None:
+        """Forget the cached key of an actor (e.g. after a key rotation)."""
+        with self._lock:
+            self._entries.pop(actor_id, None)
+
+    def clear(self) -> None:
+        """Forget all the cached keys."""
+        with self._lock:
+            self._entries.clear()
+
+    async def get(self, actor_id: str) -> KeyringEntry:
+        """Return the entry for an actor, loading its key if needed (async)."""
+        if (entry := self._cached(actor_id)) is not None:
+            return entry
+        loaded = self.loader(actor_id)
+        if asyncio.iscoroutine(loaded):
+            loaded = await loaded
+        return self._store(actor_id, loaded)
+
+    def get_sync(self, actor_id: str) -> KeyringEntry:
+        """Return the entry for an actor, loading its key if needed (sync).
+
+        For async code, use await get() instead.
+        """
+        if (entry := self._cached(actor_id)) is not None:
+            return entry
+        return self._store(actor_id, _run_sync(self.loader(actor_id)))
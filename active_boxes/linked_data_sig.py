@@ -1,66 +1,410 @@
+import asyncio
 import base64
+import enum
 import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
 import typing
+from collections import OrderedDict
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from datetime import timezone
+from importlib import resources
 from typing import Any
 from typing import Dict
+from typing import Optional
+from typing import Tuple
+from typing import Union
 
 from Crypto.Hash import SHA256
 from Crypto.Signature import PKCS1_v1_5
-from pyld import jsonld  # type: ignore[import-untyped]
+
+from . import canonicalize
+from . import loopwatch
 
 if typing.TYPE_CHECKING:
     from .key import Key  # noqa: type checking
+    from .keyring import Keyring  # noqa: type checking
+    from .keyring import KeyringEntry  # noqa: type checking
+
+logger = logging.getLogger(__name__)
+
 
+# Well-known contexts shipped with the package, so verifying a signature
+# never needs the network for the usual ActivityPub documents.
+_BUNDLED_CONTEXTS = {
+    "https://www.w3.org/ns/activitystreams": "activitystreams.jsonld",
+    "http://www.w3.org/ns/activitystreams": "activitystreams.jsonld",
+    "https://w3id.org/security/v1": "security-v1.jsonld",
+    "http://w3id.org/security/v1": "security-v1.jsonld",
+    "https://w3id.org/identity/v1": "identity-v1.jsonld",
+    "http://w3id.org/identity/v1": "identity-v1.jsonld",
+}
 
-# cache the downloaded "schemas", otherwise the library is super slow
+# cache the loaded "schemas", otherwise the library is super slow
 # (https://github.com/digitalbazaar/pyld/issues/70)
 _CACHE: Dict[str, Any] = {}
-LOADER = jsonld.requests_document_loader()
+
+DEFAULT_CONTEXT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "active_boxes",
+    "jsonld",
+)
+
+
+class ContextCache:
+    """Bounded on-disk cache for the remote contexts that are not bundled.
+
+    Entries older than `ttl` seconds are fetched again (the stale copy is
+    still served if the refresh fails), and the oldest entries are evicted
+    once there are more than `max_entries` files.
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_CONTEXT_CACHE_DIR,
+        max_entries: int = 128,
+        ttl: float = 7 * 24 * 3600,
+    ) -> None:
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    def _path(self, url: str) -> str:
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
+
+    def get(self, url: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Return the cached remote document for `url` and whether it's fresh."""
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None, False
+        if entry.get("url") != url:
+            return None, False
+        fresh = time.time() - entry.get("fetched", 0) <= self.ttl
+        return entry["document"], fresh
+
+    def set(self, url: str, document: Dict[str, Any]) -> None:
+        """Store the remote document for `url`, evicting the oldest entries."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"url": url, "fetched": time.time(), "document": document},
+                    f,
+                )
+            os.replace(tmp, self._path(url))
+            self._evict()
+        except OSError:
+            logger.warning(f"failed to cache context {url}", exc_info=True)
+
+    def _evict(self) -> None:
+        entries = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        ]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[: len(entries) - self.max_entries]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+_context_cache: Optional[ContextCache] = ContextCache()
+_allow_network = True
+_remote_loader = None
+
+
+def configure_context_loader(
+    cache: Optional[ContextCache] = None,
+    allow_network: bool = True,
+) -> None:
+    """Configure how contexts that are not bundled are loaded.
+
+    Args:
+        cache: On-disk cache for remote contexts (None disables it)
+        allow_network: Whether unknown contexts may be fetched at all
+    """
+    global _context_cache, _allow_network
+    _context_cache = cache
+    _allow_network = allow_network
+    _CACHE.clear()
+    with _NORMALIZED_LOCK:
+        _NORMALIZED.clear()
+
+
+def _load_bundled(url: str) -> Dict[str, Any]:
+    document = json.loads(
+        resources.files(__package__)
+        .joinpath("contexts", _BUNDLED_CONTEXTS[url])
+        .read_text(encoding="utf-8")
+    )
+    return {
+        "contentType": "application/ld+json",
+        "contextUrl": None,
+        "documentUrl": url,
+        "document": document,
+    }
+
+
+def _load_remote(url: str, options: Dict[str, Any]) -> Any:
+    global _remote_loader
+    cached, fresh = _context_cache.get(url) if _context_cache else (None, False)
+    if cached is not None and fresh:
+        return cached
+
+    # pyld (and requests) are slow to import, and pyld installs its default
+    # document loader when imported: only load it when it's needed
+    from pyld import jsonld  # type: ignore[import-untyped]
+
+    if not _allow_network:
+        if cached is not None:
+            return cached
+        raise jsonld.JsonLdError(
+            f"refusing to fetch {url}, network access is disabled",
+            "jsonld.LoadDocumentError",
+            {"url": url},
+            code="loading document failed",
+        )
+
+    if _remote_loader is None:
+        _remote_loader = jsonld.requests_document_loader()
+    try:
+        resp = _remote_loader(url, options)
+    except Exception:
+        if cached is not None:
+            logger.warning(f"failed to refresh context {url}, using stale copy")
+            return cached
+        raise
+
+    if _context_cache:
+        _context_cache.set(url, resp)
+    return resp
 
 
 def _caching_document_loader(url: str, options: Dict[str, Any] = {}) -> Any:
     if url in _CACHE:
         return _CACHE[url]
-    resp = LOADER(url, options)
+    if url in _BUNDLED_CONTEXTS:
+        resp = _load_bundled(url)
+    else:
+        resp = _load_remote(url, options)
     _CACHE[url] = resp
     return resp
 
 
-jsonld.set_document_loader(_caching_document_loader)
+# Memoized URDNA2015 output, keyed by a hash of the input document: the same
+# object (e.g. a Create forwarded by many Announce) is often verified again.
+_NORMALIZED: "OrderedDict[str, str]" = OrderedDict()
+_NORMALIZED_LOCK = threading.Lock()
+_normalized_max = 1024
+_executor: Optional[Executor] = None
+# Used when no executor is configured, so that the normalizations can't
+# starve the event loop default executor
+_default_executor: Optional[ThreadPoolExecutor] = None
+_timeout: Optional[float] = 10.0
+# Normalizations submitted to the executor and not done yet, including the
+# ones whose caller timed out (a running normalization can't be interrupted)
+_pending = 0
+_max_pending = 64
+_PENDING_LOCK = threading.Lock()
 
 
-def _options_hash(doc):
+class _Default(enum.Enum):
+    TIMEOUT = 0
+
+
+# Default of the `timeout` arguments: use the configured timeout
+_DEFAULT_TIMEOUT = _Default.TIMEOUT
+
+
+def configure_canonicalization(
+    executor: Optional[Executor] = None,
+    timeout: Optional[float] = 10.0,
+    cache_size: int = 1024,
+    max_pending: int = 64,
+) -> None:
+    """Configure the canonicalization used by LD signatures.
+
+    Args:
+        executor: Pool running the normalization for the async variants
+            (None uses a thread pool of this module)
+        timeout: Seconds the async variants wait for the normalization of a
+            document (None waits indefinitely)
+        cache_size: Number of normalized documents kept in memory (0 disables it)
+        max_pending: Number of normalizations that can be queued or running in
+            the executor, including the ones whose caller stopped waiting
+    """
+    global _executor, _timeout, _normalized_max, _max_pending
+    _executor = executor
+    _timeout = timeout
+    _normalized_max = cache_size
+    _max_pending = max_pending
+    with _NORMALIZED_LOCK:
+        _NORMALIZED.clear()
+
+
+def _cache_key(doc: Dict[str, Any]) -> str:
+    # Key order does not change the canonical form, so sort it
+    data = json.dumps(
+        doc, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _cached_normalized(key: str) -> Optional[str]:
+    with _NORMALIZED_LOCK:
+        normalized = _NORMALIZED.get(key)
+        if normalized is not None:
+            _NORMALIZED.move_to_end(key)
+        return normalized
+
+
+def _cache_normalized(key: str, normalized: str) -> None:
+    if _normalized_max <= 0:
+        return
+    with _NORMALIZED_LOCK:
+        _NORMALIZED[key] = normalized
+        while len(_NORMALIZED) > _normalized_max:
+            _NORMALIZED.popitem(last=False)
+
+
+@loopwatch.watch("linked_data_sig.normalize")
+def _normalize_uncached(doc: Dict[str, Any]) -> str:
+    # Documents using only the well-known contexts skip pyld entirely
+    if (normalized := canonicalize.normalize(doc)) is not None:
+        return normalized
+
+    from pyld import jsonld  # type: ignore[import-untyped]
+
+    return jsonld.normalize(
+        doc,
+        {
+            "algorithm": "URDNA2015",
+            "format": "application/nquads",
+            "documentLoader": _caching_document_loader,
+        },
+    )
+
+
+def _normalize(doc: Dict[str, Any]) -> str:
+    key = _cache_key(doc)
+    if (normalized := _cached_normalized(key)) is not None:
+        return normalized
+    normalized = _normalize_uncached(doc)
+    _cache_normalized(key, normalized)
+    return normalized
+
+
+def _get_executor() -> Executor:
+    global _default_executor
+    if _executor is not None:
+        return _executor
+    with _PENDING_LOCK:
+        if _default_executor is None:
+            _default_executor = ThreadPoolExecutor(
+                thread_name_prefix="ld-normalize"
+            )
+        return _default_executor
+
+
+def _release_pending(fut: Optional[Future] = None) -> None:
+    global _pending
+    with _PENDING_LOCK:
+        _pending -= 1
+
+
+def _submit_normalization(doc: Dict[str, Any]) -> "Future[str]":
+    """Submit a normalization to the executor, unless too many are pending."""
+    global _pending
+    with _PENDING_LOCK:
+        if _pending >= _max_pending:
+            raise asyncio.TimeoutError(
+                f"{_pending} normalizations are already pending"
+            )
+        _pending += 1
+    try:
+        fut = _get_executor().submit(_normalize_uncached, doc)
+    except BaseException:
+        _release_pending()
+        raise
+    # Called once the normalization is done, even if nobody waits for it
+    # anymore (or right away if it gets cancelled before starting)
+    fut.add_done_callback(_release_pending)
+    return fut
+
+
+async def _normalize_async(doc: Dict[str, Any]) -> str:
+    key = _cache_key(doc)
+    if (normalized := _cached_normalized(key)) is not None:
+        return normalized
+    normalized = await asyncio.wrap_future(_submit_normalization(doc))
+    _cache_normalized(key, normalized)
+    return normalized
+
+
+def _options_doc(doc):
     doc = dict(doc["signature"])
     for k in ["type", "id", "signatureValue"]:
         if k in doc:
             del doc[k]
     doc["@context"] = "https://w3id.org/identity/v1"
-    if normalized := jsonld.normalize(
-        doc, {"algorithm": "URDNA2015", "format": "application/nquads"}
-    ):
-        h = hashlib.new("sha256")
-        h.update(normalized.encode("utf-8"))
-        return h.hexdigest()
-    return ""
+    return doc
 
 
-def _doc_hash(doc):
+def _unsigned_doc(doc):
     doc = dict(doc)
     if "signature" in doc:
         del doc["signature"]
-    if normalized := jsonld.normalize(
-        doc, {"algorithm": "URDNA2015", "format": "application/nquads"}
-    ):
+    return doc
+
+
+def _hash(normalized: str) -> str:
+    if normalized:
         h = hashlib.new("sha256")
         h.update(normalized.encode("utf-8"))
         return h.hexdigest()
     return ""
 
 
-def verify_signature(doc: Dict[str, Any], key: "Key") -> bool:
-    to_be_signed = _options_hash(doc) + _doc_hash(doc)
+def _options_hash(doc):
+    return _hash(_normalize(_options_doc(doc)))
+
+
+def _doc_hash(doc):
+    return _hash(_normalize(_unsigned_doc(doc)))
+
+
+async def _to_be_signed_async(
+    doc: Dict[str, Any], timeout: Optional[float] | _Default
+) -> str:
+    # Only stops waiting: the normalizations already running complete in the
+    # executor, which is why the pending ones are capped
+    options, unsigned = await asyncio.wait_for(
+        asyncio.gather(
+            _normalize_async(_options_doc(doc)),
+            _normalize_async(_unsigned_doc(doc)),
+        ),
+        timeout=_timeout if timeout is _DEFAULT_TIMEOUT else timeout,
+    )
+    return _hash(options) + _hash(unsigned)
+
+
+@loopwatch.watch("linked_data_sig.verify")
+def _verify(doc: Dict[str, Any], key: "Key", to_be_signed: str) -> bool:
     signature = doc["signature"]["signatureValue"]
     signer = PKCS1_v1_5.new(key.pubkey or key.privkey)  # type: ignore
     digest = SHA256.new()
@@ -68,20 +412,110 @@ def verify_signature(doc: Dict[str, Any], key: "Key") -> bool:
     return signer.verify(digest, base64.b64decode(signature))  # type: ignore
 
 
-def generate_signature(doc: Dict[str, Any], key: "Key") -> None:
+def verify_signature(doc: Dict[str, Any], key: "Key") -> bool:
+    to_be_signed = _options_hash(doc) + _doc_hash(doc)
+    return _verify(doc, key, to_be_signed)
+
+
+async def verify_signature_async(
+    doc: Dict[str, Any],
+    key: "Key",
+    timeout: Optional[float] | _Default = _DEFAULT_TIMEOUT,
+) -> bool:
+    """Verify an LD signature, running the normalization off the event loop.
+
+    Args:
+        doc: The signed document
+        key: The key of the signer
+        timeout: Seconds to wait for the normalization (default: the timeout
+            of `configure_canonicalization()`, None waits indefinitely)
+
+    Raises:
+        asyncio.TimeoutError: If the normalization takes longer than `timeout`,
+            or too many normalizations are already pending
+    """
+    to_be_signed = await _to_be_signed_async(doc, timeout)
+    return _verify(doc, key, to_be_signed)
+
+
+def _signing_options(
+    doc: Dict[str, Any],
+    key: Union["Key", str],
+    keyring: Optional["Keyring"],
+) -> Tuple[Dict[str, Any], Optional["KeyringEntry"]]:
+    if isinstance(key, str):
+        if keyring is None:
+            raise ValueError(f"a keyring is required to sign as {key}")
+        entry = keyring.get_sync(key)
+        creator = entry.key_id
+    else:
+        entry = None
+        creator = doc["actor"] + "#main-key"
+
     options = {
         "type": "RsaSignature2017",
-        "creator": doc["actor"] + "#main-key",
+        "creator": creator,
         "created": datetime.now(timezone.utc).replace(microsecond=0).isoformat()
         + "Z",
     }
-    doc["signature"] = options
-    to_be_signed = _options_hash(doc) + _doc_hash(doc)
-    if not key.privkey:
+    return options, entry
+
+
+@loopwatch.watch("linked_data_sig.sign")
+def _sign(
+    options: Dict[str, Any],
+    key: Union["Key", str],
+    entry: Optional["KeyringEntry"],
+    to_be_signed: str,
+) -> None:
+    if entry is not None:
+        options["signatureValue"] = entry.sign(to_be_signed)
+        return
+
+    if not key.privkey:  # type: ignore
         raise ValueError(f"missing privkey on key {key!r}")
 
-    signer = PKCS1_v1_5.new(key.privkey)
+    signer = PKCS1_v1_5.new(key.privkey)  # type: ignore
     digest = SHA256.new()
     digest.update(to_be_signed.encode("utf-8"))
     sig = base64.b64encode(signer.sign(digest))  # type: ignore
     options["signatureValue"] = sig.decode("utf-8")
+
+
+def generate_signature(
+    doc: Dict[str, Any],
+    key: Union["Key", str],
+    keyring: Optional["Keyring"] = None,
+) -> None:
+    """Sign `doc` in place with a `Key`, or as a local actor id through `keyring`."""
+    options, entry = _signing_options(doc, key, keyring)
+    doc["signature"] = options
+    to_be_signed = _options_hash(doc) + _doc_hash(doc)
+    _sign(options, key, entry, to_be_signed)
+
+
+async def generate_signature_async(
+    doc: Dict[str, Any],
+    key: Union["Key", str],
+    keyring: Optional["Keyring"] = None,
+    timeout: Optional[float] | _Default = _DEFAULT_TIMEOUT,
+) -> None:
+    """Sign `doc` in place, running the normalization off the event loop.
+
+    Args:
+        doc: The document to sign
+        key: The `Key` to sign with, or a local actor id of `keyring`
+        keyring: Keyring holding the key of the actor
+        timeout: Seconds to wait for the normalization (default: the timeout
+            of `configure_canonicalization()`, None waits indefinitely)
+
+    Raises:
+        asyncio.TimeoutError: If the normalization takes longer than `timeout`,
+            or too many normalizations are already pending
+    """
+    if isinstance(key, str) and keyring is not None:
+        await keyring.get(key)  # make sure the key is loaded without blocking
+    options, entry = _signing_options(doc, key, keyring)
+    doc["signature"] = options
+    to_be_signed = await _to_be_signed_async(doc, timeout)
+    _sign(options, key, entry, to_be_signed)
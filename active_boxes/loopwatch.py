@@ -0,0 +1,177 @@
+"""Opt-in detection of the calls blocking the event loop.
+
+The library's CPU-heavy call sites (RSA signing and verification, JSON-LD
+normalization, markdown rendering) and the ones that may block on I/O (DNS
+lookups) are instrumented. Once enabled, each of these calls made from the
+event loop thread and taking longer than the threshold is reported with its
+call site (the first caller outside of the library) and duration. The calls
+to the `*_sync()` wrappers are counted per function, and the loop lag can be
+measured too. It's meant for staging and tests, not for production.
+
+Example usage:
+    from active_boxes import loopwatch
+
+    detector = loopwatch.enable(threshold=0.02)
+    asyncio.create_task(detector.monitor_loop_lag())
+    ...
+    for call in detector.blocking_calls:
+        print(f"{call.name} blocked for {call.duration:.3f}s at {call.call_site}")
+    print(detector.sync_calls.most_common())
+"""
+
+import asyncio
+import contextlib
+import functools
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from types import FrameType
+from typing import Any
+from typing import Callable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import TypeVar
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class BlockingCall(NamedTuple):
+    """A call that blocked the event loop for longer than the threshold."""
+
+    name: str
+    duration: float
+    call_site: str
+
+
+def _call_site() -> str:
+    """Returns the first frame outside of the library (and of this module)."""
+    frame: Optional[FrameType] = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if not filename.startswith(_PACKAGE_DIR):
+            return f"{filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<unknown>"
+
+
+class BlockingDetector:
+    """Collects the blocking calls, the loop lag and the sync wrapper calls.
+
+    Args:
+        threshold: Number of seconds above which a call (or the loop lag) is
+            reported
+    """
+
+    def __init__(self, threshold: float = 0.05) -> None:
+        self.threshold = threshold
+        self.blocking_calls: List[BlockingCall] = []
+        self.sync_calls: Counter = Counter()
+        self.max_lag = 0.0
+        self.lags: List[float] = []
+
+    def observe(self, name: str, duration: float) -> None:
+        """Report the call to `name` if it blocked a running loop too long."""
+        if duration < self.threshold:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # e.g. in an executor thread
+
+        call = BlockingCall(name, duration, _call_site())
+        self.blocking_calls.append(call)
+        logger.warning(
+            "%s blocked the event loop for %.3fs at %s",
+            name,
+            duration,
+            call.call_site,
+        )
+
+    def count_sync_call(self, coro: Any) -> None:
+        self.sync_calls[getattr(coro, "__qualname__", repr(coro))] += 1
+
+    async def monitor_loop_lag(self, interval: float = 0.05) -> None:
+        """Measure the lag of the running loop until cancelled.
+
+        The lag is how late a `sleep(interval)` wakes up, i.e. how long the
+        loop was blocked by something (instrumented or not).
+        """
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(interval)
+            lag = time.monotonic() - start - interval
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self.lags.append(lag)
+                logger.warning("event loop lag of %.3fs", lag)
+
+
+_DETECTOR: Optional[BlockingDetector] = None
+
+
+def enable(threshold: float = 0.05) -> BlockingDetector:
+    """Start reporting the blocking calls, returns the detector."""
+    global _DETECTOR
+    _DETECTOR = BlockingDetector(threshold)
+    return _DETECTOR
+
+
+def disable() -> None:
+    """Stop reporting the blocking calls."""
+    global _DETECTOR
+    _DETECTOR = None
+
+
+def get_detector() -> Optional[BlockingDetector]:
+    """Returns the enabled detector, if any."""
+    return _DETECTOR
+
+
+@contextlib.contextmanager
+def detect_blocking(threshold: float = 0.05) -> Iterator[BlockingDetector]:
+    """Report the blocking calls made within the block (e.g. in a test)."""
+    global _DETECTOR
+    previous = _DETECTOR
+    detector = enable(threshold)
+    try:
+        yield detector
+    finally:
+        _DETECTOR = previous
+
+
+def watch(name: str) -> Callable[[F], F]:
+    """Instrument a CPU-heavy (or blocking) function.
+
+    When no detector is enabled, the overhead is a global lookup.
+    """
+
+    def decorator(f: F) -> F:
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            detector = _DETECTOR
+            if detector is None:
+                return f(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                detector.observe(name, time.perf_counter() - start)
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+def count_sync_call(coro: Any) -> None:
+    """Count a call to a sync wrapper, if a detector is enabled."""
+    if (detector := _DETECTOR) is not None:
+        detector.count_sync_call(coro)
@@ -45,7 +45,7 @@ Example usage with asyncio:
             return False  # No deduplication by default
 """
 
-from typing import List, Protocol, runtime_checkable
+from typing import Dict, List, Protocol, runtime_checkable
 
 from .activitypub import ObjectType
 
@@ -145,6 +145,63 @@ class StoragePlugin(Protocol):
         ...
 
 
+@runtime_checkable
+class AsyncStoragePlugin(Protocol):
+    """Async-native protocol for persisting activities and objects.
+
+    The library awaits the storage methods when they return a coroutine, so
+    a backend can implement either this protocol or `StoragePlugin`. The
+    batch methods are used when available: resolving the recipients of an
+    activity (or the actors of many activities) then takes a single round
+    trip to the storage instead of one per actor.
+    """
+
+    async def store_activity(
+        self,
+        activity: ObjectType,
+        recipient_inbox: str | None = None,
+    ) -> None:
+        """Persist an activity to storage."""
+        ...
+
+    async def store_activities(
+        self,
+        activities: List[ObjectType],
+        recipient_inbox: str | None = None,
+    ) -> None:
+        """Persist several activities to storage at once.
+
+        Args:
+            activities: The activity dicts to store
+            recipient_inbox: If received via inbox, which one
+        """
+        ...
+
+    async def get_activity(self, activity_id: str) -> ObjectType | None:
+        """Retrieve a stored activity by ID."""
+        ...
+
+    async def store_actor(self, actor: ObjectType) -> None:
+        """Cache an actor locally."""
+        ...
+
+    async def get_actor(self, actor_id: str) -> ObjectType | None:
+        """Retrieve a cached actor by ID."""
+        ...
+
+    async def get_actors(self, actor_ids: List[str]) -> Dict[str, ObjectType]:
+        """Retrieve several cached actors at once.
+
+        Args:
+            actor_ids: The actors' IDs
+
+        Returns:
+            The cached actors by ID, the unknown ones are left out (the
+            library fetches them from the network)
+        """
+        ...
+
+
 @runtime_checkable
 class CollectionPlugin(Protocol):
     """Protocol for building ActivityPub collections."""
@@ -212,7 +269,8 @@ class ActivityPubPlugin(
     The app SHOULD implement:
         - extra_inboxes() - Add extra recipients for all activities
         - store_activity() / get_activity() - Persist activities
-        - store_actor() / get_actor() - Cache actors
+        - store_actor() / get_actor() - Cache actors (the async and batch
+          variants of `AsyncStoragePlugin` are supported too)
         - get_outbox() / get_inbox() / get_followers() / get_following() / get_liked()
     """
 
@@ -6,6 +6,7 @@ from urllib.parse import urlparse
 
 from .errors import Error
 from .errors import ServerError
+from . import loopwatch
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +22,7 @@ class URLLookupFailedError(Error):
     pass
 
 
+@loopwatch.watch("urlutils.is_url_valid")
 def is_url_valid(url: str, debug: bool = False) -> bool:
     parsed = urlparse(url)
     if parsed.scheme not in ["http", "https"]:
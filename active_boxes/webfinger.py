@@ -1,48 +1,78 @@
 """WebFinger support for ActivityPub.
 
 This module provides WebFinger endpoint discovery for ActivityPub actors.
+
+The responses are cached per backend (see `configure_webfinger_cache()`),
+failed lookups included (for a shorter time) so an unreachable host isn't
+queried over and over, and the scheme that worked for a host is tried first
+next time.
 """
 
 import asyncio
+import hashlib
+import json
 import logging
-from typing import Any, Dict
+import threading
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from typing import Union
 from urllib.parse import urlparse
 
+from .activitypub import BaseActivity
+from .activitypub import ObjectType
 from .activitypub import _await_if_coroutine
 from .activitypub import get_backend
+from .backend import LRUCache
+from .errors import FetchBudgetExceededError
+from .http_client import _run_sync
+from .urlutils import InvalidURLError
 from .urlutils import check_url
 
 logger = logging.getLogger(__name__)
 
+_ttl = 3600.0
+_negative_ttl = 60.0
 
-def _run_sync(coro):
-    """Run an async coroutine from sync code.
 
-    This enables Flask/Django and other sync frameworks to use the library.
-    For new code, prefer async/await syntax.
+def configure_webfinger_cache(
+    ttl: float = 3600.0, negative_ttl: float = 60.0
+) -> None:
+    """Configure how long the WebFinger lookups are cached.
 
     Args:
-        coro: A coroutine to run
+        ttl: Number of seconds a response is kept (0 disables the cache)
+        negative_ttl: Number of seconds a failed lookup is kept (0 disables
+            the caching of failures)
+    """
+    global _ttl, _negative_ttl
+    _ttl = ttl
+    _negative_ttl = negative_ttl
 
-    Returns:
-        The result of the coroutine
 
-    Raises:
-        RuntimeError: If called from within an async context
-    """
-    if not asyncio.iscoroutine(coro):
-        return coro
-
-    try:
-        asyncio.get_running_loop()
-        raise RuntimeError(
-            "Cannot run async code from within an async context. "
-            "Use 'await' instead of the _sync() wrapper."
-        )
-    except RuntimeError as e:
-        if "no running event loop" in str(e):
-            return asyncio.run(coro)
-        raise
+def _cache(name: str) -> Optional[LRUCache]:
+    cache = getattr(get_backend(), "cache", None)
+    return cache(name) if cache is not None else None
+
+
+def _parse_resource(resource: str) -> Tuple[str, str, List[str]]:
+    """Returns the normalized resource, its host and the schemes to try."""
+    protos = ["https", "http"]
+    if resource.startswith(("http://", "https://")):
+        if resource.startswith("http://"):
+            protos.reverse()
+        parsed = urlparse(resource)
+        host = parsed.netloc.lower()
+        resource = parsed._replace(netloc=host).geturl()
+    else:
+        if resource.startswith("acct:"):
+            resource = resource[5:]
+        if resource.startswith("@"):
+            resource = resource[1:]
+        username, host = resource.split("@", 1)
+        host = host.lower()
+        resource = f"acct:{username}@{host}"
+
+    return resource, host, protos
 
 
 async def webfinger(
@@ -57,39 +87,95 @@ async def webfinger(
     Returns:
         WebFinger response dict or None if resolution failed
     """
-    logger.info(f"performing webfinger resolution for {resource}")
-    protos = ["https", "http"]
-    if resource.startswith("http://"):
-        protos.reverse()
-        host = urlparse(resource).netloc
-    elif resource.startswith("https://"):
-        host = urlparse(resource).netloc
-    else:
-        if resource.startswith("acct:"):
-            resource = resource[5:]
-        if resource.startswith("@"):
-            resource = resource[1:]
-        _, host = resource.split("@", 1)
-        resource = "acct:" + resource
+    resource, host, protos = _parse_resource(resource)
+    cache = _cache("webfinger") if _ttl > 0 else None
+    if cache is not None and (cached := cache.get(resource)) is not None:
+        expires, resp = cached
+        if time.monotonic() < expires:
+            logger.debug(f"webfinger cache hit for {resource}")
+            return resp
+        cache.pop(resource)
 
+    logger.info(f"performing webfinger resolution for {resource}")
     check_url(f"https://{host}", debug=debug)
-    resp = None
 
     backend = get_backend()
+    schemes = _cache("webfinger_schemes")
+    if schemes is not None and (known := schemes.get(host)) in protos:
+        protos.remove(known)
+        protos.insert(0, known)
 
-    for i, proto in enumerate(protos):
+    resp = None
+    for proto in protos:
         try:
             url = f"{proto}://{host}/.well-known/webfinger"
             result = backend.fetch_json(url, params={"resource": resource})
             resp = await _await_if_coroutine(result)
-            return resp
+        except FetchBudgetExceededError:
+            raise
         except Exception:
             logger.exception("fetch failed")
-            if i == 0:
-                continue
-            break
+            continue
 
-    return None
+        if resp and schemes is not None:
+            schemes.set(host, proto)
+        break
+
+    if cache is not None:
+        if resp:
+            cache.set(resource, (time.monotonic() + _ttl, resp))
+        elif _negative_ttl > 0:
+            cache.set(resource, (time.monotonic() + _negative_ttl, None))
+
+    return resp
+
+
+async def webfinger_many(
+    resources: Iterable[str], debug: bool = False, max_per_host: int = 4
+) -> Dict[str, Dict[str, Any] | None]:
+    """Resolve many resources concurrently (async).
+
+    The resources pointing to the same account are only resolved once, and
+    at most `max_per_host` lookups are made to a host at the same time.
+
+    Args:
+        resources: The resources to resolve
+        debug: Enable debug mode
+        max_per_host: Maximum number of concurrent lookups per host
+
+    Returns:
+        WebFinger response dict (or None if the resolution failed, or the
+        resource is invalid) for each resource
+    """
+    resources = list(resources)
+    parsed: Dict[str, str] = {}
+    hosts: Dict[str, str] = {}
+    for resource in resources:
+        try:
+            normalized, host, _ = _parse_resource(resource)
+        except ValueError:
+            logger.warning(f"invalid webfinger resource {resource}")
+            continue
+        parsed[resource] = normalized
+        hosts[normalized] = host
+
+    limits = {host: asyncio.Semaphore(max_per_host) for host in hosts.values()}
+
+    async def _resolve(resource: str) -> Dict[str, Any] | None:
+        async with limits[hosts[resource]]:
+            try:
+                return await webfinger(resource, debug)
+            except InvalidURLError:
+                logger.warning(f"invalid webfinger resource {resource}")
+                return None
+
+    results = dict(
+        zip(hosts, await asyncio.gather(*(_resolve(r) for r in hosts)))
+    )
+    return {
+        resource: results[parsed[resource]] if resource in parsed else None
+        for resource in resources
+    }
 
 
 def webfinger_sync(resource: str, debug: bool = False) -> Dict[str, Any] | None:
@@ -107,6 +193,16 @@ def webfinger_sync(resource: str, debug: bool = False) -> Dict[str, Any] | None:
     return _run_sync(webfinger(resource, debug))
 
 
+def webfinger_many_sync(
+    resources: Iterable[str], debug: bool = False, max_per_host: int = 4
+) -> Dict[str, Dict[str, Any] | None]:
+    """Resolve many resources concurrently (sync).
+
+    For async code, use await webfinger_many() instead.
+    """
+    return _run_sync(webfinger_many(resources, debug, max_per_host))
+
+
 async def get_remote_follow_template(
     resource: str, debug: bool = False
 ) -> str | None:
@@ -173,3 +269,214 @@ def get_actor_url_sync(resource: str, debug: bool = False) -> str | None:
         the Actor URL or None if the resolution failed.
     """
     return _run_sync(get_actor_url(resource, debug))
+
+
+class WebFingerResponse(NamedTuple):
+    """A response to a `/.well-known/webfinger` query."""
+
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+
+class _Entry:
+    """The prerendered JRD of a local actor (and its `rel` filtered views)."""
+
+    def __init__(self, jrd: Dict[str, Any], max_age: int) -> None:
+        self.jrd = jrd
+        self.max_age = max_age
+        self.rels = frozenset(link["rel"] for link in jrd["links"])
+        self.full = self._render(jrd)
+        self._views: Dict[frozenset, Tuple[Dict[str, str], bytes]] = {}
+
+    def _render(self, jrd: Dict[str, Any]) -> Tuple[Dict[str, str], bytes]:
+        body = json.dumps(jrd, separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        headers = {
+            "Content-Type": "application/jrd+json; charset=utf-8",
+            "Cache-Control": f"public, max-age={self.max_age}",
+            "Access-Control-Allow-Origin": "*",
+            "ETag": etag,
+        }
+        return headers, body
+
+    def view(self, rel: Iterable[str]) -> Tuple[Dict[str, str], bytes]:
+        if not (rel := frozenset(rel)):
+            return self.full
+        # Only the rels of the actor can change the output, which bounds the
+        # number of views whatever is queried
+        return self._view(self.rels & rel)
+
+    def _view(self, rels: frozenset) -> Tuple[Dict[str, str], bytes]:
+        if (view := self._views.get(rels)) is None:
+            jrd = dict(self.jrd)
+            jrd["links"] = [
+                link for link in self.jrd["links"] if link["rel"] in rels
+            ]
+            view = self._views[rels] = self._render(jrd)
+        return view
+
+
+class WebFingerResponder:
+    """Answers the `/.well-known/webfinger` queries for the local actors.
+
+    The JRD of each actor is rendered when the actor is added (or updated),
+    and indexed by its `acct:` handle, its aliases and its URLs, so a query
+    is a dict lookup and never hits the database.
+
+    Example usage:
+        responder = WebFingerResponder(
+            "example.com",
+            subscribe_template="https://example.com/follow?profile={uri}",
+        )
+        for actor in await load_local_actors():
+            responder.add_actor(actor)
+
+        # In the /.well-known/webfinger handler
+        resp = responder.respond(
+            request.query.get("resource", ""),
+            rel=request.query.getall("rel", []),
+            if_none_match=request.headers.get("If-None-Match"),
+        )
+        return Response(body=resp.body, status=resp.status, headers=resp.headers)
+
+    Args:
+        domain: The domain of the local `acct:` handles
+        max_age: Number of seconds the responses can be cached by clients
+        subscribe_template: The remote follow template (OStatus subscribe
+            link), if any
+    """
+
+    def __init__(
+        self,
+        domain: str,
+        max_age: int = 3600,
+        subscribe_template: Optional[str] = None,
+    ) -> None:
+        self.domain = domain.lower()
+        self.max_age = max_age
+        self.subscribe_template = subscribe_template
+        self._index: Dict[str, _Entry] = {}
+        self._keys: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _jrd(self, actor: ObjectType, aliases: Iterable[str]) -> Dict[str, Any]:
+        actor_id = actor["id"]
+        profile_urls = [u for u in _hrefs(actor.get("url")) if u != actor_id]
+        links = []
+        if profile_urls:
+            links.append(
+                {
+                    "rel": "http://webfinger.net/rel/profile-page",
+                    "type": "text/html",
+                    "href": profile_urls[0],
+                }
+            )
+        links.append(
+            {
+                "rel": "self",
+                "type": "application/activity+json",
+                "href": actor_id,
+            }
+        )
+        if self.subscribe_template:
+            links.append(
+                {
+                    "rel": "http://ostatus.org/schema/1.0/subscribe",
+                    "template": self.subscribe_template,
+                }
+            )
+
+        return {
+            "subject": f"acct:{actor['preferredUsername']}@{self.domain}",
+            "aliases": list(dict.fromkeys([actor_id, *profile_urls, *aliases])),
+            "links": links,
+        }
+
+    def add_actor(
+        self,
+        actor: Union[ObjectType, BaseActivity],
+        aliases: Iterable[str] = (),
+    ) -> None:
+        """Index a local actor, or update it.
+
+        Args:
+            actor: The actor (with a `preferredUsername`)
+            aliases: Other resources (`acct:` handles or URLs) the actor is
+                known as
+        """
+        if isinstance(actor, BaseActivity):
+            actor = actor.to_dict()
+        jrd = self._jrd(actor, aliases)
+        entry = _Entry(jrd, self.max_age)
+        keys = []
+        for resource in [jrd["subject"], *jrd["aliases"]]:
+            try:
+                keys.append(_index_key(resource))
+            except ValueError:
+                logger.warning(f"invalid webfinger alias {resource}")
+
+        with self._lock:
+            self._remove(actor["id"])
+            for key in keys:
+                self._index[key] = entry
+            self._keys[actor["id"]] = keys
+
+    def remove_actor(self, actor_id: str) -> None:
+        """Stop answering for a local actor (e.g. once deleted)."""
+        with self._lock:
+            self._remove(actor_id)
+
+    def _remove(self, actor_id: str) -> None:
+        for key in self._keys.pop(actor_id, []):
+            self._index.pop(key, None)
+
+    def respond(
+        self,
+        resource: str,
+        rel: Iterable[str] = (),
+        if_none_match: Optional[str] = None,
+    ) -> WebFingerResponse:
+        """Returns the response to a query.
+
+        Args:
+            resource: The `resource` query parameter
+            rel: The `rel` query parameters, to only return these links
+            if_none_match: The `If-None-Match` request header
+
+        Returns:
+            A 200 (or 304 if the ETag matches) response, a 400 if the
+            resource is missing or invalid, or a 404 if it's unknown
+        """
+        try:
+            key = _index_key(resource)
+        except ValueError:
+            return WebFingerResponse(400, {}, b"")
+
+        if (entry := self._index.get(key)) is None:
+            return WebFingerResponse(404, {}, b"")
+
+        headers, body = entry.view(rel)
+        if if_none_match is not None and headers["ETag"] in if_none_match:
+            return WebFingerResponse(304, dict(headers), b"")
+        return WebFingerResponse(200, dict(headers), body)
+
+
+def _hrefs(url: Any) -> List[str]:
+    """Returns the URLs of an actor `url` attribute."""
+    if isinstance(url, str):
+        return [url]
+    if isinstance(url, dict):
+        return [url["href"]] if url.get("href") else []
+    if isinstance(url, list):
+        return [href for u in url for href in _hrefs(u)]
+    return []
+
+
+def _index_key(resource: str) -> str:
+    resource, _, _ = _parse_resource(resource.strip())
+    # The handles are looked up case-insensitively (like Mastodon does)
+    return resource.lower() if resource.startswith("acct:") else resource
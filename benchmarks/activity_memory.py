@@ -0,0 +1,114 @@
+"""Report the memory used per parsed activity.
+
+Usage:
+    python benchmarks/activity_memory.py [count]
+
+Each payload is decoded from its own JSON string (like incoming activities
+would be), parsed with `parse_activity()` and kept alive, and the memory
+allocated per activity is measured with tracemalloc.
+"""
+
+import gc
+import json
+import sys
+import tracemalloc
+from typing import Any
+from typing import Dict
+
+from active_boxes import activitypub as ap
+from active_boxes.backend import Backend
+
+ACTOR_ID = "https://example.com/users/alice"
+
+PERSON: Dict[str, Any] = {
+    "@context": ap.DEFAULT_CTX,
+    "type": "Person",
+    "id": ACTOR_ID,
+    "name": "Alice",
+    "preferredUsername": "alice",
+    "summary": "<p>Hi there</p>",
+    "inbox": ACTOR_ID + "/inbox",
+    "outbox": ACTOR_ID + "/outbox",
+    "followers": ACTOR_ID + "/followers",
+    "following": ACTOR_ID + "/following",
+    "url": "https://example.com/@alice",
+    "manuallyApprovesFollowers": False,
+    "publicKey": {
+        "id": ACTOR_ID + "#main-key",
+        "owner": ACTOR_ID,
+        "publicKeyPem": "-----BEGIN PUBLIC KEY-----\n" + "A" * 392 + "\n",
+    },
+    "endpoints": {"sharedInbox": "https://example.com/inbox"},
+}
+
+NOTE: Dict[str, Any] = {
+    "@context": ap.DEFAULT_CTX,
+    "type": "Note",
+    "id": "https://example.com/notes/1",
+    "attributedTo": ACTOR_ID,
+    "content": "<p>Hello world, this is a short post.</p>",
+    "published": "2024-01-01T00:00:00Z",
+    "to": [ap.AS_PUBLIC],
+    "cc": [ACTOR_ID + "/followers"],
+    "tag": [],
+    "sensitive": False,
+}
+
+CREATE: Dict[str, Any] = {
+    "@context": ap.DEFAULT_CTX,
+    "type": "Create",
+    "id": "https://example.com/notes/1/activity",
+    "actor": ACTOR_ID,
+    "published": "2024-01-01T00:00:00Z",
+    "to": [ap.AS_PUBLIC],
+    "cc": [ACTOR_ID + "/followers"],
+    "object": {k: v for k, v in NOTE.items() if k != "@context"},
+}
+
+
+class _Backend(Backend):
+    def base_url(self) -> str:
+        return "https://example.com"
+
+    def activity_url(self, obj_id: str) -> str:
+        return f"https://example.com/activities/{obj_id}"
+
+    def note_url(self, obj_id: str) -> str:
+        return f"https://example.com/notes/{obj_id}"
+
+    async def fetch_iri(self, iri: str, **kwargs) -> Dict[str, Any]:
+        return PERSON
+
+    def fetch_iri_sync(self, iri: str, **kwargs) -> Dict[str, Any]:
+        return PERSON
+
+
+def bytes_per_activity(payload: Dict[str, Any], count: int) -> float:
+    raw = json.dumps(payload)
+    ap.parse_activity(json.loads(raw))  # warm up the interned contexts
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    activities = [ap.parse_activity(json.loads(raw)) for _ in range(count)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    assert len(activities) == count
+    return (after - before) / count
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    ap.use_backend(_Backend())
+    for name, payload in [
+        ("Note", NOTE),
+        ("Create", CREATE),
+        ("Person", PERSON),
+    ]:
+        print(f"{name:<8}{bytes_per_activity(payload, count):>10.0f} bytes")
+
+
+if __name__ == "__main__":
+    main()
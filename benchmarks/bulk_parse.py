@@ -0,0 +1,66 @@
+"""Report the throughput of `parse_ndjson()` for a growing number of workers.
+
+Usage:
+    python benchmarks/bulk_parse.py [count]
+
+A temporary NDJSON file of `Create` activities is parsed with 1 worker (in
+process), then with 2, 4, ... up to the number of CPUs.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+from active_boxes import activitypub as ap
+from active_boxes.bulk import parse_ndjson
+
+ACTOR_ID = "https://example.com/users/alice"
+
+
+def _create(i: int) -> dict:
+    return {
+        "@context": ap.DEFAULT_CTX,
+        "type": "Create",
+        "id": f"https://example.com/notes/{i}/activity",
+        "actor": ACTOR_ID,
+        "published": "2024-01-01T00:00:00Z",
+        "to": [ap.AS_PUBLIC],
+        "cc": [ACTOR_ID + "/followers"],
+        "object": {
+            "type": "Note",
+            "id": f"https://example.com/notes/{i}",
+            "attributedTo": ACTOR_ID,
+            "content": f"<p>Hello world, this is post number {i}.</p>",
+            "published": "2024-01-01T00:00:00Z",
+            "to": [ap.AS_PUBLIC],
+            "cc": [ACTOR_ID + "/followers"],
+            "tag": [],
+        },
+    }
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    cpus = os.cpu_count() or 1
+
+    with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as f:
+        for i in range(count):
+            f.write(json.dumps(_create(i)) + "\n")
+        f.flush()
+
+        workers = 1
+        while workers <= cpus:
+            start = time.perf_counter()
+            parsed = sum(1 for _ in parse_ndjson(f.name, workers=workers))
+            elapsed = time.perf_counter() - start
+            assert parsed == count
+            print(
+                f"{workers:>3} workers {count / elapsed:>12,.0f} activities/s"
+            )
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main()
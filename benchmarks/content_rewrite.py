@@ -0,0 +1,87 @@
+"""Report how fast hashtags and mentions are linked in 5 KB posts.
+
+Usage:
+    python benchmarks/content_rewrite.py [count]
+
+Each post is about 5 KB of text with many hashtags (some sharing a prefix,
+like #python and #python3) and mentions. The mentions are already in the
+backend cache, so no network I/O is involved.
+"""
+
+import sys
+import time
+from typing import List
+
+from active_boxes import activitypub as ap
+from active_boxes import content_helper
+from active_boxes.backend import Backend
+
+WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do".split()
+
+
+class _Backend(Backend):
+    def base_url(self) -> str:
+        return "https://example.com"
+
+    def activity_url(self, obj_id: str) -> str:
+        return f"https://example.com/activities/{obj_id}"
+
+    def note_url(self, obj_id: str) -> str:
+        return f"https://example.com/notes/{obj_id}"
+
+
+def _post(size: int = 5_000) -> str:
+    parts: List[str] = []
+    i = 0
+    while sum(len(p) + 1 for p in parts) < size:
+        parts.append(WORDS[i % len(WORDS)])
+        if i % 4 == 0:
+            parts.append(f"#tag{i % 60}")
+        if i % 15 == 0:
+            parts.append(f"@user{i % 12}@host{i % 3}.example")
+        i += 1
+    return " ".join(parts)
+
+
+def _bench(name: str, func, post: str, count: int) -> None:
+    func(post)  # warm up
+    start = time.perf_counter()
+    for _ in range(count):
+        func(post)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<16}{elapsed / count * 1e6:>10.1f} us/post")
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    backend = _Backend()
+    ap.use_backend(backend)
+    post = _post()
+    for mention in set(content_helper.MENTION_REGEX.findall(post)):
+        _, username, host = mention.split("@")
+        content_helper._cache_mention(
+            backend.cache("mentions"),
+            content_helper._mention_key(mention),
+            {
+                "id": f"https://{host}/users/{username}",
+                "url": f"https://{host}/@{username}",
+            },
+        )
+
+    print(
+        f"{len(post)} bytes, {len(content_helper.HASHTAG_REGEX.findall(post))} "
+        f"hashtags, {len(content_helper.MENTION_REGEX.findall(post))} mentions"
+    )
+    _bench("hashtagify", content_helper.hashtagify, post, count)
+    _bench("mentionify", content_helper.mentionify, post, count)
+    _bench(
+        "both",
+        lambda p: content_helper.mentionify(content_helper.hashtagify(p)[0]),
+        post,
+        count,
+    )
+    _bench("parse_markdown", content_helper.parse_markdown, post, count // 10)
+
+
+if __name__ == "__main__":
+    main()
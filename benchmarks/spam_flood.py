@@ -0,0 +1,116 @@
+"""Report how fast `parse_activity()` goes through a flood of spam payloads.
+
+Usage:
+    python benchmarks/spam_flood.py [count]
+
+Each payload is a typical malformed or unwanted payload (large bodies, wrong
+object types, unknown types...) that an inbox must reject, plus a valid one
+for reference. The backend answers actor fetches instantly, the number of
+fetches done before rejecting a payload is reported as well.
+"""
+
+import json
+import sys
+import time
+from typing import Any
+from typing import Dict
+
+from active_boxes import activitypub as ap
+from active_boxes.backend import Backend
+
+ACTOR_ID = "https://example.com/users/spammer"
+SPAM = "<p>" + "Buy now! " * 2000 + "</p>"
+TAGS = [
+    {"type": "Mention", "href": f"https://example.com/users/{i}"}
+    for i in range(200)
+]
+
+PERSON = {
+    "type": "Person",
+    "id": ACTOR_ID,
+    "inbox": ACTOR_ID + "/inbox",
+    "outbox": ACTOR_ID + "/outbox",
+}
+
+PAYLOADS = {
+    "not an object": ["spam"] * 50,
+    "unknown type": {"type": "Spam", "content": SPAM, "tag": TAGS},
+    "unexpected type": {
+        "type": "Like",
+        "actor": ACTOR_ID,
+        "object": {"type": "Like", "id": ACTOR_ID, "content": SPAM},
+    },
+    "missing actor": {"type": "Announce", "object": "x", "content": SPAM},
+    "bad object": {
+        "type": "Like",
+        "actor": ACTOR_ID,
+        "object": {"type": "Person", "id": ACTOR_ID, "summary": SPAM},
+        "tag": TAGS,
+    },
+    "bad actor": {
+        "type": "Follow",
+        "actor": {"name": SPAM},
+        "object": ACTOR_ID,
+        "tag": TAGS,
+    },
+    "valid create": {
+        "type": "Create",
+        "id": "https://example.com/notes/1/activity",
+        "actor": ACTOR_ID,
+        "object": {
+            "type": "Note",
+            "id": "https://example.com/notes/1",
+            "attributedTo": ACTOR_ID,
+            "content": SPAM,
+            "tag": TAGS,
+        },
+    },
+}
+
+
+class _Backend(Backend):
+    fetches = 0
+
+    def base_url(self) -> str:
+        return "https://example.com"
+
+    def activity_url(self, obj_id: str) -> str:
+        return f"https://example.com/activities/{obj_id}"
+
+    def note_url(self, obj_id: str) -> str:
+        return f"https://example.com/notes/{obj_id}"
+
+    async def fetch_iri(self, iri: str, **kwargs) -> Dict[str, Any]:
+        return self.fetch_iri_sync(iri)
+
+    def fetch_iri_sync(self, iri: str, **kwargs) -> Dict[str, Any]:
+        self.fetches += 1
+        return PERSON
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    backend = _Backend()
+    ap.use_backend(backend)
+
+    total = 0.0
+    for name, payload in PAYLOADS.items():
+        raw = json.dumps(payload)
+        backend.fetches = 0
+        start = time.perf_counter()
+        for _ in range(count):
+            try:
+                ap.parse_activity(json.loads(raw))
+            except (KeyError, ValueError, ap.Error):
+                pass
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        print(
+            f"{name:<16}{elapsed / count * 1e6:>10.1f} us/payload"
+            f"{backend.fetches / count:>6.1f} fetches/payload"
+        )
+    print(f"{'total':<16}{total:>10.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Compare the size and speed of `ActivityCodec` with plain JSON.
+
+Usage:
+    python benchmarks/storage_codec.py [count]
+
+`count` `Create` activities (with a note, a mention and hashtags) are encoded
+and decoded with `json`, and with the codec (with and without the instance
+base URL as a custom prefix). The codec uses `msgpack` when installed, its
+pure-Python implementation otherwise.
+"""
+
+import json
+import sys
+import time
+import zlib
+
+from active_boxes import activitypub as ap
+from active_boxes import codec
+from active_boxes.backend import Backend
+
+BASE_URL = "https://myapp.example"
+
+
+class _Backend(Backend):
+    def base_url(self) -> str:
+        return BASE_URL
+
+    def activity_url(self, obj_id: str) -> str:
+        return f"{BASE_URL}/activities/{obj_id}"
+
+    def note_url(self, obj_id: str) -> str:
+        return f"{BASE_URL}/notes/{obj_id}"
+
+
+def _activity(i: int) -> dict:
+    actor = f"{BASE_URL}/users/user{i % 50}"
+    with ap.offline_parsing():
+        note = ap.Note(
+            attributedTo=actor,
+            content=(
+                f"<p>Post number {i} for <a href='https://remote.example/@bob'>"
+                "@bob</a>, see #python and #activitypub</p>"
+            ),
+            to=[ap.AS_PUBLIC],
+            cc=[f"{actor}/followers", "https://remote.example/users/bob"],
+            published="2024-01-01T00:00:00Z",
+            tag=[
+                {
+                    "type": "Mention",
+                    "href": "https://remote.example/users/bob",
+                    "name": "@bob@remote.example",
+                },
+                {
+                    "type": "Hashtag",
+                    "href": f"{BASE_URL}/tags/python",
+                    "name": "#python",
+                },
+                {
+                    "type": "Hashtag",
+                    "href": f"{BASE_URL}/tags/activitypub",
+                    "name": "#activitypub",
+                },
+            ],
+        )
+        create = note.build_create()
+    create.set_id(f"{BASE_URL}/activities/{i}", str(i))
+    return create.to_dict()
+
+
+def _bench(name: str, encode, decode, activities: list) -> None:
+    start = time.perf_counter()
+    encoded = [encode(a) for a in activities]
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for data in encoded:
+        decode(data)
+    decode_time = time.perf_counter() - start
+
+    size = sum(len(data) for data in encoded) / len(encoded)
+    compressed = sum(len(zlib.compress(data)) for data in encoded)
+    print(
+        f"{name:<20}{size:>8.0f} B{compressed / len(encoded):>8.0f} B"
+        f"{encode_time / len(activities) * 1e6:>10.1f} us"
+        f"{decode_time / len(activities) * 1e6:>10.1f} us"
+    )
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    ap.use_backend(_Backend())
+    activities = [_activity(i) for i in range(count)]
+
+    print(f"codec implementation: {'msgpack' if codec.msgpack else 'Python'}")
+    print(f"{'':<20}{'size':>10}{'zlib':>10}{'encode':>13}{'decode':>13}")
+    _bench(
+        "json",
+        lambda a: json.dumps(a, separators=(",", ":")).encode("utf-8"),
+        json.loads,
+        activities,
+    )
+    default_codec = codec.ActivityCodec()
+    _bench("codec", default_codec.encode, default_codec.decode, activities)
+    instance_codec = codec.ActivityCodec(prefixes=[f"{BASE_URL}/"])
+    _bench(
+        "codec (base URL)",
+        instance_codec.encode,
+        instance_codec.decode,
+        activities,
+    )
+
+
+if __name__ == "__main__":
+    main()
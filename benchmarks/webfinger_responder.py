@@ -0,0 +1,57 @@
+"""Report how fast `WebFingerResponder` answers the WebFinger queries.
+
+Usage:
+    python benchmarks/webfinger_responder.py [actors] [count]
+
+The responder indexes `actors` local actors, then answers `count` queries for
+random handles (half of them unknown), with and without a `rel` filter.
+"""
+
+import random
+import sys
+import time
+
+from active_boxes.webfinger import WebFingerResponder
+
+
+def _bench(name: str, func, resources: list) -> None:
+    start = time.perf_counter()
+    for resource in resources:
+        func(resource)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<16}{elapsed / len(resources) * 1e6:>10.2f} us/query")
+
+
+def main() -> None:
+    actors = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    responder = WebFingerResponder("example.com")
+
+    start = time.perf_counter()
+    for i in range(actors):
+        responder.add_actor(
+            {
+                "type": "Person",
+                "id": f"https://example.com/users/user{i}",
+                "url": f"https://example.com/@user{i}",
+                "preferredUsername": f"user{i}",
+            }
+        )
+    elapsed = time.perf_counter() - start
+    print(f"indexed {actors} actors in {elapsed:.2f}s")
+
+    rng = random.Random(0)
+    resources = [
+        f"acct:user{rng.randrange(actors * 2)}@example.com"
+        for _ in range(count)
+    ]
+    _bench("respond", responder.respond, resources)
+    _bench(
+        "respond rel=self",
+        lambda r: responder.respond(r, rel=["self"]),
+        resources,
+    )
+
+
+if __name__ == "__main__":
+    main()
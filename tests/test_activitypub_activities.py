@@ -1,11 +1,14 @@
 """ActivityPub specific activity type tests."""
 
+import asyncio
 import logging
+from unittest import mock
 
 import pytest
 from active_boxes import activitypub as ap
 from active_boxes.errors import (
     ActivityGoneError,
+    BadActivityError,
     ActivityNotFoundError,
     ActivityUnavailableError,
     NotAnActivityError,
@@ -2811,3 +2814,224 @@ def test_featured_collection_to_dict():
 
     # Restore backend
     ap.use_backend(None)
+
+
+def _no_sync_fetch(iri, **kwargs):
+    raise AssertionError(f"blocking fetch of {iri}")
+
+
+async def test_recipients_async_does_not_block(backend):
+    """Test that the async object graph never uses the sync fetch."""
+    alice = backend.setup_actor("Alice", "alice")
+    bob = backend.setup_actor("Bob", "bob")
+    backend.FOLLOWERS[alice.id] = [bob.id]
+    note = {
+        "type": "Note",
+        "id": "https://lol.com/note/1",
+        "content": "Hello",
+        "attributedTo": alice.id,
+        "published": "2024-01-01T00:00:00Z",
+    }
+    backend.FETCH_MOCK[note["id"]] = note
+    create = ap.parse_activity(
+        {
+            "type": "Create",
+            "id": "https://lol.com/note/1/activity",
+            "actor": alice.id,
+            "to": [ap.AS_PUBLIC],
+            "cc": [alice.followers],
+            "object": note["id"],
+        },
+        offline=True,
+    )
+
+    with mock.patch.object(backend, "fetch_iri_sync", _no_sync_fetch):
+        assert (await create.get_actor()).id == alice.id
+        assert (await create.get_object()).id == note["id"]
+        assert await create.recipients_async() == [bob.inbox]
+
+        tombstone = await create.get_tombstone_async("2024-01-02T00:00:00Z")
+        assert tombstone.published == "2024-01-01T00:00:00Z"
+        assert tombstone.deleted == "2024-01-02T00:00:00Z"
+
+        follow = ap.parse_activity(
+            {
+                "type": "Follow",
+                "id": "https://lol.com/follow/1",
+                "actor": bob.id,
+                "object": alice.id,
+            },
+            offline=True,
+        )
+        assert await follow.recipients_async() == [alice.inbox]
+        undo = await follow.build_undo_async()
+        assert (await undo.get_actor()).id == bob.id
+        assert await undo.recipients_async() == [alice.inbox]
+
+
+async def test_get_object_async_validates_actor(backend):
+    """Test that an object fetched asynchronously still has its actor checked."""
+    alice = backend.setup_actor("Alice", "alice")
+    backend.FETCH_MOCK["https://lol.com/like/1"] = {
+        "type": "Like",
+        "id": "https://lol.com/like/1",
+        "actor": "https://lol.com/unknown",
+        "object": "https://lol.com/note/1",
+    }
+    undo = ap.parse_activity(
+        {
+            "type": "Undo",
+            "actor": alice.id,
+            "object": "https://lol.com/like/1",
+        },
+        offline=True,
+    )
+
+    with pytest.raises(BadActivityError):
+        await undo.get_object()
+
+
+def test_build_undo_sync(backend):
+    """Test that the sync wrappers still build the Undo activities."""
+    alice = backend.setup_actor("Alice", "alice")
+    bob = backend.setup_actor("Bob", "bob")
+    follow = ap.Follow(
+        id="https://lol.com/follow/1", actor=bob.id, object=alice.id
+    )
+
+    undo = follow.build_undo()
+
+    assert undo.get_actor_sync().id == bob.id
+    assert undo.get_object_sync().id == follow.id
+
+
+async def test_recipients_async_batches_storage_lookups(backend):
+    """Test that the recipients are looked up in the storage at once."""
+    alice = backend.setup_actor("Alice", "alice")
+    bob = backend.setup_actor("Bob", "bob")
+    carol = backend.setup_actor("Carol", "carol")
+    backend.FOLLOWERS[alice.id] = [bob.id, carol.id]
+    stored = {a.id: a.to_dict() for a in [alice, bob, carol]}
+    lookups = []
+    fetched = []
+
+    async def get_actors(actor_ids):
+        lookups.append(list(actor_ids))
+        return {i: stored[i] for i in actor_ids if i in stored}
+
+    fetch_iri = backend.fetch_iri
+
+    async def _fetch_iri(iri, **kwargs):
+        fetched.append(iri)
+        return await fetch_iri(iri, **kwargs)
+
+    backend.get_actors = get_actors
+    create = ap.parse_activity(
+        {
+            "type": "Create",
+            "id": "https://lol.com/note/1/activity",
+            "actor": alice.id,
+            "to": [ap.AS_PUBLIC],
+            "cc": [alice.followers],
+            "object": {
+                "type": "Note",
+                "id": "https://lol.com/note/1",
+                "attributedTo": alice.id,
+                "content": "Hello",
+            },
+        },
+        offline=True,
+    )
+
+    with mock.patch.object(backend, "fetch_iri", _fetch_iri):
+        recipients = await create.recipients_async()
+
+    assert recipients == [bob.inbox, carol.inbox]
+    assert lookups == [[alice.id], [alice.followers], [bob.id, carol.id]]
+    assert fetched == [alice.followers]
+
+
+async def test_get_actor_falls_back_to_get_actor(backend):
+    """Test that a sync storage without batch lookups is supported."""
+    alice = backend.setup_actor("Alice", "alice")
+    backend.get_actor = lambda actor_id: {"alice": alice.to_dict()}.get(
+        actor_id.rsplit("/", 1)[-1]
+    )
+    like = ap.parse_activity(
+        {"type": "Like", "actor": alice.id, "object": "https://lol.com/n/1"},
+        offline=True,
+    )
+
+    with mock.patch.object(backend, "fetch_iri", _no_sync_fetch):
+        assert (await like.get_actor()).id == alice.id
+        assert await ap.validate_activities([like]) == [None]
+
+
+def _create_with_embedded_actor(actor_id, embedded_actor_id):
+    return {
+        "type": "Create",
+        "id": "https://lol.com/note/1/activity",
+        "actor": actor_id,
+        "object": {
+            "type": "Note",
+            "id": "https://lol.com/note/1",
+            "actor": embedded_actor_id,
+            "attributedTo": actor_id,
+            "content": "Hello",
+        },
+    }
+
+
+async def test_parse_activity_async_validates_embedded_actors(backend):
+    """Test that the embedded object actor is checked like the sync parsing."""
+    alice = backend.setup_actor("Alice", "alice")
+    payload = _create_with_embedded_actor(alice.id, "https://lol.com/unknown")
+    backend.FETCH_MOCK["https://lol.com/create/1"] = payload
+
+    with pytest.raises(BadActivityError):
+        # The sync parsing can't run within the event loop
+        await asyncio.to_thread(ap.parse_activity, payload)
+    with pytest.raises(BadActivityError):
+        await ap.parse_activity_async(payload)
+    # Also when fetched as the object of another activity
+    announce = ap.parse_activity(
+        {
+            "type": "Announce",
+            "actor": alice.id,
+            "object": "https://lol.com/create/1",
+        },
+        offline=True,
+    )
+    with pytest.raises(BadActivityError):
+        await announce.get_object()
+
+    create = await ap.parse_activity_async(
+        _create_with_embedded_actor(alice.id, alice.id)
+    )
+    assert (await create.get_object()).id == "https://lol.com/note/1"
+
+
+async def test_recipients_async_uses_sync_recipients_override(backend):
+    """Test that subclasses overriding the sync hook are still supported."""
+    alice = backend.setup_actor("Alice", "alice")
+    bob = backend.setup_actor("Bob", "bob")
+    backend.FETCH_MOCK["https://lol.com/note/1"] = {
+        "type": "Note",
+        "id": "https://lol.com/note/1",
+        "attributedTo": alice.id,
+        "content": "Hello",
+    }
+
+    with mock.patch.dict(ap._ACTIVITY_CLS):
+
+        class _LegacyLike(ap.Like):
+            def _recipients(self):
+                # Written for the sync API
+                return [self.get_object_sync().get_actor_sync().id, bob.id]
+
+    with ap.offline_parsing():
+        like = _LegacyLike(actor=alice.id, object="https://lol.com/note/1")
+
+    assert await like.recipients_async() == [bob.inbox]
+    assert ap.Like._SYNC_RECIPIENTS_HOOK is False
+    assert _LegacyLike._SYNC_RECIPIENTS_HOOK is True
@@ -1,6 +1,8 @@
 """Core ActivityPub functionality tests."""
 
+import asyncio
 import logging
+from unittest import mock
 from datetime import datetime
 from datetime import timedelta
 from datetime import timezone
@@ -1132,6 +1134,80 @@ def test_base_activity_context_handling():
     ap.use_backend(None)
 
 
+def test_base_activity_context_is_interned():
+    """Activities share one immutable context, without touching the input."""
+    custom_ctx = [
+        "https://www.w3.org/ns/activitystreams",
+        {"custom": "http://example.com/ns#"},
+    ]
+    n1 = ap.Note(content="a", attributedTo="https://example.com/person/1")
+    n2 = ap.Note(content="b", attributedTo="https://example.com/person/1")
+    n3 = ap.Note(
+        content="c",
+        attributedTo="https://example.com/person/1",
+        **{"@context": custom_ctx},
+    )
+    n4 = ap.Note(
+        content="d",
+        attributedTo="https://example.com/person/1",
+        **{"@context": list(custom_ctx)},
+    )
+
+    assert n1._data["@context"] is n2._data["@context"]
+    assert n3._data["@context"] is n4._data["@context"]
+    assert n1._data["@context"][-1] == {
+        "Hashtag": "as:Hashtag",
+        "sensitive": "as:sensitive",
+        "toot": "http://joinmastodon.org/ns#",
+        "featured": "toot:featured",
+    }
+
+    # The caller's context is left untouched
+    assert custom_ctx == [
+        "https://www.w3.org/ns/activitystreams",
+        {"custom": "http://example.com/ns#"},
+    ]
+
+    # The shared context can't be modified in place...
+    with pytest.raises(TypeError):
+        n1._data["@context"].append("https://example.com/ctx")
+    with pytest.raises(TypeError):
+        n1._data["@context"][-1]["custom"] = "http://example.com/ns#"
+
+    # ...but to_dict() hands out a copy
+    data = n1.to_dict()
+    data["@context"][-1]["custom"] = "http://example.com/ns#"
+    assert "custom" not in n2.to_dict()["@context"][-1]
+    assert type(data["@context"]) is list
+
+    # The new activity gets its own copy of the modified context
+    n5 = ap.Note(**data)
+    assert n5._data["@context"] == data["@context"]
+    assert n5._data["@context"] is not n1._data["@context"]
+
+
+def test_base_activity_uses_slots():
+    """Activities keep their fields in __slots__ to stay small."""
+    note = ap.Note(content="a", attributedTo="https://example.com/person/1")
+    assert "_data" in ap.BaseActivity.__slots__
+    assert note.__dict__ == {}
+
+    # Attributes can still be set on the instances, and on the instances of
+    # the subclasses
+    note.foo = "bar"
+    assert note.__dict__ == {"foo": "bar"}
+    with mock.patch.dict(ap._ACTIVITY_CLS):
+
+        class CustomNote(ap.Note):
+            pass
+
+    custom = CustomNote(
+        content="a", attributedTo="https://example.com/person/1"
+    )
+    custom.foo = "bar"
+    assert custom.foo == "bar"
+
+
 def test_base_activity_object_validation_errors():
     """Test object validation error paths in BaseActivity."""
     back = InMemBackend()
@@ -1283,3 +1359,242 @@ def test_parse_activity_errors_additional():
 
     # Restore backend
     ap.use_backend(None)
+
+
+OFFLINE_ACTOR = {
+    "type": "Person",
+    "id": "https://example.com/person/1",
+    "name": "Test User",
+    "preferredUsername": "testuser",
+    "inbox": "https://example.com/person/1/inbox",
+    "outbox": "https://example.com/person/1/outbox",
+}
+
+
+def _offline_create(actor_id, note_id):
+    return {
+        "type": "Create",
+        "id": note_id + "/activity",
+        "actor": actor_id,
+        "object": {
+            "type": "Note",
+            "id": note_id,
+            "attributedTo": actor_id,
+            "content": "hello",
+        },
+    }
+
+
+def test_offline_parsing_does_no_io(backend):
+    """Activities parsed offline are only validated structurally."""
+    with (
+        mock.patch.object(
+            backend, "fetch_iri_sync", side_effect=AssertionError("no I/O")
+        ),
+        mock.patch.object(
+            backend, "fetch_iri", side_effect=AssertionError("no I/O")
+        ),
+    ):
+        with ap.offline_parsing():
+            create = ap.parse_activity(
+                _offline_create(
+                    "https://example.com/person/1", "https://example.com/n/1"
+                )
+            )
+            follow = ap.parse_activity(
+                {
+                    "type": "Follow",
+                    "actor": OFFLINE_ACTOR,
+                    "object": "https://example.com/person/2",
+                }
+            )
+        like = ap.parse_activity(
+            {
+                "type": "Like",
+                "actor": "https://example.com/person/1",
+                "object": "https://example.com/n/1",
+            },
+            offline=True,
+        )
+
+    assert create.actor == "https://example.com/person/1"
+    assert create.object["attributedTo"] == "https://example.com/person/1"
+    assert create.object["published"] == create.published
+    assert follow.actor == "https://example.com/person/1"
+    assert like.actor == "https://example.com/person/1"
+
+    # Structural errors are still raised
+    with pytest.raises(BadActivityError):
+        ap.parse_activity(
+            {"type": "Like", "actor": 1, "object": "https://example.com/n/1"},
+            offline=True,
+        )
+    with pytest.raises(UnexpectedActivityTypeError):
+        ap.parse_activity(
+            {
+                "type": "Create",
+                "actor": "https://example.com/person/1",
+                "object": {"type": "Person", "id": "https://example.com/p"},
+            },
+            offline=True,
+        )
+
+
+async def test_validate_activities(backend):
+    """Actors of offline activities are fetched once, concurrently."""
+    backend.FETCH_MOCK["https://example.com/person/1"] = OFFLINE_ACTOR
+    backend.FETCH_MOCK["https://example.com/note/1"] = {
+        "type": "Note",
+        "id": "https://example.com/note/1",
+    }
+
+    with ap.offline_parsing():
+        activities = [
+            ap.parse_activity(
+                _offline_create(
+                    "https://example.com/person/1", f"https://example.com/n/{i}"
+                )
+            )
+            for i in range(5)
+        ]
+        activities.append(
+            ap.parse_activity(
+                _offline_create(
+                    "https://example.com/note/1", "https://example.com/n/bad"
+                )
+            )
+        )
+
+    with mock.patch.object(
+        backend, "fetch_iri", wraps=backend.fetch_iri
+    ) as fetch_iri:
+        errors = await ap.validate_activities(
+            activities, return_exceptions=True
+        )
+
+    assert sorted(call.args[0] for call in fetch_iri.call_args_list) == [
+        "https://example.com/note/1",
+        "https://example.com/person/1",
+    ]
+    assert errors[:5] == [None] * 5
+    assert isinstance(errors[5], UnexpectedActivityTypeError)
+
+    await activities[0].validate()
+    with pytest.raises(UnexpectedActivityTypeError):
+        await activities[5].validate()
+    with pytest.raises(UnexpectedActivityTypeError):
+        await ap.validate_activities(activities)
+
+
+def test_validate_sync(backend):
+    backend.FETCH_MOCK["https://example.com/person/1"] = OFFLINE_ACTOR
+    like = ap.parse_activity(
+        {
+            "type": "Like",
+            "actor": "https://example.com/person/404",
+            "object": "https://example.com/n/1",
+        },
+        offline=True,
+    )
+    with pytest.raises(BadActivityError, match="failed to validate actor"):
+        like.validate_sync()
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"type": "Like", "actor": OFFLINE_ACTOR["id"], "object": 42},
+        {
+            "type": "Like",
+            "actor": OFFLINE_ACTOR["id"],
+            "object": {"type": "Person", "id": "https://example.com/p/2"},
+        },
+        {"type": "Add", "actor": OFFLINE_ACTOR["id"], "object": "x"},
+        {"type": "Like", "actor": ["a", "b"], "object": "x"},
+    ],
+)
+def test_malformed_payload_rejected_before_fetching(backend, payload):
+    backend.FETCH_MOCK[OFFLINE_ACTOR["id"]] = OFFLINE_ACTOR
+    with mock.patch.object(
+        backend, "fetch_iri_sync", wraps=backend.fetch_iri_sync
+    ) as fetch:
+        with pytest.raises(BadActivityError):
+            ap.parse_activity(payload)
+
+    fetch.assert_not_called()
+
+
+def test_errors_do_not_embed_the_payload(backend):
+    spam = "x" * 100_000
+    payloads = [
+        {"type": "Like", "actor": {"spam": spam}, "object": "x"},
+        {"type": "Like", "actor": "a", "object": [spam]},
+        {"type": "Note", "attributedTo": "a", "content": spam},
+        {"type": "Tombstone", "content": spam},
+    ]
+    for payload in payloads:
+        with pytest.raises(BadActivityError) as exc_info:
+            ap.parse_activity(payload, expected=ap.ActivityType.LIKE)
+        assert len(str(exc_info.value)) < 200
+
+
+def test_activity_classes_are_compiled():
+    assert ap.Like._validate_payload is not ap.Follow._validate_payload
+    assert ap.Like._build is not ap.Follow._build
+    assert ap._has_type(
+        ["Foo", {"unhashable": 1}, "Like"], ap._type_values("Like")
+    )
+    assert not ap._has_type([{"unhashable": 1}], ap.ACTOR_TYPES)
+
+
+async def test_using_backend_is_context_local(backend):
+    tenant1 = InMemBackend()
+    tenant2 = InMemBackend()
+    seen = {}
+
+    async def handle(name, tenant):
+        with ap.using_backend(tenant):
+            await asyncio.sleep(0)
+            seen[name] = ap.get_backend()
+
+    await asyncio.gather(handle("t1", tenant1), handle("t2", tenant2))
+
+    assert seen == {"t1": tenant1, "t2": tenant2}
+    # Falls back to the global backend outside of the context managers
+    assert ap.get_backend() is backend
+
+
+def test_using_backend_without_global_backend():
+    ap.use_backend(None)
+    tenant = InMemBackend()
+    tenant.FETCH_MOCK[OFFLINE_ACTOR["id"]] = OFFLINE_ACTOR
+
+    with ap.using_backend(tenant):
+        like = ap.parse_activity(
+            {
+                "type": "Like",
+                "actor": OFFLINE_ACTOR["id"],
+                "object": "https://example.com/n/1",
+            }
+        )
+        assert like.get_actor_sync().id == OFFLINE_ACTOR["id"]
+
+    with pytest.raises(Error, match="backend must be initialized"):
+        ap.get_backend()
+
+
+async def test_using_backend_parse_activity_async():
+    # The pattern documented in the using_backend() docstring
+    ap.use_backend(None)
+    tenant = InMemBackend()
+    tenant.FETCH_MOCK[OFFLINE_ACTOR["id"]] = OFFLINE_ACTOR
+
+    with ap.using_backend(tenant):
+        like = await ap.parse_activity_async(
+            {
+                "type": "Like",
+                "actor": OFFLINE_ACTOR["id"],
+                "object": "https://example.com/n/1",
+            }
+        )
+        assert (await like.get_actor()).id == OFFLINE_ACTOR["id"]
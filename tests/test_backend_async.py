@@ -148,3 +148,55 @@ class TestBackendFetchIri:
 
         result = back.fetch_iri_sync("https://example.com")
         assert result == {"id": "https://example.com"}
+
+
+class TestBackendIsolation:
+    """Test the per-backend HTTP clients and caches."""
+
+    @pytest.mark.asyncio
+    async def test_shared_http_client_by_default(self):
+        back = _create_test_backend()
+        shared = object()
+        with mock.patch(
+            "active_boxes.backend.get_http_client",
+            mock.AsyncMock(return_value=shared),
+        ):
+            assert await back.get_http_client() is shared
+            assert await _create_test_backend().get_http_client() is shared
+
+    @pytest.mark.asyncio
+    async def test_dedicated_http_client(self):
+        back = _create_test_backend()
+        client = mock.AsyncMock()
+        client.get_json.return_value = {"id": "https://example.com/1"}
+        back.use_http_client(client)
+
+        with mock.patch.object(back, "check_url", mock.AsyncMock()):
+            result = await back.fetch_json("https://example.com/1")
+
+        assert result == {"id": "https://example.com/1"}
+        client.get_json.assert_awaited_once()
+        await back.close()
+        client.close.assert_awaited_once()
+
+    def test_caches_are_per_backend(self):
+        back1 = _create_test_backend()
+        back2 = _create_test_backend()
+
+        back1.cache("actors").set("a", 1)
+
+        assert back1.cache("actors").get("a") == 1
+        assert back2.cache("actors").get("a") is None
+        back1.clear_caches()
+        assert "a" not in back1.cache("actors")
+
+    def test_cache_lru_eviction(self):
+        cache = _create_test_backend().cache("lru", maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert "b" not in cache
+        assert cache.get("a") == 1
+        assert len(cache) == 2
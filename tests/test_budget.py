@@ -0,0 +1,162 @@
+"""Tests for the fetch budget."""
+
+import asyncio
+import json
+import logging
+from unittest import mock
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import active_boxes.activitypub as ap
+from active_boxes import http_client
+from active_boxes.backend import Backend
+from active_boxes.budget import FetchBudget
+from active_boxes.budget import SlowFetchLog
+from active_boxes.budget import current_fetch_budget
+from active_boxes.budget import fetch_budget
+from active_boxes.errors import FetchBudgetExceededError
+
+
+class _Backend(Backend):
+    def base_url(self) -> str:
+        return "https://example.com"
+
+    def activity_url(self, obj_id: str) -> str:
+        return f"https://example.com/activity/{obj_id}"
+
+    def note_url(self, obj_id: str) -> str:
+        return f"https://example.com/note/{obj_id}"
+
+
+@pytest.fixture
+def back():
+    back = _Backend()
+    client = mock.AsyncMock()
+    client.timeout = 15
+    client.get_json.side_effect = lambda url, **kwargs: {"id": url}
+    back.use_http_client(client)
+    with mock.patch.object(back, "check_url", mock.AsyncMock()):
+        yield back
+
+
+async def test_fetch_iri_without_budget(back):
+    assert current_fetch_budget() is None
+
+    await back.fetch_iri("https://example.com/1")
+
+    assert "budget" not in back._http_client.get_json.call_args.kwargs
+
+
+async def test_max_fetches(back):
+    with fetch_budget(max_fetches=2) as budget:
+        await back.fetch_iri("https://example.com/1")
+        await back.fetch_json("https://other.example/2")
+        with pytest.raises(FetchBudgetExceededError):
+            await back.fetch_iri("https://example.com/3")
+
+    assert back._http_client.get_json.await_count == 2
+    record = budget.to_dict()
+    assert record["fetches"] == 2
+    assert record["hosts"]["example.com"]["fetches"] == 1
+    assert record["hosts"]["other.example"]["fetches"] == 1
+
+
+async def test_deadline_caps_the_timeout(back):
+    with fetch_budget(timeout=5):
+        await back.fetch_iri("https://example.com/1")
+
+    assert back._http_client.get_json.call_args.kwargs["timeout"] <= 5
+
+    with fetch_budget(timeout=0):
+        with pytest.raises(FetchBudgetExceededError):
+            await back.fetch_iri("https://example.com/1")
+
+
+async def test_budget_is_shared_with_tasks_and_context_local(back):
+    async def _work(count):
+        with fetch_budget() as budget:
+            await asyncio.gather(
+                *(
+                    back.fetch_iri(f"https://example.com/{i}")
+                    for i in range(count)
+                )
+            )
+        return budget.fetches
+
+    assert await asyncio.gather(_work(2), _work(3)) == [2, 3]
+
+
+async def _serve(body: bytes):
+    async def handler(request):
+        return web.Response(body=body, content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+async def test_parse_activity_within_budget(back):
+    # The pattern documented in the module docstring
+    actor = {
+        "type": "Person",
+        "id": "https://example.com/alice",
+        "inbox": "https://example.com/alice/inbox",
+        "outbox": "https://example.com/alice/outbox",
+        "preferredUsername": "alice",
+    }
+    back._http_client.get_json.side_effect = lambda url, **kwargs: actor
+    ap.use_backend(back)
+    try:
+        with fetch_budget(max_fetches=20) as budget:
+            activity = await ap.parse_activity_async(
+                {
+                    "type": "Like",
+                    "id": "https://example.com/like/1",
+                    "actor": actor["id"],
+                    "object": "https://other.example/note/1",
+                }
+            )
+    finally:
+        ap.use_backend(None)
+
+    assert activity.id == "https://example.com/like/1"
+    assert budget.to_dict()["hosts"]["example.com"]["fetches"] == 1
+
+
+async def test_max_bytes():
+    body = json.dumps({"content": "x" * 10_000}).encode()
+    server = await _serve(body)
+    client = http_client.AsyncHTTPClient()
+    url = str(server.make_url("/"))
+    try:
+        with mock.patch.object(http_client, "check_url"):
+            budget = FetchBudget()
+            assert await client.get_json(url, budget=budget) == json.loads(body)
+            assert budget.bytes == len(body)
+
+            with pytest.raises(FetchBudgetExceededError):
+                await client.get_json(url, budget=FetchBudget(max_bytes=1000))
+    finally:
+        await client.close()
+        await server.close()
+
+
+def test_slow_fetch_log(caplog):
+    slow_log = SlowFetchLog(quantile=0.9, window=10, min_samples=10)
+    budgets = []
+    for i in range(10):
+        budget = FetchBudget()
+        budget.finished = budget.started + i
+        budgets.append(budget)
+
+    with caplog.at_level(logging.WARNING, logger="active_boxes.budget"):
+        logged = [
+            slow_log.observe(b, f"activity {i}") for i, b in enumerate(budgets)
+        ]
+
+    assert logged == [False] * 9 + [True]
+    assert "activity 9" in caplog.text
@@ -0,0 +1,161 @@
+"""Tests for the bulk NDJSON parsing."""
+
+import json
+import pickle
+
+import pytest
+from active_boxes import activitypub as ap
+from active_boxes.bulk import ParseFailure
+from active_boxes.bulk import parse_ndjson
+from active_boxes.errors import BadActivityError
+from active_boxes.errors import UnexpectedActivityTypeError
+
+ACTOR = "https://example.com/users/alice"
+
+
+def _create(i):
+    return {
+        "type": "Create",
+        "id": f"https://example.com/notes/{i}/activity",
+        "actor": ACTOR,
+        "published": "2024-01-01T00:00:00Z",
+        "to": [ap.AS_PUBLIC],
+        "object": {
+            "type": "Note",
+            "id": f"https://example.com/notes/{i}",
+            "attributedTo": ACTOR,
+            "content": f"Note {i}",
+            "published": "2024-01-01T00:00:00Z",
+        },
+    }
+
+
+def _lines(count):
+    return [json.dumps(_create(i)) + "\n" for i in range(count)]
+
+
+@pytest.fixture
+def no_backend(monkeypatch):
+    ap.use_backend(None)
+    # Test-local subclasses (that can't be pickled) may still be registered
+    for cls in [ap.Create, ap.Note, ap.Like]:
+        monkeypatch.setitem(ap._ACTIVITY_CLS, cls.ACTIVITY_TYPE, cls)
+    yield
+
+
+def test_parse_ndjson_in_process(no_backend):
+    activities = list(parse_ndjson(_lines(25), workers=0, chunk_size=4))
+
+    assert [a.id for a in activities] == [
+        f"https://example.com/notes/{i}/activity" for i in range(25)
+    ]
+    assert all(isinstance(a, ap.Create) for a in activities)
+    assert activities[3].object["content"] == "Note 3"
+
+
+def test_parse_ndjson_error_sink(no_backend):
+    lines = _lines(3)
+    lines.insert(1, "{not json\n")
+    lines.insert(3, "\n")
+    lines.append(json.dumps({"type": "Like", "object": "x"}))
+    failures = []
+
+    activities = list(
+        parse_ndjson(lines, workers=0, chunk_size=2, on_error=failures.append)
+    )
+
+    assert len(activities) == 3
+    assert [f.lineno for f in failures] == [2, 6]
+    assert failures[0].line == "{not json"
+    assert isinstance(failures[0].error, json.JSONDecodeError)
+    assert isinstance(failures[1].error, BadActivityError)
+
+
+def test_parse_ndjson_expected(no_backend):
+    lines = _lines(2) + [
+        json.dumps(
+            {
+                "type": "Note",
+                "id": "https://example.com/notes/x",
+                "attributedTo": ACTOR,
+            }
+        )
+    ]
+    failures = []
+
+    activities = list(
+        parse_ndjson(
+            lines,
+            expected=ap.ActivityType.NOTE,
+            workers=0,
+            on_error=failures.append,
+        )
+    )
+
+    assert [a.id for a in activities] == ["https://example.com/notes/x"]
+    assert len(failures) == 2
+    assert isinstance(failures[0].error, UnexpectedActivityTypeError)
+
+
+def test_parse_ndjson_from_file(tmp_path, no_backend):
+    path = tmp_path / "outbox.ndjson"
+    path.write_text("".join(_lines(10)))
+
+    activities = list(parse_ndjson(path, workers=0))
+
+    assert len(activities) == 10
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_parse_ndjson_process_pool(ordered, no_backend):
+    lines = _lines(200)
+    lines[42] = "[]\n"
+    failures = []
+
+    activities = list(
+        parse_ndjson(
+            lines,
+            workers=2,
+            chunk_size=16,
+            ordered=ordered,
+            on_error=failures.append,
+        )
+    )
+
+    ids = [a.id for a in activities]
+    expected = [
+        f"https://example.com/notes/{i}/activity" for i in range(200) if i != 42
+    ]
+    if ordered:
+        assert ids == expected
+    else:
+        assert sorted(ids) == sorted(expected)
+    assert failures == [
+        ParseFailure(43, "[]", failures[0].error),
+    ]
+    # The contexts are shared again once back in this process
+    assert len({id(a._data["@context"]) for a in activities}) == 1
+    first = min(activities, key=lambda a: int(a.id.split("/")[-2]))
+    assert (
+        first.to_dict() == ap.parse_activity(_create(0), offline=True).to_dict()
+    )
+
+
+def test_activity_pickle_roundtrip(no_backend):
+    create = ap.parse_activity(_create(1), offline=True)
+
+    restored = pickle.loads(pickle.dumps(create))
+
+    assert type(restored) is ap.Create
+    assert restored.to_dict() == create.to_dict()
+    assert restored.object["id"] == "https://example.com/notes/1"
+
+
+def test_server_error_pickle_roundtrip():
+    error = BadActivityError("invalid", payload={"id": "x"})
+
+    restored = pickle.loads(pickle.dumps(error))
+
+    assert type(restored) is BadActivityError
+    assert restored.message == "invalid"
+    assert restored.payload == {"id": "x"}
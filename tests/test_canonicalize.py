@@ -0,0 +1,416 @@
+"""Differential tests of the fast-path canonicalization against pyld."""
+
+import copy
+import json
+import random
+
+import pytest
+from pyld import jsonld
+
+from active_boxes import canonicalize
+from active_boxes.activitypub import DEFAULT_CTX
+from active_boxes import linked_data_sig
+
+AS = "https://www.w3.org/ns/activitystreams"
+SEC = "https://w3id.org/security/v1"
+IDENTITY = "https://w3id.org/identity/v1"
+
+MASTODON_CTX = {
+    "manuallyApprovesFollowers": "as:manuallyApprovesFollowers",
+    "toot": "http://joinmastodon.org/ns#",
+    "featured": {"@id": "toot:featured", "@type": "@id"},
+    "featuredTags": {"@id": "toot:featuredTags", "@type": "@id"},
+    "alsoKnownAs": {"@id": "as:alsoKnownAs", "@type": "@id"},
+    "movedTo": {"@id": "as:movedTo", "@type": "@id"},
+    "schema": "http://schema.org#",
+    "PropertyValue": "schema:PropertyValue",
+    "value": "schema:value",
+    "discoverable": "toot:discoverable",
+    "Device": "toot:Device",
+    "Ed25519Signature": "toot:Ed25519Signature",
+    "Ed25519Key": "toot:Ed25519Key",
+    "Curve25519Key": "toot:Curve25519Key",
+    "EncryptedMessage": "toot:EncryptedMessage",
+    "publicKeyBase64": "toot:publicKeyBase64",
+    "deviceId": "toot:deviceId",
+    "claim": {"@type": "@id", "@id": "toot:claim"},
+    "fingerprintKey": {"@type": "@id", "@id": "toot:fingerprintKey"},
+    "identityKey": {"@type": "@id", "@id": "toot:identityKey"},
+    "devices": {"@type": "@id", "@id": "toot:devices"},
+    "messageFranking": "toot:messageFranking",
+    "messageType": "toot:messageType",
+    "cipherText": "toot:cipherText",
+    "suspended": "toot:suspended",
+    "focalPoint": {"@container": "@list", "@id": "toot:focalPoint"},
+    "ostatus": "http://ostatus.org#",
+    "atomUri": "ostatus:atomUri",
+    "inReplyToAtomUri": "ostatus:inReplyToAtomUri",
+    "conversation": "ostatus:conversation",
+    "sensitive": "as:sensitive",
+    "Hashtag": "as:Hashtag",
+    "Emoji": "toot:Emoji",
+    "blurhash": "toot:blurhash",
+    "votersCount": "toot:votersCount",
+}
+
+NOTE = {
+    "@context": [AS, SEC, MASTODON_CTX],
+    "id": "https://mastodon.example/users/alice/statuses/1",
+    "type": "Note",
+    "summary": None,
+    "inReplyTo": None,
+    "published": "2024-01-02T03:04:05Z",
+    "url": "https://mastodon.example/@alice/1",
+    "attributedTo": "https://mastodon.example/users/alice",
+    "to": ["https://www.w3.org/ns/activitystreams#Public"],
+    "cc": [
+        "https://mastodon.example/users/alice/followers",
+        "https://other.example/users/bob",
+    ],
+    "sensitive": False,
+    "atomUri": "https://mastodon.example/users/alice/statuses/1",
+    "inReplyToAtomUri": None,
+    "conversation": "tag:mastodon.example,2024-01-02:objectId=1:objectType=Conversation",
+    "content": '<p>Hello <a href="https://other.example/@bob">@bob</a> \\o/\t"quoted"\r\n#fediverse</p>',
+    "contentMap": {"en": "<p>Hello</p>", "fr-CA": "<p>Bonjour</p>"},
+    "attachment": [
+        {
+            "type": "Document",
+            "mediaType": "image/png",
+            "url": "https://mastodon.example/media/1.png",
+            "name": "a cat",
+            "blurhash": "UFHx",
+            "width": 640,
+            "height": 480,
+        }
+    ],
+    "tag": [
+        {
+            "type": "Mention",
+            "href": "https://other.example/users/bob",
+            "name": "@bob@other.example",
+        },
+        {
+            "type": "Hashtag",
+            "href": "https://mastodon.example/tags/fediverse",
+            "name": "#fediverse",
+        },
+        {
+            "id": "https://mastodon.example/emojis/1",
+            "type": "Emoji",
+            "name": ":blobcat:",
+            "updated": "2024-01-01T00:00:00Z",
+            "icon": {
+                "type": "Image",
+                "mediaType": "image/png",
+                "url": "https://mastodon.example/emojis/1.png",
+            },
+        },
+    ],
+    "replies": {
+        "id": "https://mastodon.example/users/alice/statuses/1/replies",
+        "type": "Collection",
+        "first": {
+            "type": "CollectionPage",
+            "next": "https://mastodon.example/users/alice/statuses/1/replies?page=true",
+            "partOf": "https://mastodon.example/users/alice/statuses/1/replies",
+            "items": [],
+        },
+    },
+}
+
+CREATE = {
+    "@context": [AS, SEC, MASTODON_CTX],
+    "id": "https://mastodon.example/users/alice/statuses/1/activity",
+    "type": "Create",
+    "actor": "https://mastodon.example/users/alice",
+    "published": "2024-01-02T03:04:05Z",
+    "to": ["https://www.w3.org/ns/activitystreams#Public"],
+    "cc": ["https://mastodon.example/users/alice/followers"],
+    "object": {k: v for k, v in NOTE.items() if k != "@context"},
+}
+
+PERSON = {
+    "@context": [AS, SEC, MASTODON_CTX],
+    "id": "https://mastodon.example/users/alice",
+    "type": "Person",
+    "following": "https://mastodon.example/users/alice/following",
+    "followers": "https://mastodon.example/users/alice/followers",
+    "inbox": "https://mastodon.example/users/alice/inbox",
+    "outbox": "https://mastodon.example/users/alice/outbox",
+    "featured": "https://mastodon.example/users/alice/collections/featured",
+    "preferredUsername": "alice",
+    "name": "Alice ✨",
+    "summary": "<p>Hi!</p>",
+    "url": "https://mastodon.example/@alice",
+    "manuallyApprovesFollowers": False,
+    "discoverable": True,
+    "published": "2020-01-01T00:00:00Z",
+    "devices": "https://mastodon.example/users/alice/collections/devices",
+    "alsoKnownAs": ["https://old.example/users/alice"],
+    "publicKey": {
+        "id": "https://mastodon.example/users/alice#main-key",
+        "owner": "https://mastodon.example/users/alice",
+        "publicKeyPem": "-----BEGIN PUBLIC KEY-----\nMIIB\n-----END PUBLIC KEY-----\n",
+    },
+    "tag": [],
+    "attachment": [
+        {
+            "type": "PropertyValue",
+            "name": "Website",
+            "value": '<a href="https://alice.example">alice.example</a>',
+        },
+        {"type": "PropertyValue", "name": "Pronouns", "value": "they/them"},
+    ],
+    "endpoints": {"sharedInbox": "https://mastodon.example/inbox"},
+    "icon": {
+        "type": "Image",
+        "mediaType": "image/jpeg",
+        "url": "https://mastodon.example/avatar.jpg",
+    },
+}
+
+SIGNATURE_OPTIONS = {
+    "@context": IDENTITY,
+    "creator": "https://mastodon.example/users/alice#main-key",
+    "created": "2024-01-02T03:04:05Z",
+    "nonce": "4b3c0ab1a2",
+}
+
+SUPPORTED = [
+    {
+        "@context": DEFAULT_CTX,
+        "id": "https://microblog.example/outbox/1/activity",
+        "type": "Create",
+        "actor": "https://microblog.example",
+        "object": {
+            "id": "https://microblog.example/outbox/1",
+            "type": "Note",
+            "content": "Hello #world",
+            "sensitive": False,
+            "tag": [{"type": "Hashtag", "name": "#world"}],
+        },
+    },
+    NOTE,
+    CREATE,
+    PERSON,
+    SIGNATURE_OPTIONS,
+    {"@context": AS},
+    {"@context": AS, "type": "Note", "content": "no id"},
+    {
+        "@context": "http://www.w3.org/ns/activitystreams",
+        "type": "Follow",
+        "id": "https://a.example/follow/1",
+        "actor": "https://a.example/u/a",
+        "object": "https://b.example/u/b",
+    },
+    {
+        "@context": AS,
+        "type": "Undo",
+        "id": "https://a.example/undo/1",
+        "actor": "https://a.example/u/a",
+        "object": {
+            "type": "Follow",
+            "actor": "https://a.example/u/a",
+            "object": "https://b.example/u/b",
+        },
+    },
+    {
+        "@context": [AS, {"toot": "http://joinmastodon.org/ns#"}],
+        "type": "Note",
+        "toot:indexable": True,
+        "https://example.com/ns#score": 42,
+        "as:name": "compact key",
+        "to": "as:Public",
+    },
+    {
+        "@context": AS,
+        "type": ["Note", "https://example.com/ns#Extra"],
+        "name": ["b", "a", "a"],
+        "content": "same",
+        "unknownProperty": {"type": "Image", "url": "https://a.example/i"},
+        "startIndex": 3,
+        "totalItems": True,
+    },
+    {
+        "@context": AS,
+        "id": "https://a.example/n/1",
+        "type": "Note",
+        "inReplyTo": {"id": "https://a.example/n/0", "type": "Note"},
+        "context": {"id": "https://a.example/n/1", "name": "merged"},
+        "nameMap": {"@none": "none", "EN-us": ["x", None]},
+    },
+    {
+        "@context": [AS, SEC],
+        "type": "Person",
+        "id": "https://a.example/u/a",
+        "publicKey": [
+            {
+                "id": "https://a.example/u/a#main-key",
+                "owner": "https://a.example/u/a",
+                "publicKeyPem": "pem",
+                "expires": "2030-01-01T00:00:00Z",
+            }
+        ],
+    },
+    {
+        "@context": IDENTITY,
+        "creator": "https://a.example/k",
+        "unknown": {"a": 1},
+    },
+]
+
+FALLBACK = [
+    # @list container
+    {
+        "@context": AS,
+        "type": "OrderedCollection",
+        "orderedItems": ["https://a.example/1", "https://a.example/2"],
+    },
+    {
+        "@context": [AS, MASTODON_CTX],
+        "type": "Image",
+        "focalPoint": [0.5, -0.25],
+    },
+    # floats
+    {"@context": AS, "type": "Place", "latitude": 1.5},
+    # unknown type expanding to a blank node
+    {"@context": AS, "type": "Hashtag", "name": "#a"},
+    # scoped and unknown contexts
+    {"@context": [AS, {"@vocab": "https://example.com/ns#"}], "type": "Note"},
+    {"@context": "https://example.com/ctx", "type": "Note"},
+    # value objects and @graph
+    {"@context": AS, "type": "Note", "content": {"@value": "x"}},
+    {"@context": AS, "@graph": [{"type": "Note"}]},
+    # blank nodes that need the n-degree hashing
+    {
+        "@context": AS,
+        "type": "Note",
+        "tag": [
+            {"type": "Mention", "name": "a"},
+            {"type": "Mention", "name": "a"},
+        ],
+    },
+    # relative IRIs
+    {"@context": AS, "id": "relative", "type": "Note"},
+    # not a JSON-LD document
+    {"type": "Note"},
+]
+
+
+def _pyld_normalize(doc):
+    return jsonld.normalize(
+        copy.deepcopy(doc),
+        {
+            "algorithm": "URDNA2015",
+            "format": "application/nquads",
+            "documentLoader": linked_data_sig._caching_document_loader,
+        },
+    )
+
+
+@pytest.mark.parametrize("doc", SUPPORTED)
+def test_fast_path_matches_pyld(doc):
+    normalized = canonicalize.normalize(doc)
+    assert normalized is not None
+    assert normalized == _pyld_normalize(doc)
+
+
+@pytest.mark.parametrize("doc", FALLBACK)
+def test_fast_path_falls_back(doc):
+    assert canonicalize.normalize(doc) is None
+
+
+# Properties of the random documents, with the kind of values they hold
+_LITERAL_KEYS = ["name", "content", "summary", "value", "nonStandard"]
+_TYPED_KEYS = ["published", "width", "sensitive", "toot:custom"]
+_IRI_KEYS = ["to", "actor", "href", "featured", "owner", "url"]
+_NODE_KEYS = ["object", "attachment", "publicKey", "tag", "unknownNested"]
+
+
+def _random_literal(rnd):
+    return rnd.choice(
+        [
+            "",
+            "x",
+            'q"uote',
+            "back\\slash",
+            "t\tn\nr\r",
+            "é✨",
+            "2024-01-01T00:00:00Z",
+            True,
+            False,
+            0,
+            -3,
+            10**6,
+            None,
+        ]
+    )
+
+
+def _random_iri(rnd):
+    return rnd.choice(
+        [f"https://r.example/{rnd.randrange(5)}", "as:Public", None]
+    )
+
+
+def _random_values(rnd, make):
+    if rnd.random() < 0.3:
+        return [make() for _ in range(rnd.randrange(4))]
+    return make()
+
+
+def _random_node(rnd, depth, types):
+    node = {}
+    if rnd.random() < 0.5:
+        node["id"] = f"https://r.example/node/{rnd.randrange(6)}"
+    if rnd.random() < 0.8:
+        node["type"] = rnd.choice(types)
+    for _ in range(rnd.randrange(1, 6)):
+        kind = rnd.randrange(4 if depth < 3 else 3)
+        if kind == 0:
+            key = rnd.choice(_LITERAL_KEYS + _TYPED_KEYS)
+            node[key] = _random_values(rnd, lambda: _random_literal(rnd))
+        elif kind == 1:
+            key = rnd.choice(_IRI_KEYS)
+            node[key] = _random_values(rnd, lambda: _random_iri(rnd))
+        elif kind == 2:
+            lang = rnd.choice(["en", "De", "pt-BR", "@none"])
+            node[rnd.choice(["contentMap", "nameMap"])] = {lang: "map"}
+        else:
+            key = rnd.choice(_NODE_KEYS + _IRI_KEYS)
+            node[key] = _random_values(
+                rnd, lambda: _random_node(rnd, depth + 1, types)
+            )
+    return node
+
+
+def test_fast_path_matches_pyld_on_random_documents():
+    rnd = random.Random(1234)
+    handled = 0
+    types = ["Note", "Person", "Create", "Image", "Mention", "Collection"]
+    for _ in range(300):
+        if rnd.random() < 0.5:
+            doc = _random_node(rnd, 0, types + ["PropertyValue", "Emoji"])
+            doc["@context"] = [AS, SEC, MASTODON_CTX]
+        else:
+            doc = _random_node(rnd, 0, types)
+            doc["@context"] = rnd.choice([AS, [AS, SEC]])
+        normalized = canonicalize.normalize(doc)
+        if normalized is None:
+            continue
+        handled += 1
+        assert normalized == _pyld_normalize(doc), json.dumps(doc, indent=2)
+
+    # Most of the documents should not need the fallback
+    assert handled > 250
+
+
+def test_linked_data_sig_uses_fast_path(monkeypatch):
+    expected = _pyld_normalize(NOTE)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("pyld should not be called")
+
+    monkeypatch.setattr(jsonld, "normalize", fail)
+    assert linked_data_sig._normalize_uncached(NOTE) == expected
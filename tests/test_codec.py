@@ -0,0 +1,148 @@
+"""Tests for the compact storage codec."""
+
+import json
+
+import pytest
+
+from active_boxes import activitypub as ap
+from active_boxes import codec
+from active_boxes.codec import ActivityCodec
+
+
+@pytest.fixture(params=["msgpack", "python"])
+def implementation(request, monkeypatch):
+    """Runs the test with the `msgpack` package, and in pure-Python."""
+    if request.param == "msgpack":
+        pytest.importorskip("msgpack")
+    else:
+        monkeypatch.setattr(codec, "msgpack", None)
+    return request.param
+
+
+def _create():
+    with ap.offline_parsing():
+        note = ap.Note(
+            id="https://myapp.example/notes/1",
+            attributedTo="https://myapp.example/users/alice",
+            content="<p>Hello #world ✨</p>",
+            to=[ap.AS_PUBLIC],
+            cc=["https://myapp.example/users/alice/followers"],
+            published="2024-01-01T00:00:00Z",
+            tag=[
+                {
+                    "type": "Hashtag",
+                    "href": "https://myapp.example/tags/world",
+                    "name": "#world",
+                }
+            ],
+        )
+        create = note.build_create()
+    create.set_id("https://myapp.example/activities/1", "1")
+    return create
+
+
+def _assert_roundtrip(data, activity_codec=None):
+    activity_codec = activity_codec or ActivityCodec()
+    decoded = activity_codec.decode(activity_codec.encode(data))
+    # Same values, types and key order
+    assert json.dumps(decoded) == json.dumps(data)
+    assert decoded == data
+    return decoded
+
+
+def test_roundtrip_activity(backend, implementation):
+    create = _create()
+    encoded = codec.encode_activity(create)
+
+    assert codec.decode_activity(encoded) == create.to_dict()
+    assert len(encoded) < len(create.to_json_bytes()) / 2
+    _assert_roundtrip(create.to_dict())
+    _assert_roundtrip(ap.Person(**_person()).to_dict())
+
+
+def _person():
+    return {
+        "@context": ap.DEFAULT_CTX,
+        "id": "https://myapp.example/users/alice",
+        "type": "Person",
+        "preferredUsername": "alice",
+        "inbox": "https://myapp.example/users/alice/inbox",
+        "manuallyApprovesFollowers": False,
+    }
+
+
+def test_roundtrip_values(implementation):
+    _assert_roundtrip(
+        {
+            "type": "Note",
+            "unknownKey": "plain value",
+            "3": "a key that looks like a table index",
+            "ints": [0, 1, 127, 128, 255, 256, 65536, 2**32, 2**63 - 1],
+            "negative": [-1, -32, -33, -129, -32769, -(2**31) - 1, -(2**63)],
+            "floats": [0.0, 1.0, -2.5, 1e300],
+            "bools": [True, False, None, 1, 0],
+            "strings": ["", "x" * 31, "x" * 32, "é" * 200, "x" * 70_000],
+            "iris": [
+                "https://",
+                "http://example.com",
+                "https://www.w3.org/ns/activitystreams#Hashtag",
+                "as:Public",
+            ],
+            "long": list(range(20)) + [{"k": i} for i in range(70_000)],
+            "nested": {"a": {"b": {"c": [[], {}]}}},
+        }
+    )
+
+
+def test_context_variants_roundtrip(implementation):
+    ctx = list(ap.DEFAULT_CTX)
+    # Same context with another key order, or with True instead of 1
+    reordered = dict(reversed(list(ctx[2].items())))
+    _assert_roundtrip({"@context": [ctx[0], ctx[1], reordered], "id": "a"})
+    _assert_roundtrip({"@context": ap.CTX_AS, "id": "a"})
+    _assert_roundtrip({"@context": [1, True], "id": "a"})
+
+
+def test_custom_prefixes(backend, implementation):
+    activity = _create().to_dict()
+    instance_codec = ActivityCodec(prefixes=["https://myapp.example/"])
+
+    decoded = _assert_roundtrip(activity, instance_codec)
+    assert decoded == activity
+    assert len(instance_codec.encode(activity)) < len(
+        ActivityCodec().encode(activity)
+    )
+
+
+def test_decode_invalid_data(backend, implementation):
+    encoded = codec.encode_activity(_create())
+
+    for data in [b"", b"\x02" + encoded[1:], encoded[:-3], encoded + b"\x00"]:
+        with pytest.raises(ValueError):
+            codec.decode_activity(data)
+
+
+def test_pure_python_format_matches_msgpack(backend):
+    msgpack = pytest.importorskip("msgpack")
+    value = codec._codec._encode(_create().to_dict())
+    out = bytearray()
+    codec._pack(value, out)
+
+    assert msgpack.unpackb(bytes(out), strict_map_key=False) == msgpack.unpackb(
+        msgpack.packb(value, use_bin_type=True), strict_map_key=False
+    )
+
+
+def test_implementations_are_interchangeable(backend, monkeypatch):
+    pytest.importorskip("msgpack")
+    data = _create().to_dict()
+    instance_codec = ActivityCodec(prefixes=["https://myapp.example/"])
+    with_msgpack = instance_codec.encode(data)
+
+    monkeypatch.setattr(codec, "msgpack", None)
+    pure_python = instance_codec.encode(data)
+    assert instance_codec.decode(with_msgpack) == data
+
+    monkeypatch.undo()
+    assert codec.msgpack is not None
+    assert instance_codec.decode(pure_python) == data
@@ -1,6 +1,11 @@
+import asyncio
 import logging
+import threading
+import time
 from unittest import mock
 
+import pytest
+
 from active_boxes import activitypub as ap
 from active_boxes import content_helper
 
@@ -83,3 +88,144 @@ def test_little_content_helper_tag(_):
                 "type": "Hashtag",
             }
         ]
+
+
+async def test_parse_markdown_async_resolves_mentions_concurrently():
+    back = InMemBackend()
+    ap.use_backend(back)
+    for name in ["alice", "bob"]:
+        back.FETCH_MOCK[f"https://{name}.example/actor"] = {
+            "id": f"https://{name}.example/actor",
+            "url": f"https://{name}.example/@{name}",
+        }
+    running = []
+    resolved = []
+
+    async def get_actor_url(resource, debug=False):
+        running.append(resource)
+        await asyncio.sleep(0.01)
+        resolved.append((resource, len(running)))
+        name = resource.split("@")[1]
+        return f"https://{name}.example/actor"
+
+    with mock.patch.object(content_helper, "get_actor_url", get_actor_url):
+        content, tags = await content_helper.parse_markdown_async(
+            "hi @alice@alice.example @bob@bob.example and @alice@alice.example"
+        )
+        # Resolved mentions are cached per backend
+        await content_helper.mentionify_async("@bob@bob.example")
+
+    assert sorted(r for r, _ in resolved) == [
+        "@alice@alice.example",
+        "@bob@bob.example",
+    ]
+    assert all(concurrent == 2 for _, concurrent in resolved)
+    assert [t["href"] for t in tags] == [
+        "https://alice.example/actor",
+        "https://bob.example/actor",
+    ]
+    assert content.count('href="https://alice.example/@alice"') == 2
+    assert (
+        content
+        == content_helper.parse_markdown(
+            "hi @alice@alice.example @bob@bob.example and @alice@alice.example"
+        )[0]
+    )
+
+
+async def test_resolve_mentions_cache_expires_and_is_normalized():
+    back = InMemBackend()
+    ap.use_backend(back)
+    back.FETCH_MOCK["https://bob.example/actor"] = {
+        "id": "https://bob.example/actor",
+        "url": "https://bob.example/@bob",
+    }
+    get_actor_url = mock.AsyncMock(return_value="https://bob.example/actor")
+
+    with mock.patch.object(content_helper, "get_actor_url", get_actor_url):
+        actors = await content_helper.resolve_mentions(
+            ["@Bob@Bob.Example", "@bob@bob.example"]
+        )
+        await content_helper.resolve_mentions(["@bob@BOB.example"])
+        assert get_actor_url.await_count == 1
+        assert actors["@Bob@Bob.Example"] == actors["@bob@bob.example"]
+
+        # The entries expire like the WebFinger lookups
+        cache = back.cache("mentions")
+        expires, actor = cache.get("acct:bob@bob.example")
+        assert expires > time.monotonic() + 3500
+        cache.set("acct:bob@bob.example", (time.monotonic() - 1, actor))
+        await content_helper.resolve_mentions(["@bob@bob.example"])
+        assert get_actor_url.await_count == 2
+
+
+def test_hashtagify_prefix_tags():
+    back = InMemBackend()
+    ap.use_backend(back)
+    base_url = back.base_url()
+
+    content, tags = content_helper.hashtagify("#py #python #py3 #py")
+
+    assert content == " ".join(
+        f'<a href="{base_url}/tags/{t}" class="mention hashtag" rel="tag">#'
+        f"<span>{t}</span></a>"
+        for t in ["py", "python", "py3", "py"]
+    )
+    assert [t["name"] for t in tags] == ["#py", "#python", "#py3"]
+
+
+@pytest.fixture
+def render_cache():
+    content_helper.configure_render_cache(cache_size=16)
+    yield
+    content_helper.configure_render_cache(cache_size=0)
+
+
+def test_parse_markdown_render_cache(render_cache):
+    back = InMemBackend()
+    ap.use_backend(back)
+    content_helper._cache_mention(
+        back.cache("mentions"),
+        content_helper._mention_key("@dev@microblog.pub"),
+        {"id": "https://a", "url": "https://a"},
+    )
+
+    with mock.patch.object(
+        content_helper, "markdown", wraps=content_helper.markdown
+    ) as render:
+        first = content_helper.parse_markdown("hi @dev@microblog.pub #tag")
+        first[1].append({"type": "Hashtag"})  # the cache is not shared
+        second = content_helper.parse_markdown("hi @dev@microblog.pub #tag")
+        assert render.call_count == 1
+
+        # The mention resolved to another actor, the post is rendered again
+        content_helper._cache_mention(
+            back.cache("mentions"),
+            content_helper._mention_key("@dev@microblog.pub"),
+            {"id": "https://b", "url": "https://b"},
+        )
+        third = content_helper.parse_markdown("hi @dev@microblog.pub #tag")
+        assert render.call_count == 2
+
+    assert first[0] == second[0]
+    assert len(second[1]) == 2
+    assert 'href="https://b"' in third[0]
+
+
+async def test_parse_markdown_async_renders_off_the_loop(render_cache):
+    back = InMemBackend()
+    ap.use_backend(back)
+    threads = []
+
+    def _markdown(content, extensions):
+        threads.append(threading.get_ident())
+        return f"<p>{content}</p>"
+
+    with mock.patch.object(content_helper, "markdown", _markdown):
+        content, _ = await content_helper.parse_markdown_async("hello")
+        again, _ = await content_helper.parse_markdown_async("hello")
+
+    assert content == again == "<p>hello</p>"
+    # Rendered once, in another thread
+    assert len(threads) == 1
+    assert threads[0] != threading.get_ident()
@@ -1,7 +1,12 @@
 """Tests for http_client module."""
 
 import asyncio
+import gc
+import json
+import threading
+import warnings
 from datetime import datetime, timezone, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from unittest import mock
 
 import aiohttp
@@ -9,6 +14,10 @@ import pytest
 
 from active_boxes import activitypub as ap
 from active_boxes import http_client
+from active_boxes import httpsig
+from active_boxes import keyring
+from active_boxes import webfinger
+from active_boxes.backend import Backend
 
 
 def test_verify_date_header_valid():
@@ -173,7 +182,6 @@ async def test_fetch_activity():
 
 
 async def test_get_http_client_singleton():
-    http_client._http_client = None
     client1 = await http_client.get_http_client()
     client2 = await http_client.get_http_client()
     assert client1 is client2
@@ -181,10 +189,126 @@ async def test_get_http_client_singleton():
 
 
 async def test_close_http_client():
-    http_client._http_client = None
     await http_client.get_http_client()
     await http_client.close_http_client()
-    assert http_client._http_client is None
+    assert asyncio.get_running_loop() not in http_client._http_clients
+
+
+def test_get_http_client_per_loop():
+    client1 = asyncio.run(http_client.get_http_client())
+    client2 = asyncio.run(http_client.get_http_client())
+    assert client1 is not client2
+
+
+def test_sync_wrappers_close_their_http_client():
+    clients = []
+
+    async def _get():
+        clients.append(await http_client.get_http_client())
+        return "ok"
+
+    assert ap._run_sync(_get()) == "ok"
+    assert clients[0]._session is None
+    assert not http_client._http_clients
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps({"id": "https://example.com/note/1"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/activity+json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Backend(Backend):
+    def base_url(self) -> str:
+        return "https://example.com"
+
+    def activity_url(self, obj_id: str) -> str:
+        return f"https://example.com/activity/{obj_id}"
+
+    def note_url(self, obj_id: str) -> str:
+        return f"https://example.com/note/{obj_id}"
+
+
+@pytest.fixture
+def json_server():
+    server = HTTPServer(("127.0.0.1", 0), _JSONHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/note/1"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("module", [ap, httpsig, keyring, webfinger])
+def test_sync_wrappers_leave_no_unclosed_session(module, json_server):
+    # All the modules share the same helper
+    assert module._run_sync is http_client._run_sync
+    back = _Backend()
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        with (
+            mock.patch.object(back, "check_url", mock.AsyncMock()),
+            mock.patch.object(http_client, "check_url"),
+        ):
+            result = module._run_sync(back.fetch_iri(json_server))
+        gc.collect()
+
+    assert result == {"id": "https://example.com/note/1"}
+    assert not http_client._http_clients
+    assert not [w for w in caught if "Unclosed" in str(w.message)]
+
+
+async def test_shutdown_http_client_drains_in_flight_requests():
+    client = await http_client.get_http_client()
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def _deliver():
+        async with client.track():
+            started.set()
+            await release.wait()
+
+    task = asyncio.create_task(_deliver())
+    await started.wait()
+    assert client.in_flight == 1
+
+    shutdown = asyncio.create_task(http_client.shutdown_http_client(5))
+    await asyncio.sleep(0)
+    assert not shutdown.done()
+    # New work is rejected while draining
+    with pytest.raises(ap.ActivityUnavailableError):
+        await client.get_json("https://example.com/note")
+
+    release.set()
+    assert await shutdown is True
+    await task
+    assert client.in_flight == 0
+    assert asyncio.get_running_loop() not in http_client._http_clients
+
+
+async def test_shutdown_http_client_timeout():
+    client = await http_client.get_http_client()
+    started = asyncio.Event()
+
+    async def _deliver():
+        async with client.track():
+            started.set()
+            await asyncio.sleep(10)
+
+    task = asyncio.create_task(_deliver())
+    await started.wait()
+
+    assert await http_client.shutdown_http_client(0.01) is False
+    task.cancel()
+    assert await http_client.shutdown_http_client() is True
 
 
 # Additional tests for http_client module coverage
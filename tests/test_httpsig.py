@@ -9,6 +9,7 @@ from Crypto.Signature import PKCS1_v1_5
 from active_boxes import activitypub as ap
 from active_boxes import httpsig
 from active_boxes.errors import ActivityGoneError, ActivityNotFoundError
+from active_boxes.errors import HTTPSignatureError
 from active_boxes.key import Key
 
 from test_backend import InMemBackend
@@ -353,3 +354,125 @@ def test_httpsig_auth_call_with_string_body():
     assert "Date" in result
     assert "Host" in result
     assert "Signature" in result
+
+
+def _signed_inbox_request(back, body=b'{"type": "Create", "id": "x"}'):
+    k = Key("https://lol.com", "https://lol.com#main-key")
+    k.new()
+    back.FETCH_MOCK["https://lol.com#main-key"] = {
+        "publicKey": k.to_dict(),
+        "id": "https://lol.com",
+        "type": "Person",
+    }
+    headers = {
+        "User-Agent": "test-agent",
+        "Content-Type": "application/activity+json",
+    }
+    httpsig.sign_request_sync(
+        "POST", "/inbox", headers, k, body.decode("utf-8"), host="example.com"
+    )
+    return headers
+
+
+def test_verify_inbox_request(backend):
+    body = b'{"type": "Create", "id": "x"}'
+    headers = _signed_inbox_request(backend, body)
+
+    data = httpsig.verify_inbox_request_sync(
+        "POST", "/inbox", headers, memoryview(body)
+    )
+    assert data == {"type": "Create", "id": "x"}
+
+
+def test_sign_request_with_cached_digest(backend):
+    backend.FETCH_MOCK["https://lol.com"] = {
+        "type": "Person",
+        "id": "https://lol.com",
+    }
+    create = ap.parse_activity(
+        {
+            "type": "Create",
+            "id": "https://lol.com/notes/1/activity",
+            "actor": "https://lol.com",
+            "object": {
+                "type": "Note",
+                "id": "https://lol.com/notes/1",
+                "attributedTo": "https://lol.com",
+                "content": "Hello",
+            },
+        },
+        offline=True,
+    )
+    body = create.to_json_bytes()
+    k = Key("https://lol.com", "https://lol.com#main-key")
+    k.new()
+    backend.FETCH_MOCK["https://lol.com#main-key"] = {
+        "publicKey": k.to_dict(),
+        "id": "https://lol.com",
+        "type": "Person",
+    }
+    headers = {
+        "User-Agent": "test-agent",
+        "Content-Type": "application/activity+json",
+    }
+
+    with mock.patch("active_boxes.httpsig._body_digest") as body_digest:
+        httpsig.sign_request_sync(
+            "POST",
+            "/inbox",
+            headers,
+            k,
+            body,
+            host="example.com",
+            body_digest=create.json_digest(),
+        )
+        body_digest.assert_not_called()
+
+    data = httpsig.verify_inbox_request_sync("POST", "/inbox", headers, body)
+    assert data == create.to_dict()
+
+
+def test_verify_inbox_request_bad_digest_skips_key_fetch(backend):
+    headers = _signed_inbox_request(backend)
+
+    with mock.patch("active_boxes.httpsig._get_public_key") as get_key:
+        with pytest.raises(HTTPSignatureError, match="Digest"):
+            httpsig.verify_inbox_request_sync(
+                "POST", "/inbox", headers, b'{"type": "Delete"}'
+            )
+        get_key.assert_not_called()
+
+
+def test_verify_inbox_request_stale_date(backend):
+    headers = _signed_inbox_request(backend)
+    headers["Date"] = "Fri, 01 Jan 2021 00:00:00 GMT"
+
+    with mock.patch("active_boxes.httpsig._get_public_key") as get_key:
+        with pytest.raises(HTTPSignatureError, match="Date"):
+            httpsig.verify_inbox_request_sync(
+                "POST", "/inbox", headers, b'{"type": "Create", "id": "x"}'
+            )
+        get_key.assert_not_called()
+
+
+def test_verify_inbox_request_missing_signed_header(backend):
+    headers = _signed_inbox_request(backend)
+    headers["Signature"] = headers["Signature"].replace(" digest", "")
+
+    with pytest.raises(HTTPSignatureError, match="digest is not signed"):
+        httpsig.verify_inbox_request_sync(
+            "POST", "/inbox", headers, b'{"type": "Create", "id": "x"}'
+        )
+
+
+def test_verify_inbox_request_no_signature():
+    with pytest.raises(HTTPSignatureError):
+        httpsig.verify_inbox_request_sync("POST", "/inbox", {}, b"{}")
+
+
+def test_verify_inbox_request_tampered_signature(backend):
+    body = b'{"type": "Create", "id": "x"}'
+    headers = _signed_inbox_request(backend, body)
+
+    with pytest.raises(HTTPSignatureError, match="invalid signature"):
+        httpsig.verify_inbox_request_sync("PUT", "/inbox", headers, body)
@@ -0,0 +1,142 @@
+"""Tests for the time-ordered object IDs."""
+
+import json
+import os
+import time
+import uuid
+from unittest import mock
+
+import pytest
+
+from active_boxes import activitypub as ap
+from active_boxes import ids
+
+
+@pytest.mark.parametrize(
+    "generator",
+    [ids.ULIDGenerator(), ids.UUID7Generator(), ids.SnowflakeGenerator(42)],
+)
+def test_ids_are_monotonic_and_unique(generator):
+    generated = [generator() for _ in range(10_000)]
+
+    assert generated == sorted(generated)
+    assert len(set(generated)) == len(generated)
+
+
+@pytest.mark.parametrize(
+    "generator",
+    [ids.ULIDGenerator(), ids.UUID7Generator(), ids.SnowflakeGenerator(42)],
+)
+def test_ids_are_monotonic_when_the_clock_goes_backwards(generator):
+    with mock.patch.object(ids, "_now_ms", return_value=1_700_000_000_000):
+        first = generator()
+    with mock.patch.object(ids, "_now_ms", return_value=1_600_000_000_000):
+        second = generator()
+
+    assert first < second
+
+
+def test_ulid():
+    before = time.time()
+    ulid = ids.ULIDGenerator()()
+
+    assert len(ulid) == 26
+    assert set(ulid) <= set(ids._ALPHABET)
+    assert before - 0.001 <= ids.parse_timestamp(ulid) <= time.time()
+
+
+def test_uuid7():
+    before = time.time()
+    value = ids.UUID7Generator()()
+
+    parsed = uuid.UUID(value)
+    assert parsed.version == 7
+    assert parsed.variant == uuid.RFC_4122
+    assert before - 0.001 <= ids.parse_timestamp(value) <= time.time()
+    assert ids.parse_timestamp(str(uuid.uuid4())) is None
+    assert ids.parse_timestamp("not an id") is None
+
+
+def test_snowflake():
+    node_a = ids.SnowflakeGenerator(1)
+    node_b = ids.SnowflakeGenerator(2)
+    with mock.patch.object(ids, "_now_ms", return_value=1_700_000_000_000):
+        a, b = node_a(), node_b()
+
+    assert len(a) == 19
+    assert a != b
+    assert (int(a) >> 12) & 1023 == 1
+    assert (int(b) >> 12) & 1023 == 2
+
+    with pytest.raises(ValueError):
+        ids.SnowflakeGenerator(1024)
+
+
+def _in_forked_child(func):
+    """Runs `func` in a forked child, and returns its result."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            result = func()
+        except Exception as exc:
+            result = repr(exc)
+        with os.fdopen(write_fd, "w") as f:
+            json.dump(result, f)
+        os._exit(0)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        result = json.load(f)
+    os.waitpid(pid, 0)
+    return result
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork()")
+def test_snowflake_after_fork():
+    parent = ids.SnowflakeGenerator(1)
+    parent()
+
+    def _child():
+        try:
+            parent()
+        except RuntimeError:
+            pass
+        else:
+            return "generated an ID with the node ID of the parent"
+        parent.set_node_id(2)
+        return (int(parent()) >> 12) & 1023
+
+    assert _in_forked_child(_child) == 2
+    # The parent keeps its node ID
+    assert (int(parent()) >> 12) & 1023 == 1
+
+    node_ids = iter([3, 4])
+    with_factory = ids.SnowflakeGenerator(lambda: next(node_ids))
+    assert (int(with_factory()) >> 12) & 1023 == 3
+    assert _in_forked_child(lambda: (int(with_factory()) >> 12) & 1023) == 4
+
+
+def test_set_id_uses_the_backend_id_generator(backend):
+    backend.use_id_generator(ids.SnowflakeGenerator(7))
+    try:
+        with ap.offline_parsing():
+            create = ap.Create(
+                actor="https://example.com/person/1",
+                object={
+                    "type": "Note",
+                    "content": "Hello",
+                    "attributedTo": "https://example.com/person/1",
+                },
+            )
+        create.set_id()
+    finally:
+        backend.use_id_generator(None)
+
+    obj_id = create.id.removeprefix("https://todo/")
+    assert len(obj_id) == 19
+    note = create.to_dict()["object"]
+    assert note["id"] == create.id + "/activity"
+    assert note["url"] == f"https://todo/note/{obj_id}"
+    assert len(backend.random_object_id()) == 16
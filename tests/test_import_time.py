@@ -0,0 +1,94 @@
+"""Import-time budget: the heavy dependencies are only loaded when used."""
+
+import json
+import os
+import subprocess
+import sys
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import active_boxes
+
+MODULES = [
+    f"active_boxes.{name[:-3]}"
+    for name in sorted(os.listdir(os.path.dirname(active_boxes.__file__)))
+    if name.endswith(".py") and not name.startswith("__")
+]
+
+# Loaded on first use only
+LAZY_DEPENDENCIES = [
+    "aiohttp",
+    "markdown",
+    "mdx_linkify",
+    "regex",
+    "pyld",
+    "requests",
+    "importlib.metadata",
+]
+
+# Cumulative import time of all the modules of the package (best of 3 runs)
+IMPORT_BUDGET_MS = 150
+
+_CHECK = f"""
+import json, logging, sys, threading
+import {", ".join(MODULES)}
+print(json.dumps({{
+    "modules": [m for m in {LAZY_DEPENDENCIES!r} if m in sys.modules],
+    "threads": threading.active_count(),
+    "handlers": len(logging.getLogger().handlers),
+}}))
+"""
+
+
+def _run(*args: str) -> Tuple[str, str]:
+    proc = subprocess.run(
+        [sys.executable, *args, "-c", _CHECK],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.dirname(active_boxes.__file__)),
+    )
+    return proc.stdout, proc.stderr
+
+
+def _import_times(stderr: str) -> List[Tuple[int, str]]:
+    """Returns the cumulative time (us) and name of each imported module."""
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times.append((int(cumulative), name))
+    return times
+
+
+def test_import_is_side_effect_free():
+    stdout, _ = _run()
+    result = json.loads(stdout)
+
+    assert result["modules"] == []
+    assert result["threads"] == 1
+    assert result["handlers"] == 0
+
+
+def test_import_time_budget():
+    _run()  # Warm up the bytecode cache
+    totals: Dict[int, List[Tuple[int, str]]] = {}
+    for _ in range(3):
+        _, stderr = _run("-X", "importtime")
+        times = _import_times(stderr)
+        # Top-level imports of the package modules (they include the
+        # modules they import)
+        total = sum(
+            us for us, name in times if name.startswith(" active_boxes")
+        )
+        totals[total] = times
+
+    best = min(totals)
+    slowest = sorted(totals[best], reverse=True)[:15]
+    report = "\n".join(f"{us / 1000:8.1f} ms {name}" for us, name in slowest)
+    assert best / 1000 <= IMPORT_BUDGET_MS, (
+        f"importing the package took {best / 1000:.1f} ms "
+        f"(budget: {IMPORT_BUDGET_MS} ms), slowest imports:\n{report}"
+    )
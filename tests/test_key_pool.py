@@ -0,0 +1,150 @@
+import os
+from unittest import mock
+
+import pytest
+
+from active_boxes import key_pool
+from active_boxes.key import Key
+from active_boxes.key_pool import KeyPool
+
+
+@pytest.fixture
+def pool_path(tmp_path):
+    return str(tmp_path / "keys.pool")
+
+
+def test_key_pool_fills_in_background(pool_path):
+    with KeyPool(pool_path, "s3cret", size=2, key_size=1024) as pool:
+        pool.join(timeout=60)
+        assert len(pool) == 2
+
+        k = Key("https://lol.com")
+        k.new(pool=pool)
+        assert k.privkey is not None
+        assert k.to_dict()["publicKeyPem"] == k.pubkey_pem
+
+
+def test_key_pool_persists_encrypted(pool_path):
+    pool = KeyPool(pool_path, "s3cret", size=2, key_size=1024)
+    pool.start()
+    pool.join(timeout=60)
+    pool.close()
+
+    with open(pool_path) as f:
+        assert "PRIVATE KEY" not in f.read()
+
+    reloaded = KeyPool(pool_path, "s3cret", size=2, key_size=1024)
+    reloaded._load()
+    assert len(reloaded) == 2
+    assert list(reloaded._keys) == list(pool._keys)
+
+
+def test_key_pool_never_hands_out_a_key_twice(pool_path):
+    pool = KeyPool(pool_path, "s3cret", size=2, low_watermark=0, key_size=1024)
+    pool.start()
+    pool.join(timeout=60)
+    first = pool.new_key("https://lol.com")
+    pool.close()
+
+    reloaded = KeyPool(pool_path, "s3cret", size=2, key_size=1024)
+    reloaded._load()
+    assert len(reloaded) == 1
+    assert reloaded._keys[0] != first.privkey_pem
+
+
+def test_key_pool_wrong_passphrase(pool_path):
+    pool = KeyPool(pool_path, "s3cret", size=1, key_size=1024)
+    pool.start()
+    pool.join(timeout=60)
+    pool.close()
+
+    with pytest.raises(ValueError):
+        KeyPool(pool_path, "nope", size=1)._load()
+
+
+def test_key_pool_empty_falls_back_to_sync_generation(pool_path):
+    pool = KeyPool(pool_path, "s3cret", size=1, key_size=1024)
+    pool._load()
+    pool.close()
+
+    k = pool.new_key("https://lol.com", "https://lol.com#main-key")
+    assert k.privkey is not None
+    assert k.key_id() == "https://lol.com#main-key"
+
+
+def test_key_pool_batches_writes(pool_path):
+    pool = KeyPool(pool_path, "s3cret", size=3, low_watermark=0, key_size=1024)
+    with mock.patch.object(key_pool.os, "fsync", wraps=os.fsync) as fsync:
+        pool.start()
+        pool.join(timeout=60)
+        # The whole batch is written at once
+        assert fsync.call_count == 1
+
+        with mock.patch.object(pool, "_encrypt") as encrypt:
+            pems = [pool.pop_pem() for _ in range(3)]
+        # One append per key handed out, without re-encrypting the pool
+        assert fsync.call_count == 4
+        encrypt.assert_not_called()
+    pool.close()
+
+    reloaded = KeyPool(pool_path, "s3cret", size=3, key_size=1024)
+    reloaded._load()
+    assert len(reloaded) == 0
+    assert len(set(pems)) == 3
+
+
+def test_key_pool_compacts_the_file(pool_path):
+    pool = KeyPool(pool_path, "s3cret", size=2, key_size=1024)
+    pool.start()
+    for _ in range(5):
+        pool.join(timeout=60)
+        pool.pop_pem()
+    pool.join(timeout=60)
+    pool.close()
+
+    with open(pool_path) as f:
+        # Header, keys, and at most `size` consumed keys and their markers
+        assert len(f.readlines()) <= 1 + 2 + 2 * 2
+
+    reloaded = KeyPool(pool_path, "s3cret", size=2, key_size=1024)
+    reloaded._load()
+    assert list(reloaded._keys) == list(pool._keys)
+    with open(pool_path) as f:
+        assert "-\n" not in f.read()
+
+
+def test_key_pool_pop_before_start_keeps_persisted_keys(pool_path):
+    pool = KeyPool(pool_path, "s3cret", size=2, key_size=1024)
+    pool.start()
+    pool.join(timeout=60)
+    pool.close()
+
+    not_started = KeyPool(pool_path, "s3cret", size=2, key_size=1024)
+    not_started.close()
+    assert not_started.pop_pem() == pool._keys[0]
+
+    reloaded = KeyPool(pool_path, "s3cret", size=2, key_size=1024)
+    reloaded._load()
+    assert list(reloaded._keys) == [pool._keys[1]]
+
+
+def test_key_pool_shared_file(pool_path):
+    first = KeyPool(pool_path, "s3cret", size=2, low_watermark=0, key_size=1024)
+    second = KeyPool(
+        pool_path, "s3cret", size=2, low_watermark=0, key_size=1024
+    )
+    first.start()
+    second.start()
+    first.join(timeout=60)
+    second.join(timeout=60)
+
+    # Each pool sees the keys generated by the other one
+    pems = [first.pop_pem(), second.pop_pem(), second.pop_pem()]
+    first.close()
+    second.close()
+    assert len(set(pems)) == 3
+
+    reloaded = KeyPool(pool_path, "s3cret", size=2, key_size=1024)
+    reloaded._load()
+    assert len(reloaded) == 1
+    assert reloaded._keys[0] not in pems
@@ -0,0 +1,100 @@
+from unittest import mock
+
+import pytest
+
+from active_boxes import httpsig
+from active_boxes.key import Key
+from active_boxes.keyring import Keyring
+
+ALICE = "https://lol.com/alice"
+BOB = "https://lol.com/bob"
+
+
+@pytest.fixture(scope="module")
+def pems():
+    out = {}
+    for actor_id in (ALICE, BOB):
+        k = Key(actor_id)
+        k.new()
+        out[actor_id] = k.privkey_pem
+    return out
+
+
+def test_keyring_loads_once(pems):
+    loader = mock.Mock(side_effect=pems.get)
+    keyring = Keyring(loader)
+
+    entry = keyring.get_sync(ALICE)
+    assert entry.key_id == f"{ALICE}#main-key"
+    assert keyring.get_sync(ALICE) is entry
+    loader.assert_called_once_with(ALICE)
+
+
+async def test_keyring_async_loader(pems):
+    async def loader(actor_id):
+        return pems[actor_id]
+
+    keyring = Keyring(loader)
+    entry = await keyring.get(BOB)
+    assert entry.key.privkey is not None
+    assert await keyring.get(BOB) is entry
+
+
+def test_keyring_lru_eviction(pems):
+    loader = mock.Mock(side_effect=pems.get)
+    keyring = Keyring(loader, maxsize=1)
+
+    keyring.get_sync(ALICE)
+    keyring.get_sync(BOB)
+    assert len(keyring) == 1
+    assert ALICE not in keyring
+
+    keyring.get_sync(ALICE)
+    assert loader.call_count == 3
+
+
+def test_keyring_custom_key_id(pems):
+    k = Key(ALICE, f"{ALICE}/key")
+    k.load(pems[ALICE])
+    keyring = Keyring(lambda actor_id: k)
+
+    assert keyring.get_sync(ALICE).key_id == f"{ALICE}/key"
+
+
+def test_keyring_invalidate(pems):
+    loader = mock.Mock(side_effect=pems.get)
+    keyring = Keyring(loader)
+
+    keyring.get_sync(ALICE)
+    keyring.invalidate(ALICE)
+    keyring.get_sync(ALICE)
+    assert loader.call_count == 2
+
+
+def test_keyring_missing_key():
+    keyring = Keyring(lambda actor_id: None)
+    with pytest.raises(ValueError):
+        keyring.get_sync(ALICE)
+
+
+def test_httpsig_auth_sign_by_actor_id(backend, pems):
+    keyring = Keyring(pems.get)
+    k = Key(ALICE)
+    k.load(pems[ALICE])
+    backend.FETCH_MOCK[f"{ALICE}#main-key"] = {
+        "publicKey": k.to_dict(),
+        "id": ALICE,
+        "type": "Person",
+    }
+
+    body = '{"type": "Create", "id": "x"}'
+    auth = httpsig.HTTPSigAuth(ALICE, keyring=keyring)
+    headers = auth("POST", "/inbox", {"host": "example.com"}, body)
+
+    assert f'keyId="{ALICE}#main-key"' in headers["Signature"]
+    assert httpsig.verify_request_sync("POST", "/inbox", headers, body)
+
+
+def test_sign_by_actor_id_requires_keyring():
+    with pytest.raises(ValueError):
+        httpsig.sign_request_sync("POST", "/inbox", {}, ALICE)
@@ -1,10 +1,15 @@
+import asyncio
 import json
 import logging
+import threading
+import time
 from unittest import mock
 
+import pytest
 from active_boxes import linked_data_sig
 from active_boxes.key import Key
-from pyld import jsonld  # type: ignore[import-untyped]  # noqa: F401
+from active_boxes.keyring import Keyring
+from pyld import jsonld  # type: ignore[import-untyped]
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -109,3 +114,192 @@ def test_linked_data_sig(mock_loader):
 
         linked_data_sig.generate_signature(doc, k)
         assert linked_data_sig.verify_signature(doc, k)
+
+
+@mock.patch("pyld.jsonld.load_document")
+def test_linked_data_sig_with_keyring(mock_load_document):
+    mock_load_document.return_value = {
+        "contentType": "application/ld+json",
+        "contextUrl": None,
+        "documentUrl": "https://w3id.org/identity/v1",
+        "document": IDENTITY_CONTEXT,
+    }
+
+    doc = json.loads(DOC)
+
+    k = Key("https://microblog.pub")
+    k.new()
+    keyring = Keyring(lambda actor_id: k.privkey_pem)
+
+    linked_data_sig.generate_signature(doc, "https://microblog.pub", keyring)
+    assert doc["signature"]["creator"] == "https://microblog.pub#main-key"
+    assert linked_data_sig.verify_signature(doc, k)
+
+
+@pytest.fixture
+def offline_loader():
+    linked_data_sig.configure_context_loader(cache=None, allow_network=False)
+    yield
+    linked_data_sig.configure_context_loader(linked_data_sig.ContextCache())
+
+
+def test_linked_data_sig_offline(offline_loader):
+    doc = json.loads(DOC)
+
+    k = Key("https://microblog.pub")
+    k.new()
+
+    linked_data_sig.generate_signature(doc, k)
+    assert linked_data_sig.verify_signature(doc, k)
+
+
+def test_unknown_context_offline(offline_loader):
+    with pytest.raises(jsonld.JsonLdError):
+        linked_data_sig._caching_document_loader("https://example.com/ctx")
+
+
+def test_context_cache(tmp_path):
+    cache = linked_data_sig.ContextCache(str(tmp_path), max_entries=2)
+    remote = {"document": {"@context": {"a": "https://example.com/a"}}}
+
+    assert cache.get("https://example.com/1") == (None, False)
+    cache.set("https://example.com/1", remote)
+    assert cache.get("https://example.com/1") == (remote, True)
+
+    cache.ttl = -1
+    assert cache.get("https://example.com/1") == (remote, False)
+
+    cache.set("https://example.com/2", remote)
+    cache.set("https://example.com/3", remote)
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_remote_context_goes_through_disk_cache(tmp_path):
+    cache = linked_data_sig.ContextCache(str(tmp_path))
+    linked_data_sig.configure_context_loader(cache)
+    remote = {
+        "contentType": "application/ld+json",
+        "contextUrl": None,
+        "documentUrl": "https://example.com/ctx",
+        "document": {"@context": {}},
+    }
+    try:
+        with mock.patch.object(
+            linked_data_sig, "_remote_loader", return_value=remote
+        ) as loader:
+            url = "https://example.com/ctx"
+            assert linked_data_sig._caching_document_loader(url) == remote
+            linked_data_sig._CACHE.clear()
+            assert linked_data_sig._caching_document_loader(url) == remote
+            loader.assert_called_once()
+    finally:
+        linked_data_sig.configure_context_loader(linked_data_sig.ContextCache())
+
+
+@pytest.fixture
+def canonicalization():
+    linked_data_sig.configure_canonicalization()
+    yield
+    linked_data_sig.configure_canonicalization()
+
+
+def test_normalization_is_memoized(offline_loader, canonicalization):
+    doc = json.loads(DOC)
+    k = Key("https://microblog.pub")
+    k.new()
+
+    with mock.patch.object(
+        linked_data_sig,
+        "_normalize_uncached",
+        wraps=linked_data_sig._normalize_uncached,
+    ) as normalize:
+        linked_data_sig.generate_signature(doc, k)
+        assert normalize.call_count == 2
+        assert linked_data_sig.verify_signature(doc, k)
+        # Same content with a different key order hits the cache
+        reordered = dict(reversed(list(doc.items())))
+        assert linked_data_sig.verify_signature(reordered, k)
+        assert normalize.call_count == 2
+
+
+async def test_linked_data_sig_async(offline_loader, canonicalization):
+    doc = json.loads(DOC)
+    k = Key("https://microblog.pub")
+    k.new()
+
+    await linked_data_sig.generate_signature_async(doc, k)
+    assert await linked_data_sig.verify_signature_async(doc, k)
+    assert linked_data_sig.verify_signature(doc, k)
+
+
+async def test_linked_data_sig_async_timeout(offline_loader, canonicalization):
+    doc = json.loads(DOC)
+    k = Key("https://microblog.pub")
+    k.new()
+    linked_data_sig.generate_signature(doc, k)
+    linked_data_sig.configure_canonicalization(cache_size=0)
+
+    def slow_normalize(doc):
+        time.sleep(0.5)
+        return ""
+
+    with mock.patch.object(
+        linked_data_sig, "_normalize_uncached", slow_normalize
+    ):
+        with pytest.raises(asyncio.TimeoutError):
+            await linked_data_sig.verify_signature_async(doc, k, timeout=0.05)
+
+
+async def test_linked_data_sig_async_without_timeout(
+    offline_loader, canonicalization
+):
+    doc = json.loads(DOC)
+    k = Key("https://microblog.pub")
+    k.new()
+    linked_data_sig.generate_signature(doc, k)
+    linked_data_sig.configure_canonicalization(timeout=0.05, cache_size=0)
+
+    normalize = linked_data_sig._normalize_uncached
+
+    def slow_normalize(doc):
+        time.sleep(0.2)
+        return normalize(doc)
+
+    with mock.patch.object(
+        linked_data_sig, "_normalize_uncached", slow_normalize
+    ):
+        with pytest.raises(asyncio.TimeoutError):
+            await linked_data_sig.verify_signature_async(doc, k)
+        # None disables the configured timeout
+        assert await linked_data_sig.verify_signature_async(
+            doc, k, timeout=None
+        )
+
+
+async def test_linked_data_sig_async_caps_pending_normalizations(
+    offline_loader, canonicalization
+):
+    doc = json.loads(DOC)
+    k = Key("https://microblog.pub")
+    k.new()
+    linked_data_sig.generate_signature(doc, k)
+    linked_data_sig.configure_canonicalization(cache_size=0, max_pending=2)
+    done = threading.Event()
+
+    def slow_normalize(doc):
+        done.wait(5)
+        return ""
+
+    with mock.patch.object(
+        linked_data_sig, "_normalize_uncached", slow_normalize
+    ):
+        with pytest.raises(asyncio.TimeoutError):
+            await linked_data_sig.verify_signature_async(doc, k, timeout=0.05)
+        # The normalizations of the timed out call are still running
+        with pytest.raises(asyncio.TimeoutError, match="already pending"):
+            await linked_data_sig.verify_signature_async(doc, k, timeout=None)
+
+        done.set()
+        while linked_data_sig._pending:
+            await asyncio.sleep(0.01)
+        assert not await linked_data_sig.verify_signature_async(doc, k)
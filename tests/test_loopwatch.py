@@ -0,0 +1,87 @@
+"""Tests for the event loop blocking detector."""
+
+import asyncio
+import time
+
+import pytest
+
+from active_boxes import http_client
+from active_boxes import loopwatch
+from active_boxes.content_helper import parse_markdown
+
+
+@loopwatch.watch("test.slow")
+def _slow(duration):
+    time.sleep(duration)
+    return duration
+
+
+def test_disabled_by_default():
+    assert loopwatch.get_detector() is None
+    assert _slow(0) == 0
+
+
+async def test_blocking_call_is_reported():
+    with loopwatch.detect_blocking(threshold=0.01) as detector:
+        _slow(0.02)
+        _slow(0)
+
+    assert loopwatch.get_detector() is None
+    [call] = detector.blocking_calls
+    assert call.name == "test.slow"
+    assert call.duration >= 0.02
+    assert call.call_site.startswith(__file__)
+    assert "test_blocking_call_is_reported" in call.call_site
+
+
+async def test_calls_outside_of_the_loop_are_not_reported():
+    with loopwatch.detect_blocking(threshold=0.01) as detector:
+        await asyncio.to_thread(_slow, 0.02)
+
+    assert detector.blocking_calls == []
+
+
+def test_calls_without_loop_are_not_reported():
+    with loopwatch.detect_blocking(threshold=0.01) as detector:
+        _slow(0.02)
+
+    assert detector.blocking_calls == []
+
+
+async def test_library_call_sites_are_instrumented(backend):
+    with loopwatch.detect_blocking(threshold=0) as detector:
+        parse_markdown("Hello #world")
+
+    assert [c.name for c in detector.blocking_calls] == [
+        "content_helper.parse_markdown"
+    ]
+
+
+def test_sync_calls_are_counted():
+    with loopwatch.detect_blocking() as detector:
+        http_client.get_http_client_sync()
+        http_client.get_http_client_sync()
+
+    assert detector.sync_calls["get_http_client"] == 2
+
+
+async def test_sync_calls_from_the_loop_are_counted():
+    coro = http_client.get_http_client()
+    with loopwatch.detect_blocking() as detector:
+        with pytest.raises(RuntimeError):
+            http_client._run_sync(coro)
+    coro.close()
+
+    assert detector.sync_calls["get_http_client"] == 1
+
+
+async def test_monitor_loop_lag():
+    with loopwatch.detect_blocking(threshold=0.02) as detector:
+        task = asyncio.create_task(detector.monitor_loop_lag(interval=0.01))
+        await asyncio.sleep(0.02)
+        time.sleep(0.05)
+        await asyncio.sleep(0.02)
+        task.cancel()
+
+    assert detector.max_lag >= 0.02
+    assert detector.lags
@@ -1,9 +1,12 @@
 """Tests for the ActivityPub plugin protocol."""
 
+from unittest import mock
+
 import pytest
 
 from active_boxes.plugin import (
     ActivityPubPlugin,
+    AsyncStoragePlugin,
     CollectionPlugin,
     DeliveryPlugin,
     InboxPlugin,
@@ -66,6 +69,40 @@ class MinimalPlugin:
         return None
 
 
+class AsyncStorage:
+    """Async storage with batch operations, kept in memory."""
+
+    def __init__(self) -> None:
+        self.activities: list[dict] = []
+        self.actors: dict[str, dict] = {}
+
+    async def store_activity(
+        self,
+        activity: dict,
+        recipient_inbox: str | None = None,
+    ) -> None:
+        self.activities.append(activity)
+
+    async def store_activities(
+        self,
+        activities: list[dict],
+        recipient_inbox: str | None = None,
+    ) -> None:
+        self.activities.extend(activities)
+
+    async def get_activity(self, activity_id: str) -> dict | None:
+        return None
+
+    async def store_actor(self, actor: dict) -> None:
+        self.actors[actor["id"]] = actor
+
+    async def get_actor(self, actor_id: str) -> dict | None:
+        return self.actors.get(actor_id)
+
+    async def get_actors(self, actor_ids: list[str]) -> dict[str, dict]:
+        return {i: self.actors[i] for i in actor_ids if i in self.actors}
+
+
 class FullFeaturedPlugin(MinimalPlugin):
     """Plugin with all optional methods implemented."""
 
@@ -141,6 +178,11 @@ class TestPluginProtocol:
         plugin = MinimalPlugin()
         assert isinstance(plugin, StoragePlugin)
 
+    def test_async_storage_plugin_protocol(self):
+        """Async storage should satisfy AsyncStoragePlugin protocol."""
+        assert isinstance(AsyncStorage(), AsyncStoragePlugin)
+        assert not isinstance(MinimalPlugin(), AsyncStoragePlugin)
+
     def test_collection_plugin_protocol(self):
         """Plugin with collection methods should satisfy CollectionPlugin."""
         plugin = FullFeaturedPlugin()
@@ -278,6 +320,54 @@ class TestAsyncMethods:
         assert result is True
 
 
+class TestStoreActivities:
+    """Test storing activities through the backend."""
+
+    @pytest.fixture
+    def back(self):
+        back = InMemBackend()
+        ap.use_backend(back)
+        yield back
+        ap.use_backend(None)
+
+    async def test_store_activities_batch(self, back):
+        """store_activities() should be used when available."""
+        storage = AsyncStorage()
+        back.store_activities = mock.AsyncMock(
+            side_effect=storage.store_activities
+        )
+        back.store_activity = mock.Mock()
+        note = ap.Note(
+            id="https://example.com/note/1",
+            attributedTo="https://example.com/user/alice",
+            content="Hello",
+        )
+
+        await ap.store_activities([note, {"id": "x"}], "inbox")
+
+        back.store_activities.assert_awaited_once()
+        back.store_activity.assert_not_called()
+        assert storage.activities == [note.to_dict(), {"id": "x"}]
+
+    async def test_store_activities_one_by_one(self, back):
+        """store_activity() should be used otherwise."""
+        back.store_activity = mock.Mock()
+
+        await ap.store_activities([{"id": "x"}, {"id": "y"}])
+
+        assert back.store_activity.call_args_list == [
+            mock.call({"id": "x"}, None),
+            mock.call({"id": "y"}, None),
+        ]
+
+    async def test_store_activities_without_storage(self, back):
+        """A backend without storage methods should raise a clear error."""
+        assert not hasattr(back, "store_activity")
+
+        with pytest.raises(NotImplementedError, match="store_activity"):
+            await ap.store_activities([{"id": "x"}])
+
+
 class TestPluginWithBackend:
     """Test plugin integration with activitypub backend."""
 
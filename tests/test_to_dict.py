@@ -1,5 +1,9 @@
 """Test for to_dict method to increase code coverage."""
 
+import base64
+import hashlib
+import json
+
 from active_boxes import activitypub as ap
 from test_backend import InMemBackend
 
@@ -49,3 +53,52 @@ def test_to_dict_method():
 
     # Restore backend
     ap.use_backend(None)
+
+
+def test_to_json_bytes_is_cached():
+    """Test that the JSON encodings are cached until the activity changes."""
+    back = InMemBackend()
+    ap.use_backend(back)
+    back.FETCH_MOCK["https://example.com/person/1"] = {
+        "type": "Person",
+        "id": "https://example.com/person/1",
+    }
+    activity = ap.Create(
+        actor="https://example.com/person/1",
+        object={
+            "type": "Note",
+            "content": "Test note",
+            "id": "https://example.com/note/1",
+            "attributedTo": "https://example.com/person/1",
+        },
+    )
+
+    encoded = activity.to_json_bytes()
+    assert json.loads(encoded) == activity.to_dict()
+    assert activity.to_json_bytes() is encoded
+    assert json.loads(activity.to_json_bytes(embed=True)) == activity.to_dict(
+        embed=True
+    )
+    id_only = activity.to_json_bytes(embed=True, embed_object_id_only=True)
+    assert json.loads(id_only)["object"] == "https://example.com/note/1"
+    digest = hashlib.sha256(encoded).digest()
+    assert activity.json_digest() == (
+        "SHA-256=" + base64.b64encode(digest).decode("utf-8")
+    )
+
+    # Any write to the fields drops the cached encodings
+    activity._data["summary"] = "Updated"
+    assert json.loads(activity.to_json_bytes())["summary"] == "Updated"
+    assert activity.json_digest() != (
+        "SHA-256=" + base64.b64encode(digest).decode("utf-8")
+    )
+
+    activity.set_id("https://example.com/note/2", "2")
+    data = json.loads(activity.to_json_bytes(embed=True))
+    assert data["id"] == "https://example.com/note/2"
+    assert data["object"]["id"] == "https://example.com/note/2/activity"
+    assert activity.to_json_bytes(embed=True, embed_object_id_only=True) != (
+        id_only
+    )
+
+    ap.use_backend(None)
@@ -1,3 +1,5 @@
+import asyncio
+import json
 import logging
 from unittest import mock
 
@@ -168,3 +170,212 @@ def test_webfinger_debug_mode(mock_check_url, mock_backend_check_url):
 
     with pytest.raises(urlutils.InvalidURLError):
         webfinger.webfinger_sync("@dev@localhost:8080", debug=True)
+
+
+def _fetch_json(responses, calls):
+    async def fetch_json(url, **kwargs):
+        calls.append((url, kwargs["params"]["resource"]))
+        resp = responses.get(url)
+        if isinstance(resp, Exception):
+            raise resp
+        return resp
+
+    return fetch_json
+
+
+@mock.patch("active_boxes.webfinger.check_url", return_value=None)
+def test_webfinger_cache(_):
+    back = InMemBackend()
+    use_backend(back)
+    calls = []
+    responses = {"https://microblog.pub/.well-known/webfinger": _WEBFINGER_RESP}
+
+    with mock.patch.object(back, "fetch_json", _fetch_json(responses, calls)):
+        for resource in ["@dev@Microblog.pub", "acct:dev@microblog.pub"]:
+            assert webfinger.webfinger_sync(resource) == _WEBFINGER_RESP
+
+        assert calls == [
+            (
+                "https://microblog.pub/.well-known/webfinger",
+                "acct:dev@microblog.pub",
+            )
+        ]
+
+        # An expired response is fetched again
+        cached = back.cache("webfinger").get("acct:dev@microblog.pub")
+        back.cache("webfinger").set("acct:dev@microblog.pub", (0, cached[1]))
+        assert webfinger.webfinger_sync("@dev@microblog.pub") == _WEBFINGER_RESP
+        assert len(calls) == 2
+
+        webfinger.configure_webfinger_cache(ttl=0)
+        try:
+            webfinger.webfinger_sync("@dev@microblog.pub")
+        finally:
+            webfinger.configure_webfinger_cache()
+        assert len(calls) == 3
+
+
+@mock.patch("active_boxes.webfinger.check_url", return_value=None)
+def test_webfinger_failures_are_cached(_):
+    back = InMemBackend()
+    use_backend(back)
+    calls = []
+    responses = {
+        "https://down.example/.well-known/webfinger": ConnectionError(),
+        "http://down.example/.well-known/webfinger": ConnectionError(),
+    }
+
+    with mock.patch.object(back, "fetch_json", _fetch_json(responses, calls)):
+        assert webfinger.webfinger_sync("@dev@down.example") is None
+        assert len(calls) == 2
+
+        assert webfinger.webfinger_sync("@dev@down.example") is None
+        assert len(calls) == 2
+
+
+@mock.patch("active_boxes.webfinger.check_url", return_value=None)
+def test_webfinger_remembers_the_scheme(_):
+    back = InMemBackend()
+    use_backend(back)
+    calls = []
+    responses = {
+        "https://plain.example/.well-known/webfinger": ConnectionError(),
+        "http://plain.example/.well-known/webfinger": _WEBFINGER_RESP,
+    }
+
+    with mock.patch.object(back, "fetch_json", _fetch_json(responses, calls)):
+        webfinger.webfinger_sync("@alice@plain.example")
+        webfinger.webfinger_sync("@bob@plain.example")
+
+    assert [url for url, _ in calls] == [
+        "https://plain.example/.well-known/webfinger",
+        "http://plain.example/.well-known/webfinger",
+        "http://plain.example/.well-known/webfinger",
+    ]
+
+
+@mock.patch("active_boxes.webfinger.check_url", return_value=None)
+async def test_webfinger_many(_):
+    back = InMemBackend()
+    use_backend(back)
+    calls = []
+    in_flight = {"a.example": 0, "b.example": 0}
+    max_in_flight = dict(in_flight)
+
+    async def fetch_json(url, **kwargs):
+        host = url.split("/")[2]
+        calls.append(kwargs["params"]["resource"])
+        in_flight[host] += 1
+        max_in_flight[host] = max(max_in_flight[host], in_flight[host])
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+        return {"subject": kwargs["params"]["resource"], "links": []}
+
+    resources = [f"@user{i}@a.example" for i in range(6)] + [
+        "@user0@b.example",
+        "acct:user0@A.example",
+        "invalid",
+    ]
+    with mock.patch.object(back, "fetch_json", fetch_json):
+        results = await webfinger.webfinger_many(resources, max_per_host=2)
+
+    assert list(results) == resources
+    assert results["@user0@a.example"] == {
+        "subject": "acct:user0@a.example",
+        "links": [],
+    }
+    assert results["acct:user0@A.example"] == results["@user0@a.example"]
+    assert results["invalid"] is None
+    assert sorted(calls) == sorted(set(calls))
+    assert len(calls) == 7
+    assert max_in_flight == {"a.example": 2, "b.example": 1}
+
+
+_ALICE = {
+    "type": "Person",
+    "id": "https://example.com/users/alice",
+    "url": "https://example.com/@alice",
+    "preferredUsername": "alice",
+}
+
+
+def _responder():
+    responder = webfinger.WebFingerResponder(
+        "Example.com",
+        max_age=600,
+        subscribe_template="https://example.com/follow?profile={uri}",
+    )
+    responder.add_actor(_ALICE, aliases=["acct:alice@old.example"])
+    return responder
+
+
+def test_responder():
+    responder = _responder()
+
+    resp = responder.respond("acct:alice@example.com")
+    assert resp.status == 200
+    assert resp.headers["Content-Type"] == "application/jrd+json; charset=utf-8"
+    assert resp.headers["Cache-Control"] == "public, max-age=600"
+    assert resp.headers["Access-Control-Allow-Origin"] == "*"
+    jrd = json.loads(resp.body)
+    assert jrd["subject"] == "acct:alice@example.com"
+    assert jrd["aliases"] == [
+        "https://example.com/users/alice",
+        "https://example.com/@alice",
+        "acct:alice@old.example",
+    ]
+    assert [link["rel"] for link in jrd["links"]] == [
+        "http://webfinger.net/rel/profile-page",
+        "self",
+        "http://ostatus.org/schema/1.0/subscribe",
+    ]
+
+    for resource in [
+        "@Alice@EXAMPLE.com",
+        "alice@example.com",
+        "https://example.com/users/alice",
+        "https://example.com/@alice",
+        "acct:alice@old.example",
+    ]:
+        assert responder.respond(resource).body == resp.body
+
+    assert responder.respond("acct:bob@example.com").status == 404
+    assert responder.respond("").status == 400
+    assert responder.respond("bob").status == 400
+
+
+def test_responder_rel_filter_and_etag():
+    responder = _responder()
+    full = responder.respond("acct:alice@example.com")
+
+    resp = responder.respond("acct:alice@example.com", rel=["self", "unknown"])
+    assert [link["rel"] for link in json.loads(resp.body)["links"]] == ["self"]
+    assert resp.headers["ETag"] != full.headers["ETag"]
+
+    resp = responder.respond("acct:alice@example.com", rel=["unknown"])
+    assert json.loads(resp.body)["links"] == []
+
+    resp = responder.respond(
+        "acct:alice@example.com", if_none_match=full.headers["ETag"]
+    )
+    assert resp.status == 304
+    assert resp.body == b""
+    assert resp.headers["ETag"] == full.headers["ETag"]
+
+
+def test_responder_incremental_updates():
+    responder = _responder()
+    assert len(responder) == 1
+
+    responder.add_actor(
+        dict(_ALICE, preferredUsername="alicia", url=None),
+    )
+    assert len(responder) == 1
+    assert responder.respond("acct:alice@example.com").status == 404
+    assert responder.respond("acct:alice@old.example").status == 404
+    resp = responder.respond("https://example.com/users/alice")
+    assert json.loads(resp.body)["subject"] == "acct:alicia@example.com"
+
+    responder.remove_actor(_ALICE["id"])
+    assert len(responder) == 0
+    assert responder.respond("acct:alicia@example.com").status == 404